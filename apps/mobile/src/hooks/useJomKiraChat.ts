@@ -48,6 +48,9 @@ export function useJomKiraChat({
         headers: {
           'Content-Type': 'application/json',
           'X-Platform': 'react-native',
+          // Retries of the same message must reuse this key so the backend
+          // runs the agent (and any confirm_transfer) only once
+          'Idempotency-Key': userMessage.id,
           ...(sessionId && { 'X-Session-Id': sessionId }),
         },
         body: JSON.stringify({
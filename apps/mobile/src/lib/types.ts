@@ -7,6 +7,7 @@ export interface TransferDetails {
   account_number: string;
   amount: number;
   reference?: string;
+  nickname?: string;
 }
 
 export interface BillDetails {
@@ -21,13 +22,18 @@ export interface BankingState {
   balance: number;
   pending_transfer: TransferDetails | null;
   pending_bill: BillDetails | null;
+  // Most recent entries only; older ones via /api/sessions/{id}/transactions
   transaction_history: string[];
+  // Confirmed payments still settling; poll /api/sessions/{id}/settlements/{settlement_id}
+  settlement_ids?: string[];
   status:
     | 'idle'
     | 'confirming_transfer'
     | 'confirming_bill'
+    | 'processing'
     | 'completed'
     | 'error';
+  version?: number;
 }
 
 export interface PromoItem {
@@ -0,0 +1,226 @@
+"""
+Microbenchmarks for the per-request CPU work we own.
+
+Usage (from packages/agent):
+    python benchmarks/bench_hot_paths.py            # run and compare against baselines
+    python benchmarks/bench_hot_paths.py --check    # exit 1 on regression (CI)
+    python benchmarks/bench_hot_paths.py --update   # rewrite baselines.json
+    python benchmarks/bench_hot_paths.py -k guard   # only cases matching a substring
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+BASELINES_FILE = BENCH_DIR / "baselines.json"
+
+# The app modules are imported the same way uvicorn sees them (cwd = src)
+sys.path.insert(0, str(SRC_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("OPENAI_API_KEY", "bench-not-used")
+
+import fixtures  # noqa: E402
+
+
+def _guardrail_cases() -> dict[str, Callable[[], object]]:
+    from guardrails.middleware import GuardrailMiddleware
+    from guardrails.base import GuardrailContext
+    from guardrails.checks.sanitization import SanitizationGuardrail
+
+    middleware = GuardrailMiddleware(app=None)
+    loop = asyncio.new_event_loop()
+    chunks = fixtures.request_chunks(fixtures.agui_history())
+    body_json = fixtures.agui_history()
+
+    def buffer_request():
+        pending = list(chunks)
+
+        async def receive():
+            return pending.pop(0)
+
+        return loop.run_until_complete(middleware._buffer_request(receive))
+
+    guardrail = SanitizationGuardrail()
+    context = GuardrailContext(
+        body={},
+        text_candidates=fixtures.guardrail_candidates(),
+        metadata={"ip": "N/A"},
+    )
+
+    return {
+        "middleware.buffer_request[1.5MB image, 200 turns]": buffer_request,
+        "middleware.strip_image_fields[1.5MB image, 200 turns]": lambda: middleware._strip_image_fields(body_json),
+        "guardrails.sanitization.check[4x long texts]": lambda: guardrail.check(context),
+    }
+
+
+def _agui_cases() -> dict[str, Callable[[], object]]:
+    from utils.agui import extract_last_user_image, extract_last_user_message, extract_text_from_json
+
+    history = fixtures.agui_history()
+    history_content_array = fixtures.agui_history_content_array()
+    deep = fixtures.deep_payload()
+
+    return {
+        "agui.extract_last_user_image[_image field]": lambda: extract_last_user_image(history),
+        "agui.extract_last_user_image[data URL block]": lambda: extract_last_user_image(history_content_array),
+        "agui.extract_last_user_message[200 turns]": lambda: extract_last_user_message(history),
+        "agui.extract_text_from_json[depth 40]": lambda: extract_text_from_json(deep),
+    }
+
+
+def _sanitizer_cases() -> dict[str, Callable[[], object]]:
+    from utils.sanitizers import sanitize_pii, sanitize_state
+
+    line = fixtures.pii_log_line()
+    state = fixtures.banking_state()
+    state_dict = state.model_dump()
+
+    return {
+        "sanitizers.sanitize_pii[50 records]": lambda: sanitize_pii(line),
+        "sanitizers.sanitize_state[model]": lambda: sanitize_state(dict(state)),
+        "sanitizers.sanitize_state[dict]": lambda: sanitize_state(state_dict),
+    }
+
+
+def _state_cases() -> dict[str, Callable[[], object]]:
+    state = fixtures.banking_state()
+    return {
+        "BankingState.model_dump[5k history]": state.model_dump,
+        "BankingState.model_dump_json[5k history]": state.model_dump_json,
+    }
+
+
+def _resolver_cases() -> dict[str, Callable[[], object]]:
+    from services.name_resolver import get_bank_resolver
+
+    resolver = get_bank_resolver()
+    return {
+        "name_resolver.resolve[alias]": lambda: resolver.resolve("maybank2u"),
+        "name_resolver.suggest[typo]": lambda: resolver.suggest("Standard Charterd"),
+        "name_resolver.suggest[other bank]": lambda: resolver.suggest("Hong Leong Islamic"),
+    }
+
+
+def _biller_cases() -> dict[str, Callable[[], object]]:
+    from services.biller_registry import get_biller_registry
+
+    registry = get_biller_registry()
+    return {
+        "biller_registry.check_bill": lambda: registry.check_bill("Tenaga", "2200-1234-5678", 120.45, "inv-12345"),
+    }
+
+
+def _payee_cases() -> dict[str, Callable[[], object]]:
+    from core.payees import PayeeIndex
+
+    index = PayeeIndex(fixtures.payees())
+    return {
+        "payees.search[200 payees, 2 chars]": lambda: index.search("al"),
+        "payees.resolve[200 payees, nickname]": lambda: index.resolve("mom"),
+    }
+
+
+def _audit_cases() -> dict[str, Callable[[], object]]:
+    import tempfile
+    import time
+    from core.audit import AuditLog, SegmentWriter
+
+    # Only the in-turn part: building the record and buffering it (commits happen off the turn)
+    log = AuditLog(SegmentWriter(tempfile.mkdtemp(), 1 << 20), queue_size=1 << 30, commit_interval_s=1.0)
+    arguments = {"recipient_name": "Ali", "bank_name": "CIMB Bank", "account_number": "1234567890", "amount": 10.0}
+    result = {"success": True, "message": "Transfer prepared successfully.", "status": "confirming_transfer"}
+
+    def record():
+        log.record_tool_call("prepare_transfer", "call_1", dict(arguments), result, time.perf_counter())
+        log._buffer.clear()
+
+    return {
+        "audit.record_tool_call": record,
+    }
+
+
+def _main_cases() -> dict[str, Callable[[], object]]:
+    from main import extract_tool_calls
+
+    result = fixtures.run_result()
+    return {
+        "main.extract_tool_calls[50 round trips]": lambda: extract_tool_calls(result),
+    }
+
+
+CASE_GROUPS = [_guardrail_cases, _agui_cases, _sanitizer_cases, _state_cases, _resolver_cases, _biller_cases, _payee_cases, _audit_cases, _main_cases]
+
+
+def measure(fn: Callable[[], object], repeat: int) -> float:
+    """Best-of-`repeat` seconds per call; min is the least noisy estimator."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def load_baselines() -> dict:
+    if BASELINES_FILE.exists():
+        return json.loads(BASELINES_FILE.read_text())
+    return {"cases": {}}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", default="", help="only run cases containing this substring")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="fail --check when a case is slower than baseline x tolerance")
+    parser.add_argument("--check", action="store_true", help="exit non-zero on regression")
+    parser.add_argument("--update", action="store_true", help="write results to baselines.json")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    results: dict[str, float] = {}
+    regressions = []
+
+    print(f"{'case':<58} {'per call':>12} {'baseline':>12} {'ratio':>7}")
+    for group in CASE_GROUPS:
+        for name, fn in group().items():
+            if args.pattern and args.pattern not in name:
+                continue
+            seconds = measure(fn, args.repeat)
+            results[name] = seconds
+
+            baseline = baselines["cases"].get(name)
+            ratio = seconds / baseline if baseline else None
+            if ratio and ratio > args.tolerance:
+                regressions.append(name)
+            baseline_col = f"{baseline * 1e6:.1f}us" if baseline else "-"
+            ratio_col = f"{ratio:.2f}x" if ratio else "new"
+            print(f"{name:<58} {seconds * 1e6:>10.1f}us {baseline_col:>12} {ratio_col:>7}")
+
+    if args.update:
+        baselines["cases"].update(results)
+        baselines["environment"] = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+        }
+        BASELINES_FILE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"\n📝 Baselines written to {BASELINES_FILE.name}")
+
+    if regressions:
+        print(f"\n🚨 {len(regressions)} case(s) slower than {args.tolerance}x baseline:")
+        for name in regressions:
+            print(f"   └─ {name}")
+        return 1 if args.check else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Cold-start benchmark for the API process.
+
+Each run is a fresh interpreter, measuring:
+- import:  `import main` (what every worker and test collection pays)
+- ready:   import + the FastAPI lifespan (logging, logfire, model, agent, AG-UI app)
+
+Usage (from packages/agent):
+    python benchmarks/bench_startup.py            # report
+    python benchmarks/bench_startup.py --check    # exit 1 when over budget (CI)
+    python benchmarks/bench_startup.py --importtime  # show the slowest imports
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+# Budgets for the best of N cold starts, in milliseconds
+IMPORT_BUDGET_MS = 1200
+READY_BUDGET_MS = 3000
+
+PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def startup():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(startup())
+ready = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "ready_ms": (ready - start) * 1000}))
+"""
+
+
+def probe_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "bench-not-used")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return env
+
+
+def cold_start() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=SRC_DIR,
+        env=probe_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(limit: int = 15):
+    """Print the top cumulative entries from `python -X importtime -c 'import main'`."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SRC_DIR,
+        env=probe_env(),
+        capture_output=True,
+        text=True,
+    ).stderr
+
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        rows.append((int(cumulative_us), name.rstrip()))
+
+    print(f"\n{'cumulative':>12}  module")
+    for cumulative_us, name in sorted(rows, reverse=True)[:limit]:
+        print(f"{cumulative_us / 1000:>10.1f}ms  {name}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--ready-budget-ms", type=float, default=READY_BUDGET_MS)
+    parser.add_argument("--check", action="store_true", help="exit non-zero when over budget")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    args = parser.parse_args()
+
+    runs = [cold_start() for _ in range(args.runs)]
+    import_ms = min(run["import_ms"] for run in runs)
+    ready_ms = min(run["ready_ms"] for run in runs)
+
+    print(f"{'phase':<10} {'best':>10} {'budget':>10}")
+    print(f"{'import':<10} {import_ms:>8.0f}ms {args.import_budget_ms:>8.0f}ms")
+    print(f"{'ready':<10} {ready_ms:>8.0f}ms {args.ready_budget_ms:>8.0f}ms")
+
+    if args.importtime:
+        slowest_imports()
+
+    over_budget = import_ms > args.import_budget_ms or ready_ms > args.ready_budget_ms
+    if over_budget:
+        print("\n🚨 Startup is over budget")
+        return 1 if args.check else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Golden-conversation efficiency evaluation.
+
+Many performance regressions are behavioral, not CPU: a prompt change
+that makes the agent take an extra turn before chaining
+analyze_bill_image -> prepare_bill_payment, or ask for confirmation
+twice, costs a model round trip per turn without slowing any line of
+our code. This runs the scripted conversations in golden/conversations.json
+(transfers, bills, cancellations, Malay inputs) through create_agent(),
+turn by turn like /api/chat, and reports per scenario:
+
+- model requests (chat and vision),
+- tool calls (and whether the expected tools were called),
+- prompt and completion tokens,
+- wall time,
+
+compared against golden/baselines.json. A scenario regresses when its
+model requests or tool calls exceed the baseline by more than --slack, its
+tokens by more than --token-tolerance, or its wall time by more than
+--time-tolerance. With --runs N each metric is the median of N runs.
+--check also fails a scenario that has no baseline yet.
+
+The model is whatever get_model() routes to, so this needs the provider
+configured, or cassettes (core/cassette.py) for offline runs; each
+scenario runs as session "golden-<name>":
+
+Usage (from packages/agent):
+    python benchmarks/eval_golden.py                      # live model, compare
+    python benchmarks/eval_golden.py --check --runs 3     # exit 1 on regression (CI)
+    python benchmarks/eval_golden.py --update             # rewrite golden/baselines.json
+    python benchmarks/eval_golden.py -k bill              # only scenarios matching a substring
+    LLM_CASSETTE_MODE=record LLM_CASSETTE_REDACT=false LLM_CASSETTE_DIR=benchmarks/golden/cassettes python benchmarks/eval_golden.py
+    LLM_CASSETTE_MODE=replay LLM_CASSETTE_DIR=benchmarks/golden/cassettes python benchmarks/eval_golden.py
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+GOLDEN_DIR = BENCH_DIR / "golden"
+CONVERSATIONS_FILE = GOLDEN_DIR / "conversations.json"
+BASELINES_FILE = GOLDEN_DIR / "baselines.json"
+
+# Round trips are compared absolutely, tokens and time relatively
+COUNT_METRICS = ("model_requests", "tool_calls")
+TOKEN_METRICS = ("input_tokens", "output_tokens")
+TIME_METRICS = ("wall_s",)
+
+# The app modules are imported the same way uvicorn sees them (cwd = src);
+# payees, ledger and audit records go to a scratch directory
+sys.path.insert(0, str(SRC_DIR))
+_scratch = Path(tempfile.mkdtemp(prefix="golden-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("OPENAI_API_KEY", "golden-not-used")
+os.environ.setdefault("AUDIT_ENABLED", "false")
+os.environ.setdefault("PAYEE_DB_PATH", str(_scratch / "payees.db"))
+os.environ.setdefault("LEDGER_DB_PATH", str(_scratch / "ledger.db"))
+if "LLM_CASSETTE_DIR" in os.environ:
+    os.environ["LLM_CASSETTE_DIR"] = str(Path(os.environ["LLM_CASSETTE_DIR"]).resolve())
+os.chdir(SRC_DIR)
+
+
+def load_baselines() -> dict:
+    if BASELINES_FILE.exists():
+        return json.loads(BASELINES_FILE.read_text())
+    return {"scenarios": {}}
+
+
+def image_turn(turn) -> tuple[str, dict | None]:
+    if isinstance(turn, str):
+        return turn, None
+    image_path = GOLDEN_DIR / turn["image"]
+    return turn["text"], {"bytes": base64.b64encode(image_path.read_bytes()).decode(), "format": image_path.suffix.lstrip(".")}
+
+
+async def run_scenario(agent, scenario: dict, run: int) -> dict:
+    """One pass through a scenario, turn by turn like /api/chat."""
+    from pydantic_ai import BinaryContent
+    from pydantic_ai.ag_ui import StateDeps
+    from pydantic_ai.messages import ModelResponse, ToolCallPart
+
+    from core.context import current_image_ctx, session_id_ctx, user_id_ctx
+    from core.metrics import metrics, record_llm_usage
+    from core.model_factory import classify_turn, get_model
+    from models.banking import BankingState
+
+    state = BankingState(balance=scenario.get("initial_balance", 1000.0))
+    session_id_ctx.set(f"golden-{scenario['name']}")
+    # Payees saved by an earlier run would change the tools offered
+    user_id_ctx.set(f"golden-{scenario['name']}-{run}")
+    metrics.reset()
+    tools: list[str] = []
+    wall = 0.0
+
+    for turn in scenario["turns"]:
+        text, image = image_turn(turn)
+        current_image_ctx.set(image)
+        prompt: list = [text]
+        if image is not None:
+            prompt.append(BinaryContent(data=base64.b64decode(image["bytes"]), media_type=f"image/{image['format']}"))
+        task = classify_turn(bool(state.pending_transfer or state.pending_bill), text)
+
+        start = time.perf_counter()
+        result = await agent.run(prompt, deps=StateDeps(state), model=get_model(task))
+        wall += time.perf_counter() - start
+
+        # Vision runs record their own usage (tools/vision.py)
+        record_llm_usage(result.usage(), task="chat")
+        tools += [
+            part.tool_name
+            for message in result.new_messages() if isinstance(message, ModelResponse)
+            for part in message.parts if isinstance(part, ToolCallPart)
+        ]
+
+    counters = metrics.snapshot()["counters"]
+
+    def total(name: str) -> float:
+        return sum(v for k, v in counters.items() if k.split("{")[0] == name)
+
+    missing = [
+        expected for expected in scenario.get("expect_tools", [])
+        if not set(expected.split("|")) & set(tools)
+    ]
+    return {
+        "model_requests": total("llm.requests"),
+        "tool_calls": len(tools),
+        "input_tokens": total("llm.input_tokens"),
+        "output_tokens": total("llm.output_tokens"),
+        "wall_s": wall,
+        "tools": tools,
+        "missing_tools": missing,
+    }
+
+
+def regressions(result: dict, baseline: dict | None, args) -> list[str]:
+    if not baseline:
+        return []
+    found = []
+    for metric in COUNT_METRICS:
+        if result[metric] > baseline[metric] + args.slack:
+            found.append(f"{metric} {baseline[metric]:.0f} -> {result[metric]:.0f}")
+    for metric, tolerance in [*((m, args.token_tolerance) for m in TOKEN_METRICS),
+                              *((m, args.time_tolerance) for m in TIME_METRICS)]:
+        if baseline[metric] and result[metric] > baseline[metric] * tolerance:
+            found.append(f"{metric} {result[metric] / baseline[metric]:.2f}x")
+    return found
+
+
+async def evaluate(scenarios: list[dict], runs: int) -> dict[str, dict]:
+    from agent import create_agent
+
+    agent = create_agent()
+    results = {}
+    for scenario in scenarios:
+        passes = [await run_scenario(agent, scenario, run) for run in range(runs)]
+        result = {
+            metric: statistics.median(p[metric] for p in passes)
+            for metric in (*COUNT_METRICS, *TOKEN_METRICS, *TIME_METRICS)
+        }
+        # Expected tools must be called on every run
+        result["tools"] = passes[-1]["tools"]
+        result["missing_tools"] = sorted({t for p in passes for t in p["missing_tools"]})
+        results[scenario["name"]] = result
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", default="", help="only run scenarios containing this substring")
+    parser.add_argument("--runs", type=int, default=1, help="runs per scenario; metrics are the median")
+    parser.add_argument("--slack", type=float, default=0,
+                        help="extra model requests / tool calls allowed over baseline")
+    parser.add_argument("--token-tolerance", type=float, default=1.15,
+                        help="fail when tokens exceed baseline x tolerance")
+    parser.add_argument("--time-tolerance", type=float, default=1.5,
+                        help="fail when wall time exceeds baseline x tolerance")
+    parser.add_argument("--check", action="store_true", help="exit non-zero on regression")
+    parser.add_argument("--update", action="store_true", help="write results to golden/baselines.json")
+    args = parser.parse_args()
+
+    scenarios = [s for s in json.loads(CONVERSATIONS_FILE.read_text()) if args.pattern in s["name"]]
+    baselines = load_baselines()
+    results = asyncio.run(evaluate(scenarios, args.runs))
+
+    failed: dict[str, list[str]] = {}
+    print(f"{'scenario':<30} {'requests':>9} {'tools':>6} {'in tok':>8} {'out tok':>8} {'wall':>8}  vs baseline")
+    for name, result in results.items():
+        baseline = baselines["scenarios"].get(name)
+        problems = regressions(result, baseline, args)
+        if result["missing_tools"]:
+            problems.append(f"expected tools not called: {', '.join(result['missing_tools'])}")
+        if baseline is None and args.check and not args.update:
+            # An unrecorded scenario would otherwise pass CI without ever being compared
+            problems.append("no baseline (record one with --update)")
+        if problems:
+            failed[name] = problems
+        if baseline:
+            verdict = "regressed" if problems else "ok"
+            reference = (f"{baseline['model_requests']:.0f} req, {baseline['tool_calls']:.0f} tools, "
+                         f"{baseline['input_tokens']:.0f}/{baseline['output_tokens']:.0f} tok, {baseline['wall_s']:.2f}s")
+            compared = f"{verdict} ({reference})"
+        else:
+            compared = "regressed (no baseline)" if problems else "new"
+        print(
+            f"{name:<30} {result['model_requests']:>9.0f} {result['tool_calls']:>6.0f} "
+            f"{result['input_tokens']:>8.0f} {result['output_tokens']:>8.0f} {result['wall_s']:>7.2f}s  {compared}"
+        )
+
+    if args.update:
+        from config.settings import settings
+
+        baselines["scenarios"].update({
+            name: {metric: result[metric] for metric in (*COUNT_METRICS, *TOKEN_METRICS, *TIME_METRICS)}
+            for name, result in results.items()
+        })
+        baselines["environment"] = {
+            "python": platform.python_version(),
+            "model": f"{settings.LLM_PROVIDER}:{settings.LLM_MODEL}",
+            "cassettes": os.environ.get("LLM_CASSETTE_MODE", "off"),
+        }
+        BASELINES_FILE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"\n📝 Baselines written to {BASELINES_FILE.relative_to(BENCH_DIR)}")
+
+    if failed:
+        print(f"\n🚨 {len(failed)} scenario(s) regressed:")
+        for name, problems in failed.items():
+            print(f"   ├─ {name}")
+            for problem in problems:
+                print(f"   │    {problem}")
+        return 1 if args.check else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
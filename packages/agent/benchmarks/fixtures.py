@@ -0,0 +1,197 @@
+"""
+Realistic payload fixtures for the hot-path microbenchmarks.
+
+Sizes mirror what the React Native client actually sends: long chat
+histories (the client replays every message on each turn), receipts
+uploaded as ~1.5 MB base64 images, and sessions with a long
+transaction history.
+"""
+import base64
+import json
+import random
+from datetime import datetime, timezone
+
+from models.banking import BankingState, Payee, TransferDetails
+
+# Deterministic fixtures so baselines stay comparable between runs
+_rng = random.Random(1337)
+
+USER_TURNS = [
+    "Transfer RM50 to Ali at Maybank, account 1234567890",
+    "Saya nak bayar bil TNB bulan ni",
+    "What's my balance?",
+    "Please send RM 1,250.00 to Siti (CIMB Bank) acc 7012345678901 for rent",
+    "Can you pay my Unifi bill? Reference INV-2024-000123",
+    "Cancel that transfer please",
+    "Approve",
+]
+
+ASSISTANT_TURNS = [
+    "I'll help you set up a transfer of RM50 to Maybank.",
+    "Please upload a clear image of your TNB bill.",
+    "Your current balance is RM 1,000.00.",
+    "Transfer prepared successfully. Please review and confirm.",
+    "Transfer has been cancelled.",
+]
+
+
+def fake_image_b64(size_bytes: int = 1_500_000) -> str:
+    """Pseudo-random bytes encoded like a camera upload."""
+    return base64.b64encode(_rng.randbytes(size_bytes)).decode()
+
+
+def agui_history(turns: int = 200, with_image: bool = True) -> dict:
+    """An AG-UI run body with a long alternating history, image on the last user turn."""
+    messages = []
+    for i in range(turns):
+        messages.append({
+            "id": f"msg-u-{i}",
+            "role": "user",
+            "content": USER_TURNS[i % len(USER_TURNS)],
+        })
+        messages.append({
+            "id": f"msg-a-{i}",
+            "role": "assistant",
+            "content": ASSISTANT_TURNS[i % len(ASSISTANT_TURNS)],
+        })
+
+    last = {"id": "msg-u-last", "role": "user", "content": "Here's my bill"}
+    if with_image:
+        last["_image"] = {"format": "jpeg", "bytes": fake_image_b64()}
+    messages.append(last)
+
+    return {
+        "threadId": "thread-bench",
+        "runId": "run-bench",
+        "state": {},
+        "tools": [],
+        "context": [],
+        "forwardedProps": {},
+        "messages": messages,
+    }
+
+
+def agui_history_content_array(turns: int = 200) -> dict:
+    """Same history, but the image arrives as an OpenAI-style data URL content block."""
+    body = agui_history(turns, with_image=False)
+    body["messages"][-1]["content"] = [
+        {"type": "text", "text": "Here's my bill"},
+        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{fake_image_b64()}"}},
+    ]
+    return body
+
+
+def request_chunks(body: dict, chunk_size: int = 65_536) -> list[dict]:
+    """Split a JSON body into the ASGI http.request messages uvicorn would deliver."""
+    raw = json.dumps(body).encode("utf-8")
+    chunks = [raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size)]
+    return [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def deep_payload(depth: int = 40, breadth: int = 4) -> dict:
+    """Nested forwardedProps-style payload with text keys scattered at every level."""
+    node: dict = {"text": "leaf"}
+    for level in range(depth):
+        node = {
+            "content": f"level {level}",
+            "meta": {"query": USER_TURNS[level % len(USER_TURNS)], "flags": list(range(breadth))},
+            "children": [node] + [{"message": f"sibling {level}-{j}"} for j in range(breadth)],
+        }
+    return node
+
+
+def guardrail_candidates() -> list[str]:
+    """Long-ish user texts, none of which should trip the sanitization guardrail."""
+    return [" ".join(USER_TURNS) * 8 for _ in range(4)]
+
+
+def pii_log_line() -> str:
+    """A log line dense with IC numbers, account numbers, phones and emails."""
+    parts = []
+    for i in range(50):
+        parts.append(
+            f"user {i} ic 900101-14-{i:04d} acct {_rng.randint(10**11, 10**12 - 1)} "
+            f"phone +60123456{i:03d} mail user{i}@example.com.my"
+        )
+    return " | ".join(parts)
+
+
+def banking_state(history_size: int = 5_000) -> BankingState:
+    """A long-lived session: pending transfer plus a large transaction history."""
+    state = BankingState(balance=98_765.43)
+    state.pending_transfer = TransferDetails(
+        recipient_name="Siti Nurhaliza",
+        bank_name="CIMB Bank",
+        account_number="7012345678901",
+        amount=1_250.00,
+        reference="Rent",
+    )
+    state.status = "confirming_transfer"
+    state.transaction_history = [
+        f"Transferred RM {_rng.uniform(1, 5000):,.2f} to Recipient {i} (Maybank - ******{i % 10_000:04d})"
+        for i in range(history_size)
+    ]
+    return state
+
+
+PAYEE_NAMES = ["Ali", "Siti", "Ahmad", "Nurul", "Tan", "Lim", "Kumar", "Aisyah", "Wong", "Farah"]
+
+
+def payees(count: int = 200) -> list[Payee]:
+    """A heavy user's saved payees, a few with nicknames."""
+    now = datetime.now(timezone.utc)
+    return [
+        Payee(
+            id=i,
+            name=f"{_rng.choice(PAYEE_NAMES)} {_rng.choice(PAYEE_NAMES)} {i}",
+            nickname="mom" if i == 0 else (f"friend {i}" if i % 10 == 0 else None),
+            bank_name="Maybank",
+            account_number=f"{_rng.randint(10**9, 10**10 - 1)}",
+            use_count=_rng.randint(1, 50),
+            last_used=now,
+        )
+        for i in range(count)
+    ]
+
+
+class FakeRunResult:
+    """Quacks like an AgentRunResult for extract_tool_calls."""
+
+    def __init__(self, messages: list):
+        self._messages = messages
+
+    def all_messages(self) -> list:
+        return self._messages
+
+
+def run_result(turns: int = 50) -> FakeRunResult:
+    """A run with many tool-call round trips, mixing str and dict tool args."""
+    from pydantic_ai.messages import (
+        ModelRequest,
+        ModelResponse,
+        TextPart,
+        ToolCallPart,
+        ToolReturnPart,
+        UserPromptPart,
+    )
+
+    messages = []
+    for i in range(turns):
+        messages.append(ModelRequest(parts=[UserPromptPart(content=USER_TURNS[i % len(USER_TURNS)])]))
+        args = {
+            "recipient_name": f"Recipient {i}",
+            "bank_name": "Maybank",
+            "account_number": "1234567890",
+            "amount": 50.0 + i,
+        }
+        messages.append(ModelResponse(parts=[
+            ToolCallPart(tool_name="prepare_transfer", args=json.dumps(args) if i % 2 else args, tool_call_id=f"call-{i}"),
+        ]))
+        messages.append(ModelRequest(parts=[
+            ToolReturnPart(tool_name="prepare_transfer", content="ok", tool_call_id=f"call-{i}"),
+        ]))
+        messages.append(ModelResponse(parts=[TextPart(content=ASSISTANT_TURNS[i % len(ASSISTANT_TURNS)])]))
+    return FakeRunResult(messages)
@@ -0,0 +1,150 @@
+"""
+Offline load test for the core-banking gateway.
+
+Starts services/core_banking_simulator.py on a local port and drives
+HttpCoreBankingGateway from many concurrent "sessions", each reading its
+balance a few times per debit (the pattern of prepare -> confirm turns).
+Reports throughput, latency percentiles and how many calls actually
+reached the backend, so the effect of pooling, the balance cache and
+read coalescing can be measured without a real core-banking system.
+
+Usage (from packages/agent):
+    python benchmarks/load_core_banking.py
+    python benchmarks/load_core_banking.py --sessions 500 --concurrency 200 --latency-ms 80
+    python benchmarks/load_core_banking.py --error-rate 0.05
+    python benchmarks/load_core_banking.py --balance-ttl 0     # no cache, coalescing only
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+# The app modules are imported the same way uvicorn sees them (cwd = src)
+sys.path.insert(0, str(SRC_DIR))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("OPENAI_API_KEY", "bench-not-used")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_simulator(port: int, latency_ms: float, jitter_ms: float, error_rate: float) -> subprocess.Popen:
+    # A separate process, so the simulator doesn't compete with the client for the GIL
+    env = dict(
+        os.environ,
+        CORE_BANKING_SIM_LATENCY_MS=str(latency_ms),
+        CORE_BANKING_SIM_JITTER_MS=str(jitter_ms),
+        CORE_BANKING_SIM_ERROR_RATE=str(error_rate),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "services.core_banking_simulator:app",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=SRC_DIR, env=env,
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats").raise_for_status()
+            return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Simulator did not start")
+
+
+async def run_load(args, base_url: str) -> dict:
+    from core.metrics import metrics
+    from services.core_banking import CoreBankingError, HttpCoreBankingGateway, InsufficientFundsError
+
+    gateway = HttpCoreBankingGateway(base_url, 10.0, args.max_connections, args.max_connections, args.balance_ttl)
+    latencies: dict[str, list[float]] = {"balance": [], "debit": []}
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def timed(op: str, call):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            await call
+        except InsufficientFundsError:
+            pass
+        except CoreBankingError:
+            errors += 1
+        latencies[op].append(time.perf_counter() - start)
+
+    async def session(account: str):
+        async with semaphore:
+            for _ in range(args.debits):
+                # Balance is read by prepare, the runtime context and get_balance, often concurrently
+                await asyncio.gather(*(
+                    timed("balance", gateway.get_balance(account)) for _ in range(args.reads)
+                ))
+                await timed("debit", gateway.debit(account, round(random.uniform(1, 20), 2), uuid.uuid4().hex))
+
+    metrics.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(session(f"acct-{i}") for i in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    await gateway.close()
+    return {"elapsed": elapsed, "latencies": latencies, "errors": errors, "metrics": metrics.snapshot()}
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] if ordered else 0.0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100, help="sessions in flight at once")
+    parser.add_argument("--debits", type=int, default=3, help="debits per session")
+    parser.add_argument("--reads", type=int, default=3, help="concurrent balance reads before each debit")
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--balance-ttl", type=float, default=2.0)
+    parser.add_argument("--max-connections", type=int, default=100)
+    args = parser.parse_args()
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    simulator = start_simulator(port, args.latency_ms, args.jitter_ms, args.error_rate)
+    try:
+        result = asyncio.run(run_load(args, base_url))
+        backend_stats = httpx.get(f"{base_url}/stats").json()
+    finally:
+        simulator.terminate()
+
+    calls = sum(len(v) for v in result["latencies"].values())
+    counters = result["metrics"]["counters"]
+    print(f"{'op':<10} {'calls':>8} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for op, samples in result["latencies"].items():
+        print(
+            f"{op:<10} {len(samples):>8} {percentile(samples, 50) * 1000:>8.1f}ms "
+            f"{percentile(samples, 95) * 1000:>8.1f}ms {percentile(samples, 99) * 1000:>8.1f}ms"
+        )
+    print(f"\n⏱️  {calls} gateway calls in {result['elapsed']:.2f}s ({calls / result['elapsed']:.0f}/s)")
+    print(f"   ├─ Backend requests: {backend_stats}")
+    print(f"   ├─ Balance cache: " + ", ".join(
+        f"{k.split('=')[1].rstrip('}')}={v:.0f}" for k, v in counters.items() if k.startswith("core_banking.balance_cache")
+    ))
+    print(f"   └─ Errors surfaced: {result['errors']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
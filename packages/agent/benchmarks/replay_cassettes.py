@@ -0,0 +1,179 @@
+"""
+Replay recorded conversations against the current build.
+
+Reads the cassettes recorded with LLM_CASSETTE_MODE=record (see
+core/cassette.py), rebuilds each session's user turns from them and sends
+the turns through /api/chat in-process with LLM_CASSETTE_MODE=replay, so
+no provider or network is needed. For every turn it compares against the
+recording:
+
+- latency of the turn (model time is simulated with --latency),
+- model round trips (recorded vs replayed; a changed count means the new
+  build drives the conversation differently),
+- the reply (the recorded final model text vs what the build returned),
+- how requests matched: by key (byte-identical request), by sequence
+  (the build sent something new, e.g. a changed prompt) or not at all.
+
+Image turns need the original image: pass --images with files named
+<sha256>.<ext>; without it they are skipped (cassettes store images by hash).
+Turns of cassettes recorded with LLM_CASSETTE_REDACT (the default) are sent
+with their masked text, so they mostly match by sequence.
+
+Usage (from packages/agent):
+    python benchmarks/replay_cassettes.py src/data/cassettes
+    python benchmarks/replay_cassettes.py src/data/cassettes --latency 1.0 --repeat 3
+    python benchmarks/replay_cassettes.py src/data/cassettes --images ~/bills -v
+"""
+import argparse
+import base64
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+CHAT_TASKS = {"chat", "confirm"}
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] if ordered else 0.0
+
+
+def extract_turns(interactions: list[dict]) -> list[dict]:
+    """User turns of one session: each chat run starts with a single-request message list."""
+    from core.cassette import final_text
+
+    turns = []
+    for interaction in interactions:
+        starts_run = interaction["task"] in CHAT_TASKS and len(interaction["request"]) == 1
+        if starts_run:
+            prompt = next(p for p in interaction["request"][0]["parts"] if p["part_kind"] == "user-prompt")
+            content = prompt["content"] if isinstance(prompt["content"], list) else [prompt["content"]]
+            turns.append({
+                "text": next((c for c in content if isinstance(c, str)), None),
+                "image": next((c for c in content if isinstance(c, dict) and c.get("kind") == "binary"), None),
+                "round_trips": 0,
+                "reply": None,
+            })
+        if not turns:
+            continue
+        turns[-1]["round_trips"] += 1
+        if interaction["task"] in CHAT_TASKS and (text := final_text(interaction["response"])) is not None:
+            turns[-1]["reply"] = text
+    return turns
+
+
+def find_image(images_dir: Path | None, ref: dict) -> dict | None:
+    if images_dir is None:
+        return None
+    for path in images_dir.glob(f"{ref['sha256']}.*"):
+        return {"bytes": base64.b64encode(path.read_bytes()).decode(), "format": path.suffix.lstrip(".")}
+    return None
+
+
+def replay_session(client, session: str, turns: list[dict], args, results: dict):
+    from core.metrics import metrics
+
+    for turn in turns:
+        message = {"role": "user", "content": turn["text"] or ""}
+        if turn["image"] is not None:
+            if (image := find_image(args.images, turn["image"])) is None:
+                results["skipped"] += 1
+                continue
+            message["image"] = image
+
+        before = metrics.snapshot()["counters"]
+        start = time.perf_counter()
+        response = client.post("/api/chat", json={"messages": [message]}, headers={"X-Session-Id": session})
+        results["latencies"].append(time.perf_counter() - start)
+        after = metrics.snapshot()["counters"]
+        delta = {k: after.get(k, 0) - before.get(k, 0) for k in after if k.startswith("cassette.")}
+
+        replayed = sum(v for k, v in delta.items() if k.startswith("cassette.replays"))
+        for k, v in delta.items():
+            results["matches"][k] = results["matches"].get(k, 0) + v
+        results["turns"] += 1
+        results["round_trips_recorded"] += turn["round_trips"]
+        results["round_trips_replayed"] += replayed
+        reply = response.json()["message"]["content"] if response.status_code == 200 else None
+        same_reply = turn["reply"] is not None and reply == turn["reply"]
+        results["failed"] += response.status_code != 200
+        results["same_round_trips"] += replayed == turn["round_trips"]
+        results["same_reply"] += same_reply
+        if args.verbose and (replayed != turn["round_trips"] or not same_reply):
+            print(f"   ├─ {session[:8]} {turn['text']!r}: HTTP {response.status_code}, "
+                  f"round trips {turn['round_trips']} -> {replayed:.0f}")
+            print(f"   │    recorded: {turn['reply']!r}")
+            print(f"   │    replayed: {reply!r}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cassettes", type=Path, help="directory of recorded cassettes")
+    parser.add_argument("--latency", type=float, default=0.0, help="scale of the recorded model latency (0 = instant)")
+    parser.add_argument("--repeat", type=int, default=1, help="replay every session this many times")
+    parser.add_argument("--images", type=Path, default=None, help="directory of <sha256>.<ext> images")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show turns that diverged")
+    args = parser.parse_args()
+    args.cassettes = args.cassettes.resolve()
+    args.images = args.images.expanduser().resolve() if args.images else None
+
+    # Configure the app before it is imported; state goes to a scratch directory
+    scratch = Path(tempfile.mkdtemp(prefix="replay-"))
+    os.environ.update(
+        LLM_CASSETTE_MODE="replay",
+        LLM_CASSETTE_DIR=str(args.cassettes),
+        LLM_CASSETTE_REPLAY_LATENCY=str(args.latency),
+        RESPONSE_CACHE_ENABLED="false",
+        AUDIT_DIR=str(scratch / "audit"),
+        PAYEE_DB_PATH=str(scratch / "payees.db"),
+        LEDGER_DB_PATH=str(scratch / "ledger.db"),
+        RATE_LIMIT_DB_PATH=str(scratch / "rate_limits.db"),
+        IDEMPOTENCY_DB_PATH=str(scratch / "idempotency.db"),
+        RATE_LIMIT="1000000/minute",
+    )
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("OPENAI_API_KEY", "replay-not-used")
+    sys.path.insert(0, str(SRC_DIR))
+    os.chdir(SRC_DIR)
+
+    from fastapi.testclient import TestClient
+
+    import main as app_main
+    from core.cassette import CASSETTE_GLOB, get_cassette_library, read_cassette
+
+    sessions = {path.stem: extract_turns(read_cassette(path)) for path in sorted(args.cassettes.glob(CASSETTE_GLOB))}
+    if not sessions:
+        print(f"No cassettes in {args.cassettes}")
+        return 1
+
+    results = {
+        "turns": 0, "skipped": 0, "failed": 0, "same_round_trips": 0, "same_reply": 0,
+        "round_trips_recorded": 0, "round_trips_replayed": 0, "latencies": [], "matches": {},
+    }
+    start = time.perf_counter()
+    with TestClient(app_main.app, raise_server_exceptions=False) as client:
+        for _ in range(args.repeat):
+            get_cassette_library().reset()
+            app_main.session_store.clear()
+            for session, turns in sessions.items():
+                replay_session(client, session, turns, args, results)
+    elapsed = time.perf_counter() - start
+
+    turns, latencies = results["turns"], results["latencies"]
+    print(f"📼  Replayed {turns} turns from {len(sessions)} sessions in {elapsed:.2f}s")
+    print(f"   ├─ Turn latency: p50 {percentile(latencies, 50) * 1000:.1f}ms, "
+          f"p95 {percentile(latencies, 95) * 1000:.1f}ms, p99 {percentile(latencies, 99) * 1000:.1f}ms")
+    print(f"   ├─ Model round trips: {results['round_trips_recorded']} recorded, "
+          f"{results['round_trips_replayed']:.0f} replayed ({results['same_round_trips']}/{turns} turns unchanged)")
+    print(f"   ├─ Replies unchanged: {results['same_reply']}/{turns}")
+    matches = ", ".join(f"{k}={v:.0f}" for k, v in sorted(results["matches"].items()))
+    print(f"   ├─ Requests: {matches or 'none'}")
+    print(f"   └─ Failed turns: {results['failed']}, skipped image turns: {results['skipped']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
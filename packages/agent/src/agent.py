@@ -1,64 +1,99 @@
-import logfire
 import logging
-from pydantic_ai import Agent, RunContext
-from pydantic_ai.ag_ui import StateDeps
+from typing import TYPE_CHECKING
 
 # Local Imports
 from config.settings import settings
-from models.banking import BankingState
-from core.model_factory import get_model
-from core.prompts import get_system_prompt
-from tools.banking import (
-    prepare_transfer,
-    prepare_bill_payment,
-    cancel_transfer,
-    cancel_payment,
-    confirm_transfer,
-    confirm_bill_payment,
-    get_balance,
-)
-from tools.vision import analyze_bill_image
+
+if TYPE_CHECKING:
+    from pydantic_ai import Agent
 
 # Setup Logger for this module
 logger = logging.getLogger("jom_kira.agent")
 
-# Configure logfire
-logfire.configure(send_to_logfire='if-token-present')
 
-def create_agent() -> Agent:
+def configure_observability():
+    """
+    Configure logfire. Called from the app lifespan rather than at import time,
+    so importing this module (and test collection) stays cheap.
+    """
+    import logfire
+    logfire.configure(send_to_logfire='if-token-present')
+
+
+def create_agent() -> "Agent":
     """
     Creates and configures the Agent instance.
     Called after logging is setup to ensure all logs are captured.
+    Heavy modules (pydantic_ai, openai, ag_ui) are imported here on first use.
     """
+    from pydantic_ai import Agent, RunContext
+    from pydantic_ai.messages import ModelMessage
+    from pydantic_ai.ag_ui import StateDeps
+
+    from models.banking import BankingState
+    from core.model_factory import build_model
+    from core.prompts import get_system_prompt, append_runtime_context
+    from core.audit import audited
+    from tools.banking import (
+        prepare_transfer,
+        prepare_transfer_to_payee,
+        prepare_bill_payment,
+        cancel_transfer,
+        cancel_payment,
+        confirm_transfer,
+        confirm_bill_payment,
+        get_balance,
+        get_payment_status,
+    )
+    from tools.vision import analyze_bill_image
+    from tools.availability import (
+        when_transfer_pending,
+        when_bill_pending,
+        when_payment_pending,
+        when_image_attached,
+        when_payees_saved,
+        when_payments_processing,
+    )
+
     system_prompt = get_system_prompt()
     logger.info(f"🚀  Starting {settings.APP_NAME} Agent...")
     logger.info(f"   └─ System Prompt: {len(system_prompt)} chars loaded")
 
+    async def add_context(
+        ctx: RunContext[StateDeps[BankingState]], messages: list[ModelMessage]
+    ) -> list[ModelMessage]:
+        """Add runtime context after the conversation, not ahead of it."""
+        return append_runtime_context(ctx, messages)
+
     # Initialize Agent using the modular factory
+    # Prompt layout (provider prefix caching): tool definitions and static
+    # instructions first, conversation next, runtime context appended last.
     agent_instance = Agent(
-        model=get_model(),
+        model=build_model(),
         deps_type=StateDeps[BankingState],
-        instructions=system_prompt
+        instructions=system_prompt,
+        history_processors=[add_context],
     )
 
-    @agent_instance.system_prompt
-    def add_context(ctx: RunContext[StateDeps[BankingState]]) -> str:
-        """Add runtime context to system prompt."""
-        from core.prompts import get_dynamic_context
-        return get_dynamic_context(ctx)
-
+    # Register Tools - keep this order stable; tool schemas are part of the cached prefix.
+    # `prepare` hooks hide tools that can't apply to the current state (see tools/availability.py).
+    # audited(): every call is recorded in the audit log (core/audit.py).
+    # sequential=True: tools share and mutate one BankingState, and calls awaited inline
+    # (not as detached tasks) are cancelled with the run when the client disconnects.
     # Register Tools - Transfers
-    agent_instance.tool(prepare_transfer)
-    agent_instance.tool(cancel_transfer)
-    agent_instance.tool(confirm_transfer)
-    
+    agent_instance.tool(audited(prepare_transfer), sequential=True)
+    agent_instance.tool(audited(cancel_transfer), prepare=when_transfer_pending, sequential=True)
+    agent_instance.tool(audited(confirm_transfer), prepare=when_transfer_pending, sequential=True)
+    agent_instance.tool(audited(prepare_transfer_to_payee), prepare=when_payees_saved, sequential=True)
+
     # Register Tools - Bill Payments
-    agent_instance.tool(prepare_bill_payment)
-    agent_instance.tool(confirm_bill_payment)
-    agent_instance.tool(cancel_payment)
-    
+    agent_instance.tool(audited(prepare_bill_payment), sequential=True)
+    agent_instance.tool(audited(confirm_bill_payment), prepare=when_bill_pending, sequential=True)
+    agent_instance.tool(audited(cancel_payment), prepare=when_payment_pending, sequential=True)
+
     # Register Tools - Utility
-    agent_instance.tool(get_balance)
-    agent_instance.tool(analyze_bill_image)
-    
+    agent_instance.tool(audited(get_balance), sequential=True)
+    agent_instance.tool(audited(get_payment_status), prepare=when_payments_processing, sequential=True)
+    agent_instance.tool(audited(analyze_bill_image), prepare=when_image_attached, sequential=True)
+
     return agent_instance
@@ -27,6 +27,45 @@ SUPPORTED_BILLERS = [
     "Indah Water",
 ]
 
+# Per-biller formats (mock values for the POC), checked after separators are stripped:
+# account/reference are full-match regexes, amounts in RM
+BILLER_FORMATS = {
+    "TNB": {"account": r"\d{12}", "account_hint": "12 digits", "reference": r"[A-Z0-9]{6,20}", "max_amount": 20000.00},
+    "Syabas": {"account": r"\d{10}", "account_hint": "10 digits", "reference": r"[A-Z0-9]{6,20}", "max_amount": 5000.00},
+    "Telekom Malaysia": {"account": r"\d{10}", "account_hint": "10 digits", "reference": r"[A-Z0-9]{6,20}", "max_amount": 5000.00},
+    "Unifi": {"account": r"\d{10}", "account_hint": "10 digits", "reference": r"[A-Z0-9]{6,20}", "max_amount": 5000.00},
+    "Astro": {"account": r"\d{10}", "account_hint": "10 digits", "reference": r"[A-Z0-9]{6,20}", "max_amount": 3000.00},
+    "Indah Water": {"account": r"\d{10,12}", "account_hint": "10-12 digits", "reference": r"[A-Z0-9]{6,20}", "max_amount": 3000.00},
+}
+
+# Informal names and abbreviations users type, per canonical name
+# (matching is case-, punctuation- and spacing-insensitive; see services/name_resolver.py)
+BANK_ALIASES = {
+    "Maybank": ["Malayan Banking", "Maybank2u", "M2U", "MBB"],
+    "CIMB Bank": ["CIMB", "CIMB Clicks", "CIMB Octo"],
+    "Public Bank": ["PBB", "PBe", "Public Bank Berhad"],
+    "RHB Bank": ["RHB", "RHB Now"],
+    "Hong Leong Bank": ["Hong Leong", "HLB", "HLBB", "HL Connect"],
+    "AmBank": ["Am Bank", "AmOnline", "AmBank Group"],
+    "Bank Islam": ["BIMB", "Bank Islam Malaysia"],
+    "OCBC Bank": ["OCBC"],
+    "Standard Chartered": ["StanChart", "SCB", "Standard Chartered Bank"],
+    "HSBC": ["HSBC Bank", "HSBC Malaysia"],
+    "UOB": ["United Overseas Bank", "UOB Bank"],
+    "Bank Rakyat": ["Rakyat", "iRakyat"],
+    "Affin Bank": ["Affin", "AffinBank"],
+    "Alliance Bank": ["Alliance", "Alliance Online"],
+}
+
+BILLER_ALIASES = {
+    "TNB": ["Tenaga", "Tenaga Nasional", "Tenaga Nasional Berhad", "myTNB"],
+    "Syabas": ["Air Selangor", "Pengurusan Air Selangor"],
+    "Telekom Malaysia": ["TM", "Telekom"],
+    "Unifi": ["TM Unifi", "unifi Home"],
+    "Astro": ["Astro Malaysia", "Astro TV"],
+    "Indah Water": ["IWK", "Indah Water Konsortium"],
+}
+
 # Structured Limits
 TRANSACTION_LIMITS = {
     "single_max": 10000.00,      # RM 10,000 per transfer
@@ -46,9 +85,14 @@ AMOUNT_PATTERN = r'^\d+(\.\d{1,2})?$'
 RESPONSES = {
     # Validation Errors
     "insufficient_balance": "Insufficient balance. Your current balance is RM {balance:.2f}.",
+    "core_banking_unavailable": "I couldn't reach the bank right now. Please try again in a moment.",
+    "payment_unresolved": "I couldn't confirm with the bank whether the payment went through. Please confirm again to check; you won't be charged twice.",
+    "payment_awaiting_resolution": "The bank hasn't confirmed whether your last payment went through. Please confirm it again to check before starting or cancelling a payment.",
     "invalid_amount": "Please provide a valid amount between RM {min_val:.2f} and RM {max_val:.2f}.",
     "unsupported_bank": "The bank '{bank}' is not in our supported list. Supported banks: Maybank, CIMB, Public Bank, RHB, Hong Leong, AmBank.",
+    "bank_suggestion": "I couldn't find the bank '{bank}'. Did you mean {suggestion}? Please confirm the bank name.",
     "invalid_account_number": "Invalid account number. Please provide a valid 10-16 digit account number.",
+    "daily_limit_exceeded": "This exceeds your daily limit of RM {limit:,.2f}. You can pay up to RM {remaining:,.2f} more in the next 24 hours.",
     
     # Language & Security
     "language_request": "I can best assist you in English. Please rephrase your request in English.",
@@ -57,10 +101,27 @@ RESPONSES = {
     # Scope & Flow
     "out_of_scope": "I can only help with bank transfers and bill payments. For {topic}, please contact our customer service.",
     "bank_not_found": "I couldn't identify that bank. Supported banks include: Maybank, CIMB, Public Bank, RHB, Hong Leong, AmBank.",
+    "unsupported_biller": "The biller '{biller}' is not supported. Supported billers: TNB, Syabas (Air Selangor), Telekom Malaysia, Unifi, Astro, Indah Water.",
+    "biller_suggestion": "I couldn't find the biller '{biller}'. Did you mean {suggestion}? Please confirm the biller name.",
+    "invalid_bill_details": "Some bill details don't look right: {errors}. Please check the bill and provide the correct values.",
+    "payee_not_found": "No saved payee matches '{payee}'. Please provide the recipient's name, bank and account number.",
+    "payee_ambiguous": "Several saved payees match '{payee}': {options}. Which one did you mean?",
     "transfer_pending": "You have a pending transfer. Please approve or decline it before starting a new one.",
     
     # Success Messages
     "transfer_prepared": "Transfer prepared successfully. Please review and confirm.",
     "transfer_completed": "Transfer completed successfully.",
+    "transfer_processing": "Transfer confirmed and is being processed. I'll have the result shortly.",
     "transfer_cancelled": "Transfer has been cancelled.",
+    "bill_prepared": "Bill payment prepared successfully. Please review and confirm.",
+    "bill_completed": "Bill payment completed successfully.",
+    "bill_processing": "Bill payment confirmed and is being processed. I'll have the result shortly.",
+    "payment_still_processing": "{description} is still being processed.",
+    "payment_settled": "{description} completed successfully.",
+    "payment_failed": "{description} could not be completed: {error}",
+    "no_payments_processing": "There are no payments being processed.",
+    "balance": "Your current balance is RM {balance:,.2f}.",
+    "bill_cancelled": "Bill payment has been cancelled.",
+    "no_pending_bill": "No pending bill payment found.",
+    "nothing_pending": "There is no pending transfer or bill payment to cancel.",
 }
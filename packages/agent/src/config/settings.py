@@ -6,6 +6,13 @@ class Settings(BaseSettings):
     # Supports "openai", "azure", "gemini", "claude" (via OpenAI compatible API)
     LLM_PROVIDER: Literal["openai", "azure", "gemini", "claude"] = "openai"
     LLM_MODEL: str = "gpt-4o-mini"
+
+    # Task routing (see core/model_factory.py); unset tasks use LLM_MODEL.
+    # Vision tries LLM_MODEL_VISION first and escalates to
+    # LLM_MODEL_VISION_ESCALATION when the extraction is invalid or incomplete.
+    LLM_MODEL_CONFIRM: str | None = None
+    LLM_MODEL_VISION: str | None = None
+    LLM_MODEL_VISION_ESCALATION: str | None = None
     OPENAI_API_KEY: str | None = None
     
     # Custom Base URL for OpenAI compatible APIs (Gemini/Claude via proxy etc)
@@ -16,6 +23,40 @@ class Settings(BaseSettings):
     AZURE_OPENAI_ENDPOINT: str | None = None
     AZURE_DEPLOYMENT_NAME: str | None = None
     AZURE_OPENAI_API_VERSION: str | None = "2025-01-01-preview"
+
+    # Secondary LLM (OpenAI compatible) used for hedged requests; disabled while unset
+    SECONDARY_LLM_MODEL: str | None = None
+    SECONDARY_LLM_BASE_URL: str | None = None
+    SECONDARY_LLM_API_KEY: str | None = None
+
+    # Hedged requests: duplicate to the secondary if the primary's first token
+    # is slower than this percentile of recent first-token latencies
+    HEDGE_ENABLED: bool = False
+    HEDGE_PERCENTILE: float = 95.0
+    HEDGE_MIN_DELAY_S: float = 0.5
+    HEDGE_INITIAL_DELAY_S: float = 2.0
+    HEDGE_WINDOW: int = 200
+
+    # Model call resilience (per attempt timeout, retries, circuit breaker)
+    LLM_TIMEOUT_S: float = 30.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BASE_S: float = 0.5
+    LLM_RETRY_MAX_S: float = 8.0
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_S: float = 30.0
+
+    # Record/replay of model calls (core/cassette.py): "record" appends every
+    # request/response to LLM_CASSETTE_DIR, "replay" serves them from there
+    # without a provider, waiting LLM_CASSETTE_REPLAY_LATENCY x the recorded time.
+    # Recordings are written with PII masked unless LLM_CASSETTE_REDACT is off
+    # (only for synthetic conversations, e.g. benchmarks/golden)
+    LLM_CASSETTE_MODE: Literal["off", "record", "replay"] = "off"
+    LLM_CASSETTE_DIR: str = "data/cassettes"
+    LLM_CASSETTE_REPLAY_LATENCY: float = 0.0
+    LLM_CASSETTE_REDACT: bool = True
+
+    # Upper bound for X-Request-Deadline budgets
+    REQUEST_DEADLINE_MAX_S: float = 120.0
     
     # App Settings
     APP_NAME: str = "JomKira"
@@ -23,8 +64,90 @@ class Settings(BaseSettings):
     LOG_LEVEL: Literal["DEBUG", "INFO", "WARNING", "ERROR"] = "DEBUG"
     LOG_FORMAT: Literal["text", "json"] = "text"
 
-    # Rate Limiting
+    # Rate Limiting (token bucket per user/session, shared by all workers)
     RATE_LIMIT: str = "100/minute"
+    RATE_LIMIT_TEXT_COST: float = 1.0
+    RATE_LIMIT_IMAGE_COST: float = 5.0
+    RATE_LIMIT_DB_PATH: str = "data/rate_limits.db"
+
+    # Admission control for agent runs (per worker)
+    MAX_CONCURRENT_RUNS: int = 8
+    RUN_QUEUE_SIZE: int = 32
+    RUN_QUEUE_TIMEOUT_S: float = 15.0
+
+    # Idempotency-Key handling for /api/chat
+    IDEMPOTENCY_DB_PATH: str = "data/idempotency.db"
+    IDEMPOTENCY_TTL_S: float = 24 * 3600
+    IDEMPOTENCY_LEASE_S: float = 120.0
+    IDEMPOTENCY_POLL_S: float = 0.25
+
+    # Transaction ledger (append-only, shared by all workers); BankingState
+    # only carries the most recent TRANSACTION_HISTORY_SIZE entries
+    LEDGER_DB_PATH: str = "data/ledger.db"
+    TRANSACTION_HISTORY_SIZE: int = 10
+    TRANSACTIONS_PAGE_SIZE: int = 20
+    TRANSACTIONS_PAGE_MAX: int = 100
+
+    # Saved payees (shared by all workers); each worker keeps a prefix index
+    # per user, reloaded from the database after PAYEE_INDEX_TTL_S
+    PAYEE_DB_PATH: str = "data/payees.db"
+    PAYEE_INDEX_TTL_S: float = 60.0
+    PAYEE_INDEX_MAX_OWNERS: int = 10000
+    PAYEE_SUGGESTIONS_MAX: int = 20
+
+    # Core banking: "mock" keeps the balance in BankingState (POC default),
+    # "http" calls CORE_BANKING_URL (see services/core_banking.py)
+    CORE_BANKING_BACKEND: Literal["mock", "http"] = "mock"
+    CORE_BANKING_URL: str = "http://localhost:8100"
+    CORE_BANKING_TIMEOUT_S: float = 5.0
+    CORE_BANKING_MAX_CONNECTIONS: int = 100
+    CORE_BANKING_MAX_KEEPALIVE: int = 20
+    CORE_BANKING_BALANCE_TTL_S: float = 2.0
+
+    # Background settlement with CORE_BANKING_BACKEND=http (services/settlement.py):
+    # confirmations queue an intent and return "processing"; 0 workers settles in the turn
+    SETTLEMENT_WORKERS: int = 4
+    # Attempts after which an ambiguous failure is reported for reconciliation (still retried)
+    SETTLEMENT_MAX_ATTEMPTS: int = 5
+    SETTLEMENT_RETRY_BASE_S: float = 0.5
+    SETTLEMENT_RETRY_MAX_S: float = 30.0
+    SETTLEMENT_LEASE_S: float = 30.0
+    SETTLEMENT_POLL_S: float = 1.0
+
+    # Local core-banking simulator (services/core_banking_simulator.py)
+    CORE_BANKING_SIM_INITIAL_BALANCE: float = 1000.0
+    CORE_BANKING_SIM_LATENCY_MS: float = 40.0
+    CORE_BANKING_SIM_JITTER_MS: float = 20.0
+    CORE_BANKING_SIM_ERROR_RATE: float = 0.0
+
+    # Audit log of tool executions: buffered in memory and group-committed
+    # (one write + fsync per interval) to rotating segment files
+    AUDIT_ENABLED: bool = True
+    AUDIT_DIR: str = "data/audit"
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_COMMIT_INTERVAL_MS: float = 50.0
+    AUDIT_SEGMENT_BYTES: int = 16 * 1024 * 1024
+
+    # Rolling 24h spend limit: width of the time buckets (accuracy of the window)
+    DAILY_LIMIT_BUCKET_S: int = 900
+
+    # Response cache for state-independent replies (per worker, LRU, keyed on
+    # the runtime context); opt-in
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_SIZE: int = 1024
+    RESPONSE_CACHE_TTL_S: float = 3600.0
+
+    # Admin endpoints & headers (disabled while unset)
+    ADMIN_API_KEY: str | None = None
+
+    # Shared secret the authenticating gateway sends as X-Gateway-Auth next to
+    # X-User-Id; X-User-Id is ignored while unset or when the secret mismatches
+    GATEWAY_AUTH_SECRET: str | None = None
+
+    # Profiling (X-Profile header for admins, or random sampling)
+    PROFILE_DIR: str = "profiles"
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL_MS: float = 5.0
     
     # CORS Configuration
     CORS_ALLOW_ORIGINS: list[str] = [
@@ -0,0 +1,165 @@
+"""
+Admission control for agent runs.
+
+At most MAX_CONCURRENT_RUNS agent runs talk to the model provider at once.
+Further runs wait in a bounded priority queue; when it is full the lowest
+priority waiter (or the newcomer) is shed with a 503 + Retry-After instead
+of piling more load onto a provider that is already throttling us.
+
+Turns that resolve a pending payment outrank free-form chat, which outranks
+vision uploads, so completing a payment keeps working under overload.
+"""
+import asyncio
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from functools import lru_cache
+
+from config.settings import settings
+from core.deadline import remaining_time
+from core.metrics import metrics
+
+logger = logging.getLogger("jom_kira.core.admission")
+
+
+class Priority(IntEnum):
+    """Lower value is served first."""
+    CRITICAL = 0  # confirm/cancel of a pending transfer or bill
+    NORMAL = 1    # free-form chat
+    BULK = 2      # vision uploads
+
+
+class AdmissionRejected(Exception):
+    """Raised when a run is shed because the wait queue is full or timed out."""
+
+    def __init__(self, priority: Priority, retry_after: float, reason: str):
+        self.priority = priority
+        self.retry_after = retry_after
+        self.reason = reason
+        super().__init__(f"Run rejected ({reason}, priority={priority.name})")
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: Priority
+    seq: int
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded, priority-ordered wait queue."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout_s: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self._active = 0
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+        # EWMA of run duration, used for Retry-After estimates
+        self._avg_run_s = 5.0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> float:
+        """Rough time until a newly queued run would start."""
+        return math.ceil(self._avg_run_s * (self.queued + 1) / self.max_concurrent)
+
+    async def acquire(self, priority: Priority):
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            metrics.increment("admission.admitted", priority=priority.name)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            worst = max(self._waiters)
+            if worst.priority <= priority:
+                metrics.increment("admission.shed", priority=priority.name, reason="queue_full")
+                raise AdmissionRejected(priority, self.retry_after(), "queue_full")
+            # Make room by shedding the lowest-priority, most recent waiter
+            self._waiters.remove(worst)
+            worst.future.set_exception(AdmissionRejected(worst.priority, self.retry_after(), "preempted"))
+            metrics.increment("admission.shed", priority=worst.priority.name, reason="preempted")
+
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        metrics.increment("admission.queued", priority=priority.name)
+        self._publish()
+
+        try:
+            # Don't queue past the request's own deadline
+            remaining = remaining_time()
+            timeout = self.queue_timeout_s if remaining is None else max(0.0, min(self.queue_timeout_s, remaining))
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=timeout)
+        except asyncio.TimeoutError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._publish()
+                metrics.increment("admission.shed", priority=priority.name, reason="timeout")
+                raise AdmissionRejected(priority, self.retry_after(), "timeout")
+            # The slot was handed over just as we timed out; keep it
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._publish()
+            elif waiter.future.done() and not waiter.future.exception():
+                self.release()
+            raise
+
+        # Re-raise a preemption delivered through the future
+        waiter.future.result()
+        metrics.increment("admission.admitted", priority=priority.name)
+
+    def release(self):
+        """Hand the slot to the best waiter, or free it."""
+        if self._waiters:
+            best = min(self._waiters)
+            self._waiters.remove(best)
+            best.future.set_result(None)
+        else:
+            self._active -= 1
+        self._publish()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority):
+        """Hold a run slot for the duration of the block."""
+        await self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._avg_run_s = 0.9 * self._avg_run_s + 0.1 * (time.perf_counter() - start)
+            self.release()
+
+    def _publish(self):
+        metrics.set_gauge("admission.active", self._active)
+        metrics.set_gauge("admission.queued", len(self._waiters))
+
+
+def classify_priority(has_pending_payment: bool, has_image: bool) -> Priority:
+    """Map a turn to its admission priority."""
+    if has_pending_payment:
+        return Priority.CRITICAL
+    if has_image:
+        return Priority.BULK
+    return Priority.NORMAL
+
+
+@lru_cache
+def get_admission_controller() -> AdmissionController:
+    """Process-wide controller built from settings on first use."""
+    return AdmissionController(
+        max_concurrent=settings.MAX_CONCURRENT_RUNS,
+        max_queue=settings.RUN_QUEUE_SIZE,
+        queue_timeout_s=settings.RUN_QUEUE_TIMEOUT_S,
+    )
@@ -0,0 +1,248 @@
+"""
+Append-only audit log of tool executions.
+
+Every banking tool call (prepares, confirms, cancels, lookups) is recorded
+with its caller, arguments (account numbers masked), outcome and
+duration. Writing and fsyncing each record inside the turn would put disk
+latency on every tool call, so recording only appends to an in-memory
+buffer; a background task group-commits the buffer every
+AUDIT_COMMIT_INTERVAL_MS with a single write + fsync. A crash loses at
+most the last interval. The buffer is bounded (AUDIT_QUEUE_SIZE): when
+the disk can't keep up, records are dropped and counted (audit.dropped)
+rather than stalling turns.
+
+Records go to segment files under AUDIT_DIR, one new segment per process
+start and every AUDIT_SEGMENT_BYTES, named so they sort by creation time.
+Each record is framed as
+
+    <u32 payload length> <u32 crc32(payload)> <JSON payload>
+
+so a reader stops cleanly at a torn tail left by a crash (short frame or
+checksum mismatch) instead of misreading it; segments are never appended
+to after a restart. read_audit() scans segments for the admin endpoint
+and offline tooling.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from collections.abc import Iterator
+from functools import lru_cache
+from pathlib import Path
+
+from config.settings import settings
+from core.context import session_id_ctx, user_id_ctx
+from core.metrics import metrics
+from utils.security import mask_account_number
+
+logger = logging.getLogger("jom_kira.core.audit")
+
+FRAME = struct.Struct("<II")
+SEGMENT_GLOB = "audit-*.log"
+
+# Arguments longer than this (e.g. base64 images) are recorded by size only
+MAX_ARG_CHARS = 256
+
+
+def encode_record(record: dict) -> bytes:
+    payload = json.dumps(record, separators=(",", ":"), default=str).encode()
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_segment(path: Path) -> Iterator[dict]:
+    """Records of one segment, stopping at the first torn or corrupt frame."""
+    data = path.read_bytes()
+    offset = 0
+    while offset + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, offset)
+        start, end = offset + FRAME.size, offset + FRAME.size + length
+        if end > len(data) or zlib.crc32(data[start:end]) != crc:
+            logger.warning(f"⚠️  Torn audit record in {path.name} at byte {offset}, skipping the rest")
+            return
+        yield json.loads(data[start:end])
+        offset = end
+
+
+def read_audit(directory: str) -> Iterator[dict]:
+    """All records, oldest segment first."""
+    for path in sorted(Path(directory).glob(SEGMENT_GLOB)):
+        yield from read_segment(path)
+
+
+class SegmentWriter:
+    """Appends framed batches to size-rotated segment files (called from a worker thread)."""
+
+    def __init__(self, directory: str, segment_bytes: int):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file = None
+        self._size = 0
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        # Exclusive create: never append to a segment another process (or a crash) left behind
+        while True:
+            path = self.directory / f"audit-{time.time_ns()}-{os.getpid()}.log"
+            try:
+                self._file = open(path, "xb")
+                break
+            except FileExistsError:
+                continue
+        self._size = 0
+        # Persist the new directory entry, or a crash could lose the whole segment
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def write_batch(self, records: list[dict]):
+        data = b"".join(encode_record(r) for r in records)
+        if self._file is None or (self._size and self._size + len(data) > self.segment_bytes):
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._size += len(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class AuditLog:
+    """Bounded in-memory buffer plus the group-commit task that drains it."""
+
+    def __init__(self, writer: SegmentWriter, queue_size: int, commit_interval_s: float):
+        self.writer = writer
+        self.queue_size = queue_size
+        self.commit_interval_s = commit_interval_s
+        self._buffer: list[dict] = []
+        self._task: asyncio.Task | None = None
+        self._closing: asyncio.Event | None = None
+
+    def record(self, record: dict) -> bool:
+        if len(self._buffer) >= self.queue_size:
+            metrics.increment("audit.dropped")
+            return False
+        self._buffer.append(record)
+        return True
+
+    def record_tool_call(
+        self,
+        tool: str,
+        call_id: str | None,
+        arguments: dict,
+        result: object,
+        started: float,
+        error: BaseException | None = None,
+    ) -> bool:
+        value = getattr(result, "return_value", result)  # ToolReturn or a plain value
+        outcome = value if isinstance(value, dict) else {}
+        return self.record({
+            "ts": time.time(),
+            "session_id": session_id_ctx.get(),
+            "user_id": user_id_ctx.get(),
+            "tool": tool,
+            "call_id": call_id,
+            "args": {name: _audit_value(name, v) for name, v in arguments.items()},
+            "success": outcome.get("success", error is None),
+            "status": outcome.get("status"),
+            "message": outcome.get("message"),
+            "error": repr(error) if error is not None else None,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        })
+
+    def start(self):
+        self._closing = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"🧾  Audit log: {self.writer.directory} (commit every {self.commit_interval_s * 1000:.0f}ms)")
+
+    async def stop(self):
+        """Commit whatever is buffered and close the segment."""
+        if self._task is not None:
+            self._closing.set()
+            await self._task
+            self._task = None
+        self.writer.close()
+
+    async def _run(self):
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.commit_interval_s)
+            except TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌  Audit commit failed: {e}")
+
+    async def flush(self):
+        """Write and fsync everything buffered so far, as one batch."""
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.writer.write_batch, batch)
+        except Exception:
+            metrics.increment("audit.lost", len(batch))
+            raise
+        metrics.increment("audit.records", len(batch))
+        metrics.increment("audit.commits")
+        metrics.set_gauge("audit.last_commit_ms", (time.perf_counter() - start) * 1000)
+
+
+def _audit_value(name: str, value):
+    if value is None:
+        return None
+    if name == "account_number":
+        return mask_account_number(str(value))
+    if isinstance(value, str) and len(value) > MAX_ARG_CHARS:
+        return f"<{len(value)} chars>"
+    return value
+
+
+@lru_cache
+def get_audit_log() -> AuditLog | None:
+    if not settings.AUDIT_ENABLED:
+        return None
+    return AuditLog(
+        SegmentWriter(settings.AUDIT_DIR, settings.AUDIT_SEGMENT_BYTES),
+        settings.AUDIT_QUEUE_SIZE,
+        settings.AUDIT_COMMIT_INTERVAL_MS / 1000,
+    )
+
+
+def audited(tool):
+    """Wrap a tool (first parameter: RunContext) so every call is audited."""
+    signature = inspect.signature(tool)
+    ctx_name = next(iter(signature.parameters))
+
+    @functools.wraps(tool)
+    async def wrapper(ctx, *args, **kwargs):
+        started = time.perf_counter()
+        result, error = None, None
+        try:
+            result = tool(ctx, *args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if (audit := get_audit_log()) is not None:
+                arguments = signature.bind(ctx, *args, **kwargs).arguments
+                del arguments[ctx_name]
+                audit.record_tool_call(tool.__name__, ctx.tool_call_id, arguments, result, started, error)
+
+    return wrapper
@@ -0,0 +1,377 @@
+"""
+Record/replay of model calls ("cassettes").
+
+Benchmarking and regression-testing real conversation flows shouldn't need
+the network or a provider key. With LLM_CASSETTE_MODE="record", every
+model returned by build_model() is wrapped in CassetteRecorder, which
+appends each request/response (streamed or not) to a cassette file under
+LLM_CASSETTE_DIR, one JSON line per model call and one file per session:
+
+    {"session", "task", "model", "key", "streamed", "ttft_ms", "latency_ms",
+     "tools", "request": [...messages], "response": {...}}
+
+Images and other binary inputs are stored by hash ({"sha256", "bytes"}),
+never their contents, so cassettes of production traffic hold no bill
+images. Tool calls and tool returns are part of the messages. With
+LLM_CASSETTE_REDACT (the default) the written request and response are
+masked too: account, IC and phone numbers and emails (utils.sanitizers),
+balances, and names in tool-call arguments and state. Names the user or the
+model write in free text are not recognised, so cassettes must still be
+handled as customer data. The key is computed before masking, so the same
+conversation still replays by key; but masked tool calls replay with
+masked arguments and fail validation, so record synthetic conversations
+(benchmarks/golden) with LLM_CASSETTE_REDACT=false.
+
+With LLM_CASSETTE_MODE="replay", build_model() returns a ReplayModel
+instead and no provider is ever built. Each request is matched by its key
+(a hash of the routed model, the tool names and the messages without
+timestamps); when the new build sends something the recording never saw
+(a changed prompt, a different date in the runtime context, a new
+transaction reference in a tool return), it falls back to the next recorded
+call of the same task in the session's cassette. A request with neither is
+a CassetteMissError. Replies wait LLM_CASSETTE_REPLAY_LATENCY times the
+recorded latency (0 = instant).
+
+Metrics: cassette.recorded{task}, cassette.replays{match=key|sequence}
+and cassette.misses. benchmarks/replay_cassettes.py replays recorded
+sessions through /api/chat and compares latency, round trips and replies.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+
+from pydantic_ai.messages import ModelMessagesTypeAdapter, ModelResponse, TextPart, ThinkingPart, ToolCallPart
+from pydantic_ai.models import Model, StreamedResponse
+from pydantic_ai.models.wrapper import WrapperModel
+
+from config.settings import settings
+from core.context import session_id_ctx
+from core.metrics import metrics
+from utils.sanitizers import sanitize_pii
+
+logger = logging.getLogger("jom_kira.core.cassette")
+
+CASSETTE_GLOB = "*.jsonl"
+NO_SESSION = "no-session"
+
+# Volatile fields that never make two requests different
+_UNKEYED = {"timestamp", "usage", "provider_response_id", "provider_details"}
+
+
+class CassetteMissError(Exception):
+    """Replay mode got a request the cassettes have no response for."""
+
+    def __init__(self, task: str, key: str):
+        self.task = task
+        self.key = key
+        super().__init__(f"No recorded {task} response for request {key[:12]}")
+
+
+def _hash_binary(value):
+    """Dumped messages with binary content replaced by its hash."""
+    if isinstance(value, list):
+        return [_hash_binary(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if value.get("kind") == "binary":
+        # pydantic serializes bytes as URL-safe base64
+        data = base64.urlsafe_b64decode(value["data"] + "=" * (-len(value["data"]) % 4))
+        return {"kind": "binary", "media_type": value.get("media_type"),
+                "sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)}
+    return {k: _hash_binary(v) for k, v in value.items()}
+
+
+# Fields naming a person (tool-call arguments, state snapshots), masked like
+# utils.sanitizers.sanitize_state
+_NAME_FIELDS = {"recipient_name", "nickname", "payee", "counterparty"}
+# "balance: RM 1,000.00", "balance is RM 1000.00", "New Balance: RM ..."
+_BALANCE_TEXT = re.compile(r"(balance\b[^\d\n]{0,20}RM ?)[\d,.]+", re.IGNORECASE)
+
+
+def _mask_name(name) -> str:
+    return name[:2] + "***" if isinstance(name, str) and name else "***"
+
+
+def _redact(value):
+    """A dumped message (or part of one) with PII masked, for writing."""
+    if isinstance(value, list):
+        return [_redact(v) for v in value]
+    if isinstance(value, str):
+        return sanitize_pii(_BALANCE_TEXT.sub(r"\1[BALANCE_REDACTED]", value))
+    if not isinstance(value, dict):
+        return value
+    if value.get("part_kind") == "tool-call":
+        args = value.get("args")
+        if isinstance(args, str):
+            try:
+                args = json.loads(args)
+            except ValueError:
+                return {**value, "args": _redact(args)}
+            return {**value, "args": json.dumps(_redact(args))}
+    redacted = {}
+    for k, v in value.items():
+        if k in _NAME_FIELDS and v is not None:
+            redacted[k] = _mask_name(v)
+        elif k == "balance" and isinstance(v, (int, float)):
+            redacted[k] = "[BALANCE_REDACTED]"
+        else:
+            redacted[k] = _redact(v)
+    return redacted
+
+
+def _strip_unkeyed(value):
+    if isinstance(value, list):
+        return [_strip_unkeyed(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _strip_unkeyed(v) for k, v in value.items() if k not in _UNKEYED}
+    return value
+
+
+def dump_messages(messages: list) -> list:
+    return _hash_binary(ModelMessagesTypeAdapter.dump_python(messages, mode="json"))
+
+
+def request_key(model_name: str, tools: list[str], dumped_messages: list) -> str:
+    body = json.dumps([model_name, tools, _strip_unkeyed(dumped_messages)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _tool_names(model_request_parameters) -> list[str]:
+    return sorted(t.name for t in [*model_request_parameters.function_tools, *model_request_parameters.output_tools])
+
+
+def load_response(dumped: dict) -> ModelResponse:
+    return ModelMessagesTypeAdapter.validate_python([dumped])[0]
+
+
+def final_text(dumped_response: dict) -> str | None:
+    """The text a recorded response ends the run with, if it has no tool calls."""
+    parts = dumped_response["parts"]
+    if any(p["part_kind"] == "tool-call" for p in parts):
+        return None
+    return "".join(p["content"] for p in parts if p["part_kind"] == "text")
+
+
+def read_cassette(path: Path) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class CassetteWriter:
+    """Appends interactions to one file per session (called from worker threads)."""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def append(self, interaction: dict):
+        line = json.dumps(interaction, separators=(",", ":"), default=str) + "\n"
+        path = self.directory / f"{interaction['session']}.jsonl"
+        with self._lock, open(path, "a") as f:
+            f.write(line)
+
+
+@lru_cache
+def get_cassette_writer() -> CassetteWriter:
+    return CassetteWriter(settings.LLM_CASSETTE_DIR)
+
+
+class CassetteRecorder(WrapperModel):
+    """Passes calls through to the real model and records them."""
+
+    def __init__(self, wrapped: Model, task: str):
+        super().__init__(wrapped)
+        self.task = task
+
+    async def _record(self, messages, model_request_parameters, response: ModelResponse,
+                      streamed: bool, started: float, ttft: float | None):
+        dumped = dump_messages(messages)
+        tools = _tool_names(model_request_parameters)
+        interaction = {
+            "session": session_id_ctx.get() or NO_SESSION,
+            "task": self.task,
+            "model": self.model_name,
+            "key": request_key(self.model_name, tools, dumped),
+            "streamed": streamed,
+            "ttft_ms": round(ttft * 1000, 3) if ttft is not None else None,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+            "tools": tools,
+            "request": dumped,
+            "response": ModelMessagesTypeAdapter.dump_python([response], mode="json")[0],
+        }
+        if settings.LLM_CASSETTE_REDACT:
+            interaction["request"] = _redact(interaction["request"])
+            interaction["response"] = _redact(interaction["response"])
+        try:
+            await asyncio.to_thread(get_cassette_writer().append, interaction)
+        except Exception as e:
+            # Recording must never fail the turn it records
+            logger.error(f"❌  Cassette write failed: {e}")
+            return
+        metrics.increment("cassette.recorded", task=self.task)
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        started = time.perf_counter()
+        response = await self.wrapped.request(messages, model_settings, model_request_parameters)
+        await self._record(messages, model_request_parameters, response, False, started, None)
+        return response
+
+    @asynccontextmanager
+    async def request_stream(self, messages, model_settings, model_request_parameters, run_context=None):
+        started = time.perf_counter()
+        async with self.wrapped.request_stream(messages, model_settings, model_request_parameters, run_context) as stream:
+            # Stream contexts open once the first chunk arrived (see core.hedging)
+            ttft = time.perf_counter() - started
+            yield stream
+        await self._record(messages, model_request_parameters, stream.get(), True, started, ttft)
+
+
+@dataclass
+class _Recording:
+    index: int
+    interaction: dict
+
+
+class CassetteLibrary:
+    """Every recorded interaction under a directory, indexed for replay."""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._by_key: dict[str, list[_Recording]] = {}
+        self._sessions: dict[str, list[_Recording]] = {}
+        self._cursors: dict[str, int] = {}
+        for path in sorted(self.directory.glob(CASSETTE_GLOB)):
+            recordings = [_Recording(i, interaction) for i, interaction in enumerate(read_cassette(path))]
+            self._sessions[path.stem] = recordings
+            for recording in recordings:
+                self._by_key.setdefault(recording.interaction["key"], []).append(recording)
+        logger.info(f"📼  Cassettes: {len(self._sessions)} sessions, {len(self._by_key)} distinct requests from {self.directory}")
+
+    def _by_key_for(self, session: str, cursor: int, key: str) -> _Recording | None:
+        """Same request, same response: this session's next recording of it, else any recording of it."""
+        candidates = self._by_key.get(key)
+        if not candidates:
+            return None
+        own = [r for r in candidates if r.interaction["session"] == session]
+        return next((r for r in own if r.index >= cursor), None) or (own or candidates)[0]
+
+    def match(self, session: str, task: str, key: str) -> tuple[dict, str] | None:
+        """The interaction to replay and how it matched ("key" or "sequence")."""
+        cursor = self._cursors.get(session, 0)
+        recording = self._by_key_for(session, cursor, key)
+        how = "key"
+        if recording is None:
+            recordings = self._sessions.get(session, [])
+            recording = next((r for r in recordings[cursor:] if r.interaction["task"] == task), None)
+            how = "sequence"
+        if recording is None:
+            return None
+        if recording.interaction["session"] == session:
+            self._cursors[session] = max(cursor, recording.index + 1)
+        return recording.interaction, how
+
+    def reset(self):
+        """Start every session from its first recorded call again."""
+        self._cursors.clear()
+
+
+@lru_cache
+def get_cassette_library() -> CassetteLibrary:
+    return CassetteLibrary(settings.LLM_CASSETTE_DIR)
+
+
+@dataclass
+class ReplayStreamedResponse(StreamedResponse):
+    """Streams a recorded response: each part as a single delta."""
+
+    _response: ModelResponse = field(kw_only=True)
+    _delay_s: float = field(kw_only=True)
+    _timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc), init=False)
+
+    async def _get_event_iterator(self):
+        for i, part in enumerate(self._response.parts):
+            if isinstance(part, TextPart):
+                if (event := self._parts_manager.handle_text_delta(vendor_part_id=i, content=part.content)) is not None:
+                    yield event
+            elif isinstance(part, ToolCallPart):
+                yield self._parts_manager.handle_tool_call_part(
+                    vendor_part_id=i, tool_name=part.tool_name, args=part.args, tool_call_id=part.tool_call_id
+                )
+            elif isinstance(part, ThinkingPart):
+                yield self._parts_manager.handle_thinking_delta(vendor_part_id=i, content=part.content)
+        self._usage = self._response.usage
+        self.finish_reason = self._response.finish_reason
+        if self._delay_s > 0:
+            await asyncio.sleep(self._delay_s)
+
+    @property
+    def model_name(self) -> str:
+        return self._response.model_name or ""
+
+    @property
+    def provider_name(self) -> str | None:
+        return "cassette"
+
+    @property
+    def timestamp(self) -> datetime:
+        return self._timestamp
+
+
+class ReplayModel(Model):
+    """Serves recorded responses for one task; never touches the network."""
+
+    def __init__(self, task: str, model_name: str, latency_scale: float):
+        super().__init__()
+        self.task = task
+        self._model_name = model_name
+        self.latency_scale = latency_scale
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
+    @property
+    def system(self) -> str:
+        return "cassette"
+
+    def _match(self, messages, model_request_parameters) -> dict:
+        key = request_key(self.model_name, _tool_names(model_request_parameters), dump_messages(messages))
+        session = session_id_ctx.get() or NO_SESSION
+        matched = get_cassette_library().match(session, self.task, key)
+        if matched is None:
+            metrics.increment("cassette.misses", task=self.task)
+            logger.warning(f"📼  Cassette miss: {self.task} request {key[:12]} in session {session[:8]}")
+            raise CassetteMissError(self.task, key)
+        interaction, how = matched
+        metrics.increment("cassette.replays", match=how)
+        return interaction
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        interaction = self._match(messages, model_request_parameters)
+        if self.latency_scale > 0:
+            await asyncio.sleep(interaction["latency_ms"] / 1000 * self.latency_scale)
+        return load_response(interaction["response"])
+
+    @asynccontextmanager
+    async def request_stream(self, messages, model_settings, model_request_parameters, run_context=None):
+        interaction = self._match(messages, model_request_parameters)
+        total = interaction["latency_ms"] / 1000 * self.latency_scale
+        ttft = (interaction["ttft_ms"] or interaction["latency_ms"]) / 1000 * self.latency_scale
+        if ttft > 0:
+            await asyncio.sleep(ttft)
+        yield ReplayStreamedResponse(
+            model_request_parameters,
+            _response=load_response(interaction["response"]),
+            _delay_s=max(0.0, total - ttft),
+        )
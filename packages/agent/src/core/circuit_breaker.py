@@ -0,0 +1,83 @@
+"""
+Circuit breaker for model providers.
+
+Kept free of SDK imports so the API layer can map CircuitOpenError to a
+503 without loading the model stack; see core.resilience for its use.
+"""
+import logging
+import time
+from functools import lru_cache
+
+from config.settings import settings
+from core.metrics import metrics
+
+logger = logging.getLogger("jom_kira.core.circuit_breaker")
+
+
+class CircuitOpenError(Exception):
+    """The model's circuit is open and no fallback is configured."""
+
+    def __init__(self, model_name: str, retry_after: float):
+        self.model_name = model_name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open for {model_name}")
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open)."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_s: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_s else "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_s - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_ignored(self):
+        """The call failed for a reason that says nothing about provider health."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"🔌 Circuit closed for {self.name}")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        metrics.set_gauge("circuit.open", 0, model=self.name)
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"🔌 Circuit opened for {self.name} after {self.failures} consecutive failures")
+                metrics.increment("circuit.opened", model=self.name)
+            self.opened_at = time.monotonic()
+            metrics.set_gauge("circuit.open", 1, model=self.name)
+
+
+@lru_cache
+def get_circuit_breaker(model_name: str) -> CircuitBreaker:
+    # Shared by every ResilientModel of the same model (get_model() runs per vision call)
+    return CircuitBreaker(model_name, settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_S)
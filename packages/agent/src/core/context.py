@@ -22,3 +22,28 @@ current_image_ctx: ContextVar[ImageData | None] = ContextVar(
     "current_image_ctx",
     default=None
 )
+
+
+# Monotonic deadline for the current request (set from X-Request-Deadline),
+# read by the admission queue and the model resilience layer
+request_deadline_ctx: ContextVar[float | None] = ContextVar(
+    "request_deadline_ctx",
+    default=None
+)
+
+
+# Session the current run belongs to (X-Session-Id, or the AG-UI thread id),
+# used to attribute ledger entries
+session_id_ctx: ContextVar[str | None] = ContextVar(
+    "session_id_ctx",
+    default=None
+)
+
+
+# Authenticated user (X-User-Id vouched for by the gateway, see
+# utils.security.authenticated_user_id), if any; saved payees belong
+# to the user, or to the session before a user is known
+user_id_ctx: ContextVar[str | None] = ContextVar(
+    "user_id_ctx",
+    default=None
+)
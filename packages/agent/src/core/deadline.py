@@ -0,0 +1,87 @@
+"""
+End-to-end request deadlines.
+
+Clients may send `X-Request-Deadline` as an absolute Unix timestamp
+(seconds, or milliseconds if larger than 1e12). DeadlineMiddleware turns it
+into a monotonic deadline, capped at REQUEST_DEADLINE_MAX_S, and stores it
+in `request_deadline_ctx` so every sub-call of the request (admission
+queue, model attempts and retries, the vision agent) can budget against
+the time that is actually left. Requests that arrive already expired get
+a 504 without doing any work.
+"""
+import json
+import logging
+import time
+
+from starlette.datastructures import Headers
+
+from config.settings import settings
+from core.context import request_deadline_ctx
+from core.metrics import metrics
+
+logger = logging.getLogger("jom_kira.core.deadline")
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before the work could finish."""
+
+
+def parse_deadline(value: str | None, now: float | None = None) -> float | None:
+    """Header value -> seconds remaining (may be <= 0), or None if absent/invalid."""
+    if not value:
+        return None
+    try:
+        timestamp = float(value)
+    except ValueError:
+        return None
+    if timestamp > 1e12:
+        timestamp /= 1000
+    return timestamp - (now if now is not None else time.time())
+
+
+def remaining_time() -> float | None:
+    """Seconds left before the current request's deadline, or None without one."""
+    deadline = request_deadline_ctx.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline():
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        metrics.increment("deadline.exceeded")
+        raise DeadlineExceeded()
+
+
+class DeadlineMiddleware:
+    """
+    ASGI Middleware that scopes X-Request-Deadline to the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        remaining = parse_deadline(Headers(scope=scope).get("x-request-deadline"))
+        if remaining is None:
+            return await self.app(scope, receive, send)
+
+        if remaining <= 0:
+            metrics.increment("deadline.expired_on_arrival")
+            logger.warning(f"⏰ Request arrived past its deadline ({-remaining:.2f}s late)")
+            body = json.dumps({"detail": "Request deadline exceeded."}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+            return
+
+        token = request_deadline_ctx.set(time.monotonic() + min(remaining, settings.REQUEST_DEADLINE_MAX_S))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_deadline_ctx.reset(token)
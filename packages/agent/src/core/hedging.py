@@ -0,0 +1,173 @@
+"""
+Hedged model requests.
+
+A slow first token from the primary provider dominates our tail latency.
+HedgedModel sends the request to the primary and, if nothing has arrived
+after the hedge delay, sends a duplicate to the secondary provider. The
+first to answer wins; the other request is cancelled.
+
+The delay is the HEDGE_PERCENTILE of recent primary first-token latencies
+(HEDGE_INITIAL_DELAY_S until enough samples exist), so only roughly the
+slowest (100 - percentile)% of requests are duplicated. While the primary's
+circuit isn't closed the primary ResilientModel may already be falling back
+to the secondary, so requests go straight to it unhedged rather than
+sending the secondary the same request twice. For streamed runs
+"first token" is the first chunk, which the OpenAI model reads before its
+stream context is entered.
+
+Metrics: hedge.requests, hedge.fired, hedge.wins{winner=...},
+hedge.skipped (circuit not closed) and the current hedge.delay_s gauge.
+"""
+import asyncio
+import logging
+import math
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from pydantic_ai.models import Model
+from pydantic_ai.models.wrapper import WrapperModel
+
+from config.settings import settings
+from core.metrics import metrics
+from core.resilience import ResilientModel
+
+logger = logging.getLogger("jom_kira.core.hedging")
+
+# Below this many samples the percentile is noise; use HEDGE_INITIAL_DELAY_S
+MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Sliding window of first-token latencies for one model."""
+
+    def __init__(self, window: int):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> float | None:
+        if len(self._samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+@lru_cache
+def get_latency_tracker(model_name: str) -> LatencyTracker:
+    # Shared by every HedgedModel of the same primary (e.g. the per-call vision agent)
+    return LatencyTracker(settings.HEDGE_WINDOW)
+
+
+class _StreamHolder:
+    """
+    Opens a model stream in its own task and holds it open until released,
+    so the stream context is entered and exited in the same task whichever
+    request wins.
+    """
+
+    def __init__(self, model: Model, args: tuple):
+        self.model = model
+        self.args = args
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.release = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    async def open(self):
+        self.task = asyncio.create_task(self._hold())
+        try:
+            return await asyncio.shield(self.ready)
+        except asyncio.CancelledError:
+            self.task.cancel()
+            raise
+
+    async def _hold(self):
+        try:
+            async with self.model.request_stream(*self.args) as response:
+                self.ready.set_result(response)
+                await self.release.wait()
+        except Exception as e:
+            if self.ready.done():
+                raise
+            self.ready.set_exception(e)
+        finally:
+            if not self.ready.done():
+                self.ready.cancel()
+
+
+class HedgedModel(WrapperModel):
+    """Wraps the primary model; hedges slow requests to `secondary`."""
+
+    def __init__(self, primary: ResilientModel, secondary: Model):
+        super().__init__(primary)
+        self.secondary = secondary
+        self.tracker = get_latency_tracker(primary.model_name)
+
+    def hedge_delay(self) -> float:
+        observed = self.tracker.percentile(settings.HEDGE_PERCENTILE)
+        delay = settings.HEDGE_INITIAL_DELAY_S if observed is None else max(settings.HEDGE_MIN_DELAY_S, observed)
+        metrics.set_gauge("hedge.delay_s", delay)
+        return delay
+
+    async def _race(self, start):
+        """Run start(model) on the primary, hedge to the secondary after the delay; first success wins."""
+        if self.wrapped.breaker.state != "closed":
+            # The primary is (or may be) falling back to the secondary already
+            metrics.increment("hedge.skipped")
+            return await start(self.wrapped)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        metrics.increment("hedge.requests")
+
+        primary = asyncio.ensure_future(start(self.wrapped))
+        tasks = {primary: "primary"}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+            if not done:
+                metrics.increment("hedge.fired")
+                logger.info(f"🏇 Hedging request to {self.secondary.model_name} after {loop.time() - started:.2f}s")
+                tasks[asyncio.ensure_future(start(self.secondary))] = "secondary"
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    winner = tasks[task]
+                    # A losing primary is still recorded: its latency is at least this long
+                    self.tracker.record(loop.time() - started)
+                    if len(tasks) > 1:
+                        metrics.increment("hedge.wins", winner=winner)
+                        logger.info(f"   └─ Hedge winner: {winner}")
+                    return task.result()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        return await self._race(lambda model: model.request(messages, model_settings, model_request_parameters))
+
+    @asynccontextmanager
+    async def request_stream(self, messages, model_settings, model_request_parameters, run_context=None):
+        args = (messages, model_settings, model_request_parameters, run_context)
+        holders: list[_StreamHolder] = []
+
+        async def start(model: Model):
+            holder = _StreamHolder(model, args)
+            holders.append(holder)
+            return await holder.open()
+
+        try:
+            yield await self._race(start)
+        finally:
+            for holder in holders:
+                holder.release.set()
+            await asyncio.gather(*(h.task for h in holders if h.task), return_exceptions=True)
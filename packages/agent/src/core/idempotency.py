@@ -0,0 +1,210 @@
+"""
+Idempotency-Key support for /api/chat.
+
+Mobile clients retry POSTs on flaky networks. With an `Idempotency-Key`
+header, each logical request runs the agent once:
+
+- Concurrent duplicates in this worker await the same in-flight run
+  (single-flight) and receive its response.
+- Duplicates on other workers see the SQLite claim and poll until the
+  owner stores the response.
+- Completed responses are kept for IDEMPOTENCY_TTL_S and replayed
+  byte-for-byte with an `Idempotent-Replayed: true` header.
+
+Keys are scoped to the caller's session (or IP before a session exists),
+and reusing a key with a different body is rejected with 422.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from starlette.datastructures import Headers
+
+from config.settings import settings
+from core.metrics import metrics
+from core.sqlite import SQLiteStore
+from utils.asgi import buffer_request, replay_receive
+
+logger = logging.getLogger("jom_kira.core.idempotency")
+
+IDEMPOTENT_PATHS = ("/api/chat",)
+MAX_KEY_LENGTH = 255
+
+# Responses worth replaying; 429/5xx are transient and must be retried for real,
+# and 499 means the client disconnected before the run finished
+_RETRYABLE_STATUSES = {429, 499, 500, 502, 503, 504}
+
+
+@dataclass
+class StoredResponse:
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+    fingerprint: str
+
+
+class IdempotencyStore(SQLiteStore):
+    """Claims and completed responses, shared by all workers."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS idempotency (
+            key TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            state TEXT NOT NULL,
+            status INTEGER,
+            headers TEXT,
+            body BLOB,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency (expires_at);
+    """
+
+    def claim(self, key: str, fingerprint: str, lease_s: float) -> StoredResponse | None | bool:
+        """
+        Returns the stored response if the key is done, True if another
+        worker holds a live claim, or None once this caller owns the claim.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT fingerprint, state, status, headers, body, expires_at FROM idempotency WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row and row[5] > now:
+                if row[1] == "done":
+                    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(row[3])]
+                    return StoredResponse(row[2], headers, row[4], row[0])
+                return True
+
+            conn.execute(
+                "INSERT INTO idempotency (key, fingerprint, state, expires_at) VALUES (?, ?, 'pending', ?) "
+                "ON CONFLICT(key) DO UPDATE SET fingerprint = excluded.fingerprint, state = 'pending', "
+                "status = NULL, headers = NULL, body = NULL, expires_at = excluded.expires_at",
+                (key, fingerprint, now + lease_s),
+            )
+        return None
+
+    def complete(self, key: str, response: StoredResponse, ttl_s: float):
+        headers = json.dumps([(k.decode("latin-1"), v.decode("latin-1")) for k, v in response.headers])
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE idempotency SET state = 'done', status = ?, headers = ?, body = ?, expires_at = ? "
+                "WHERE key = ?",
+                (response.status, headers, response.body, time.time() + ttl_s, key),
+            )
+            conn.execute("DELETE FROM idempotency WHERE expires_at < ?", (time.time(),))
+
+    def release(self, key: str):
+        """Drop a claim without a response so a retry runs again."""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM idempotency WHERE key = ? AND state = 'pending'", (key,))
+
+
+@lru_cache
+def get_idempotency_store() -> IdempotencyStore:
+    return IdempotencyStore(settings.IDEMPOTENCY_DB_PATH)
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI Middleware implementing Idempotency-Key single-flight and replay.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # key -> future resolving to the owner's StoredResponse (None if it wasn't cacheable)
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope.get("path") not in IDEMPOTENT_PATHS:
+            return await self.app(scope, receive, send)
+
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        if not idempotency_key:
+            return await self.app(scope, receive, send)
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return await self._send_error(send, 400, "Idempotency-Key is too long.")
+
+        body, messages = await buffer_request(receive)
+        client = scope.get("client")
+        caller = headers.get("x-session-id") or (client[0] if client else "unknown")
+        key = hashlib.sha256(f"{caller}:{scope['path']}:{idempotency_key}".encode()).hexdigest()
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        # Same worker: coalesce onto the in-flight run
+        inflight = self._inflight.get(key)
+        while inflight is not None:
+            metrics.increment("idempotency.coalesced")
+            response = await asyncio.shield(inflight)
+            if response is not None:
+                return await self._replay(send, response, fingerprint)
+            # The owner's outcome wasn't cacheable; run again (or join whoever does)
+            inflight = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        store = get_idempotency_store()
+        result = None
+        owns_claim = False
+
+        try:
+            while True:
+                claim = await asyncio.to_thread(store.claim, key, fingerprint, settings.IDEMPOTENCY_LEASE_S)
+                if isinstance(claim, StoredResponse):
+                    metrics.increment("idempotency.replayed")
+                    result = claim
+                    return await self._replay(send, claim, fingerprint)
+                if claim is None:
+                    owns_claim = True
+                    break
+                # Another worker owns it; wait for its response or for the lease to lapse
+                await asyncio.sleep(settings.IDEMPOTENCY_POLL_S)
+
+            captured = StoredResponse(status=500, headers=[], body=b"", fingerprint=fingerprint)
+            chunks = []
+
+            async def capture_send(message):
+                if message["type"] == "http.response.start":
+                    captured.status = message["status"]
+                    captured.headers = [(bytes(k), bytes(v)) for k, v in message.get("headers", [])]
+                elif message["type"] == "http.response.body":
+                    chunks.append(message.get("body", b""))
+                await send(message)
+
+            await self.app(scope, replay_receive(messages, receive), capture_send)
+            captured.body = b"".join(chunks)
+            if captured.status not in _RETRYABLE_STATUSES:
+                await asyncio.to_thread(store.complete, key, captured, settings.IDEMPOTENCY_TTL_S)
+                result = captured
+        finally:
+            if owns_claim and result is None:
+                await asyncio.shield(asyncio.to_thread(store.release, key))
+            future.set_result(result)
+            self._inflight.pop(key, None)
+
+    async def _replay(self, send, response: StoredResponse, fingerprint: str):
+        if response.fingerprint != fingerprint:
+            logger.warning("🚨 Idempotency-Key reused with a different request body")
+            return await self._send_error(send, 422, "Idempotency-Key was already used with a different request.")
+
+        await send({
+            "type": "http.response.start",
+            "status": response.status,
+            "headers": response.headers + [(b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": response.body, "more_body": False})
+
+    @staticmethod
+    async def _send_error(send, status: int, detail: str):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body, "more_body": False})
@@ -0,0 +1,143 @@
+"""
+Append-only transaction ledger.
+
+Completed transfers and bill payments are stored as structured rows in
+SQLite, shared by all workers. BankingState keeps only the last
+TRANSACTION_HISTORY_SIZE summaries for the chat UI, so state snapshots,
+ChatResponse.state and tool results stay the same size however old the
+account is; older entries are read a page at a time from
+/api/sessions/{id}/transactions.
+
+Pages are keyset-paginated on the ledger id (newest first): the cursor is
+the id of the last entry returned, so a page costs one index range scan
+regardless of how deep the client has scrolled.
+
+The first payment of a session records who owns it (session_owners): the
+authenticated user, or the session itself. Only that user may read the
+session's ledger and settlements; an anonymous session's unguessable id is
+its own credential.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from config.settings import settings
+from core.context import session_id_ctx
+from core.metrics import metrics
+from core.payees import current_owner
+from core.spend_limits import get_spend_tracker
+from core.sqlite import SQLiteStore
+from models.banking import BankingState, LedgerEntry
+
+logger = logging.getLogger("jom_kira.core.ledger")
+
+
+class TransactionLedger(SQLiteStore):
+    """Ledger rows per session; rows are only ever inserted."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            type TEXT NOT NULL,
+            amount REAL NOT NULL,
+            counterparty TEXT NOT NULL,
+            account TEXT NOT NULL,
+            reference TEXT,
+            description TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transactions_session ON transactions (session_id, id);
+        CREATE INDEX IF NOT EXISTS idx_transactions_session_time ON transactions (session_id, created_at);
+        CREATE TABLE IF NOT EXISTS session_owners (
+            session_id TEXT PRIMARY KEY,
+            owner TEXT NOT NULL
+        );
+    """
+
+    @staticmethod
+    def claim_session(conn, session_id: str, owner: str):
+        """Record the session's owner on its first payment, within the caller's transaction."""
+        conn.execute("INSERT OR IGNORE INTO session_owners (session_id, owner) VALUES (?, ?)", (session_id, owner))
+
+    def owner_of(self, session_id: str) -> str | None:
+        row = self._connection().execute(
+            "SELECT owner FROM session_owners WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def insert(conn, session_id: str, entry: LedgerEntry) -> int:
+        """Insert within the caller's transaction (see services/settlement.py)."""
+        return conn.execute(
+            "INSERT INTO transactions "
+            "(session_id, type, amount, counterparty, account, reference, description, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                session_id, entry.type, entry.amount, entry.counterparty, entry.account,
+                entry.reference, entry.description, entry.created_at.timestamp(),
+            ),
+        ).lastrowid
+
+    def append(self, session_id: str, entry: LedgerEntry) -> int:
+        with self.transaction() as conn:
+            return self.insert(conn, session_id, entry)
+
+    def page(self, session_id: str, limit: int, before: int | None = None) -> list[LedgerEntry]:
+        """Up to `limit` entries older than id `before` (or the newest), newest first."""
+        rows = self._connection().execute(
+            "SELECT id, type, amount, counterparty, account, reference, description, created_at "
+            "FROM transactions WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (session_id, before if before is not None else 2 ** 63 - 1, limit),
+        ).fetchall()
+        return [
+            LedgerEntry(
+                id=row[0], type=row[1], amount=row[2], counterparty=row[3], account=row[4],
+                reference=row[5], description=row[6],
+                created_at=datetime.fromtimestamp(row[7], tz=timezone.utc),
+            )
+            for row in rows
+        ]
+
+
+@lru_cache
+def get_ledger() -> TransactionLedger:
+    return TransactionLedger(settings.LEDGER_DB_PATH)
+
+
+def _append_and_spend(session_id: str, owner: str, entry: LedgerEntry) -> int:
+    """Ledger entry and daily spend in one transaction (the spend table lives in the ledger database)."""
+    ledger = get_ledger()
+    with ledger.transaction() as conn:
+        entry_id = ledger.insert(conn, session_id, entry)
+        ledger.claim_session(conn, session_id, owner)
+        get_spend_tracker().add(conn, owner, entry.amount, entry.created_at.timestamp())
+    return entry_id
+
+
+def remember_transaction(state: BankingState, description: str):
+    """Keep the last TRANSACTION_HISTORY_SIZE summaries in the session state."""
+    state.transaction_history.append(description)
+    del state.transaction_history[:-settings.TRANSACTION_HISTORY_SIZE]
+
+
+async def record_transaction(state: BankingState, entry: LedgerEntry):
+    """
+    Add a completed transaction to the session state, the ledger and the
+    owner's daily spend.
+
+    The state is updated before the first await, so a run cancelled here
+    still leaves state and ledger in agreement (the insert finishes in its
+    worker thread).
+    """
+    remember_transaction(state, entry.description)
+
+    session_id = session_id_ctx.get()
+    if session_id is None:
+        logger.warning(f"⚠️  No session for ledger entry, not persisted ({entry.type})")
+        if (owner := current_owner()) is not None:
+            await asyncio.to_thread(get_spend_tracker().record, owner, entry.amount)
+        return
+    entry.id = await asyncio.to_thread(_append_and_spend, session_id, current_owner(), entry)
+    metrics.increment("ledger.entries", type=entry.type)
@@ -0,0 +1,73 @@
+"""
+In-process counters and gauges for operational metrics.
+
+Deliberately tiny: per-worker values, exposed to admins via
+/api/admin/metrics and logged where useful. Names are dotted
+("admission.shed"), labels are folded into the key.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger("jom_kira.core.metrics")
+
+
+class Metrics:
+    """Thread-safe counters and gauges keyed by name + labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = defaultdict(float)
+        self._gauges: dict[str, float] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, str]) -> str:
+        if not labels:
+            return name
+        rendered = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+        return f"{name}{{{rendered}}}"
+
+    def increment(self, name: str, value: float = 1, **labels: str):
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def get(self, name: str, **labels: str) -> float:
+        key = self._key(name, labels)
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0.0))
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges)}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+
+
+metrics = Metrics()
+
+
+def record_llm_usage(usage, task: str):
+    """
+    Record token usage for one agent run and the share of input tokens
+    the provider served from its prompt cache.
+    """
+    cached = usage.cache_read_tokens or 0
+    input_tokens = usage.input_tokens or 0
+    metrics.increment("llm.requests", usage.requests, task=task)
+    metrics.increment("llm.input_tokens", input_tokens, task=task)
+    metrics.increment("llm.output_tokens", usage.output_tokens or 0, task=task)
+    metrics.increment("llm.cache_read_tokens", cached, task=task)
+
+    total_input = metrics.get("llm.input_tokens", task=task)
+    if total_input:
+        metrics.set_gauge("llm.cache_hit_ratio", metrics.get("llm.cache_read_tokens", task=task) / total_input, task=task)
+
+    ratio = f"{cached / input_tokens:.0%}" if input_tokens else "-"
+    logger.info(f"🧮 Tokens ({task}): in {input_tokens} (cached {cached}, {ratio}), out {usage.output_tokens or 0}")
@@ -1,17 +1,128 @@
 import logging
-from openai import AsyncAzureOpenAI, AsyncOpenAI
-from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
+import re
+from functools import lru_cache
+
 from config.settings import settings
+from core.metrics import metrics
 
 logger = logging.getLogger("jom_kira.core.model_factory")
 
-def get_model():
+# Routing tasks
+CHAT = "chat"
+CONFIRM = "confirm"
+VISION = "vision"
+VISION_ESCALATION = "vision_escalation"
+
+
+# Replies that only approve or decline a pending payment
+_CONFIRMATION = re.compile(
+    r"^(yes|yeah|ya|yup|ok|okay|sure|confirm|confirmed|proceed|go ahead|do it|"
+    r"no|nope|cancel|stop|don't|do not|never mind)( please| pls)?[.! ]*$",
+    re.IGNORECASE,
+)
+
+
+def classify_turn(has_pending_payment: bool, text: str | None) -> str:
+    """Route a chat turn: short confirmations of a pending payment go to the CONFIRM tier."""
+    if has_pending_payment and text and _CONFIRMATION.match(text.strip()):
+        return CONFIRM
+    return CHAT
+
+
+def model_routes() -> dict[str, str]:
+    """
+    Routing table: task -> model name on the configured provider.
+    Unset task models fall back to LLM_MODEL.
+    """
+    return {
+        CHAT: settings.LLM_MODEL,
+        CONFIRM: settings.LLM_MODEL_CONFIRM or settings.LLM_MODEL,
+        VISION: settings.LLM_MODEL_VISION or settings.LLM_MODEL,
+        VISION_ESCALATION: settings.LLM_MODEL_VISION_ESCALATION or settings.LLM_MODEL_VISION or settings.LLM_MODEL,
+    }
+
+
+def vision_cascade() -> list[str]:
+    """Vision tiers to try in order; the escalation tier only if it is a different model."""
+    routes = model_routes()
+    return [VISION] if routes[VISION_ESCALATION] == routes[VISION] else [VISION, VISION_ESCALATION]
+
+
+def get_model(task: str = CHAT):
+    """
+    Returns the model routed for `task`, recording the decision in metrics.
+    Models are built once per task and reused, so every call shares the
+    same HTTP connection pool.
+    """
+    metrics.increment("routing.decisions", task=task, model=model_routes()[task])
+    return build_model(task)
+
+
+@lru_cache
+def build_model(task: str = CHAT):
+    """
+    Creates the LLM model for `task` behind the resilience layer (timeouts,
+    retries, circuit breaker). With SECONDARY_LLM_MODEL set, the secondary
+    is the circuit-breaker fallback, and hedging target when HEDGE_ENABLED.
+    LLM_CASSETTE_MODE records the calls, or replays them without building
+    any provider model (see core/cassette.py).
+    """
+    model_name = model_routes()[task]
+    if settings.LLM_CASSETTE_MODE == "replay":
+        from core.cassette import ReplayModel
+        logger.info(f"📼  Replaying {task} ({model_name}) from {settings.LLM_CASSETTE_DIR}")
+        return ReplayModel(task, model_name, settings.LLM_CASSETTE_REPLAY_LATENCY)
+    if settings.LLM_CASSETTE_MODE == "record":
+        from core.cassette import CassetteRecorder
+        logger.info(f"📼  Recording {task} ({model_name}) to {settings.LLM_CASSETTE_DIR}")
+        return CassetteRecorder(_build_provider_model(model_name), task)
+    return _build_provider_model(model_name)
+
+
+def _build_provider_model(model_name: str):
+    from core.resilience import ResilientModel
+
+    secondary = ResilientModel(get_secondary_model()) if settings.SECONDARY_LLM_MODEL else None
+    model = ResilientModel(get_primary_model(None if model_name == settings.LLM_MODEL else model_name), fallback=secondary)
+    if secondary is not None:
+        logger.info(f"   └─ Secondary: {settings.SECONDARY_LLM_MODEL}")
+    if settings.HEDGE_ENABLED and secondary is not None:
+        from core.hedging import HedgedModel
+        return HedgedModel(model, secondary)
+    return model
+
+
+def _client_options() -> dict:
+    # Retries are handled by core.resilience, not the SDK
+    return {"timeout": settings.LLM_TIMEOUT_S, "max_retries": 0}
+
+
+def get_secondary_model():
+    """The secondary (OpenAI compatible) model used for fallback and hedging."""
+    from openai import AsyncOpenAI
+    from pydantic_ai.models.openai import OpenAIModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+    client = AsyncOpenAI(
+        api_key=settings.SECONDARY_LLM_API_KEY or settings.OPENAI_API_KEY,
+        base_url=settings.SECONDARY_LLM_BASE_URL,
+        **_client_options(),
+    )
+    return OpenAIModel(settings.SECONDARY_LLM_MODEL, provider=OpenAIProvider(openai_client=client))
+
+
+def get_primary_model(routed_model: str | None = None):
     """
     Creates and returns the configured LLM model with detailed startup logging.
+    The openai SDK is imported here so it is only loaded when a model is built.
+    `routed_model` overrides LLM_MODEL (and the Azure deployment) for a task route.
     """
+    from openai import AsyncAzureOpenAI, AsyncOpenAI
+    from pydantic_ai.models.openai import OpenAIModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+
     provider = settings.LLM_PROVIDER.lower()
-    model_name = settings.LLM_MODEL
+    model_name = routed_model or settings.LLM_MODEL
     
     logger.info(f"🤖  Initializing LLM Model...")
     logger.info(f"   ├─ Provider: {provider}")
@@ -20,9 +131,10 @@ def get_model():
     if provider == "openai":
         if settings.OPENAI_BASE_URL:
             logger.info(f"   └─ Base URL: {settings.OPENAI_BASE_URL}")
-            client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+            client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, **_client_options())
             return OpenAIModel(model_name, provider=OpenAIProvider(openai_client=client))
-        return OpenAIModel(model_name, provider=OpenAIProvider(api_key=settings.OPENAI_API_KEY))
+        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, **_client_options())
+        return OpenAIModel(model_name, provider=OpenAIProvider(openai_client=client))
 
     elif provider == "azure":
         logger.info(f"   └─ Endpoint: {settings.AZURE_OPENAI_ENDPOINT}")
@@ -30,13 +142,14 @@ def get_model():
             azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
             api_version=settings.AZURE_OPENAI_API_VERSION,
             api_key=settings.AZURE_OPENAI_API_KEY,
+            **_client_options(),
         )
         return OpenAIModel(
-            settings.AZURE_DEPLOYMENT_NAME or model_name, 
+            routed_model or settings.AZURE_DEPLOYMENT_NAME or model_name,
             provider=OpenAIProvider(openai_client=azure_client)
         )
     
     # Default fallback (OpenAI compatible)
     logger.warning(f"⚠️ Provider '{provider}' not explicitly handled, falling back to OpenAI-compatible client")
-    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, **_client_options())
     return OpenAIModel(model_name, provider=OpenAIProvider(openai_client=client))
@@ -0,0 +1,207 @@
+"""
+Saved payees.
+
+Every successful transfer upserts its counterparty (name, optional
+nickname, bank, account) into a per-owner payee table. The owner is the
+authenticated user (X-User-Id) or, before one is known, the session.
+
+Lookups go through an in-memory prefix trie per owner: every word start of
+a payee's name and nickname is inserted, and each trie node keeps the ids
+of the payees below it, so "mo" or "amin" finds "Siti Aminah (mom)" in
+O(len(prefix)). The trie backs both /api/payees?prefix= autocomplete and
+the prepare_transfer_to_payee tool, which turns "send 50 to mom" into a
+ready transfer in one tool call.
+
+SQLite is the source of truth across workers; each worker rebuilds an
+owner's trie from it after PAYEE_INDEX_TTL_S, and keeps at most
+PAYEE_INDEX_MAX_OWNERS tries (least recently used evicted).
+"""
+import asyncio
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from config.settings import settings
+from core.context import session_id_ctx, user_id_ctx
+from core.metrics import metrics
+from core.sqlite import SQLiteStore
+from models.banking import Payee, TransferDetails
+
+logger = logging.getLogger("jom_kira.core.payees")
+
+_WHITESPACE = re.compile(r"\s+")
+
+_COLUMNS = "id, name, nickname, bank_name, account_number, use_count, last_used"
+
+
+def normalize_payee_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).casefold()).strip()
+
+
+def current_owner() -> str | None:
+    """Owner of saved payees for the current run."""
+    return user_id_ctx.get() or session_id_ctx.get()
+
+
+def _row_to_payee(row) -> Payee:
+    return Payee(
+        id=row[0], name=row[1], nickname=row[2], bank_name=row[3], account_number=row[4],
+        use_count=row[5], last_used=datetime.fromtimestamp(row[6], tz=timezone.utc),
+    )
+
+
+class PayeeStore(SQLiteStore):
+    """Payees per owner, one row per (bank, account)."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS payees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner TEXT NOT NULL,
+            name TEXT NOT NULL,
+            nickname TEXT,
+            bank_name TEXT NOT NULL,
+            account_number TEXT NOT NULL,
+            use_count INTEGER NOT NULL DEFAULT 0,
+            last_used REAL NOT NULL,
+            UNIQUE (owner, bank_name, account_number)
+        );
+    """
+
+    def upsert(self, owner: str, details: TransferDetails, now: float) -> Payee:
+        with self.transaction() as conn:
+            row = conn.execute(
+                "INSERT INTO payees (owner, name, nickname, bank_name, account_number, use_count, last_used) "
+                "VALUES (?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT(owner, bank_name, account_number) DO UPDATE SET "
+                "name = excluded.name, nickname = COALESCE(excluded.nickname, payees.nickname), "
+                "use_count = payees.use_count + 1, last_used = excluded.last_used "
+                f"RETURNING {_COLUMNS}",
+                (owner, details.recipient_name, details.nickname, details.bank_name, details.account_number, now),
+            ).fetchone()
+        return _row_to_payee(row)
+
+    def load(self, owner: str) -> list[Payee]:
+        rows = self._connection().execute(
+            f"SELECT {_COLUMNS} FROM payees WHERE owner = ?", (owner,)
+        ).fetchall()
+        return [_row_to_payee(row) for row in rows]
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = {}
+        self.ids: set[int] = set()
+
+
+class PayeeIndex:
+    """Prefix trie over one owner's payee names and nicknames."""
+
+    def __init__(self, payees: list[Payee]):
+        self.loaded_at = time.monotonic()
+        self.payees: dict[int, Payee] = {}
+        self._root = _TrieNode()
+        for payee in payees:
+            self.add(payee)
+
+    @staticmethod
+    def _keys(payee: Payee) -> set[str]:
+        """Every word start of the name and nickname ("siti aminah" -> "siti aminah", "aminah")."""
+        keys = set()
+        for text in (payee.name, payee.nickname):
+            words = normalize_payee_text(text or "").split(" ")
+            keys.update(" ".join(words[i:]) for i in range(len(words)) if words[i])
+        return keys
+
+    def _walk(self, key: str, payee_id: int, insert: bool):
+        node = self._root
+        for char in key:
+            if insert:
+                node = node.children.setdefault(char, _TrieNode())
+                node.ids.add(payee_id)
+            else:
+                node = node.children.get(char)
+                if node is None:
+                    return
+                node.ids.discard(payee_id)
+
+    def add(self, payee: Payee):
+        if (previous := self.payees.get(payee.id)) is not None:
+            for key in self._keys(previous):
+                self._walk(key, previous.id, insert=False)
+        self.payees[payee.id] = payee
+        for key in self._keys(payee):
+            self._walk(key, payee.id, insert=True)
+
+    def search(self, prefix: str) -> list[Payee]:
+        """Payees with a name/nickname word starting with `prefix`, most used first."""
+        node = self._root
+        for char in normalize_payee_text(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        ids = node.ids if node is not self._root else self.payees.keys()
+        return sorted(
+            (self.payees[i] for i in ids),
+            key=lambda p: (p.use_count, p.last_used),
+            reverse=True,
+        )
+
+    def resolve(self, query: str) -> list[Payee]:
+        """Exact nickname/name matches if any, else prefix matches."""
+        text = normalize_payee_text(query)
+        if not text:
+            return []
+        matches = self.search(text)
+        exact = [
+            p for p in matches
+            if text in (normalize_payee_text(p.nickname or ""), normalize_payee_text(p.name))
+        ]
+        return exact or matches
+
+
+class PayeeDirectory:
+    """Per-worker cache of payee tries over the shared PayeeStore."""
+
+    def __init__(self, store: PayeeStore, ttl_s: float, max_owners: int):
+        self.store = store
+        self.ttl_s = ttl_s
+        self.max_owners = max_owners
+        self._indexes: OrderedDict[str, PayeeIndex] = OrderedDict()
+
+    async def index(self, owner: str) -> PayeeIndex:
+        index = self._indexes.get(owner)
+        if index is None or time.monotonic() - index.loaded_at > self.ttl_s:
+            index = PayeeIndex(await asyncio.to_thread(self.store.load, owner))
+            self._indexes[owner] = index
+            metrics.increment("payees.index_loads")
+            while len(self._indexes) > self.max_owners:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(owner)
+        return index
+
+    async def suggest(self, owner: str, prefix: str, limit: int) -> list[Payee]:
+        return (await self.index(owner)).search(prefix)[:limit]
+
+    async def resolve(self, owner: str, query: str) -> list[Payee]:
+        return (await self.index(owner)).resolve(query)
+
+    async def record(self, owner: str, details: TransferDetails) -> Payee:
+        payee = await asyncio.to_thread(self.store.upsert, owner, details, time.time())
+        if (index := self._indexes.get(owner)) is not None:
+            index.add(payee)
+        return payee
+
+
+@lru_cache
+def get_payee_directory() -> PayeeDirectory:
+    return PayeeDirectory(
+        PayeeStore(settings.PAYEE_DB_PATH),
+        settings.PAYEE_INDEX_TTL_S,
+        settings.PAYEE_INDEX_MAX_OWNERS,
+    )
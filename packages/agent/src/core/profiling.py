@@ -0,0 +1,171 @@
+"""
+Opt-in per-request CPU and memory profiling.
+
+A request is profiled when an admin sends `X-Profile: 1` (with a valid
+`X-Admin-Key`) or when it is picked by `PROFILE_SAMPLE_RATE`. The request
+is wrapped in a stack-sampling CPU profiler and a tracemalloc snapshot
+diff, and the results are written to `PROFILE_DIR/<request_id>/`:
+
+- cpu.folded   collapsed stacks, feed to flamegraph.pl / speedscope
+- memory.txt   top allocation growth by line during the request
+- summary.json timings and sample counts
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from uuid import uuid4
+
+from config.settings import settings
+from utils.security import is_admin_key
+
+logger = logging.getLogger("jom_kira.core.profiling")
+
+# Request ids become directory names, so only accept safe characters
+_SAFE_REQUEST_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# tracemalloc is process-global, so only one request is profiled at a time
+_profile_lock = threading.Lock()
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a background thread."""
+
+    def __init__(self, thread_id: int, interval_s: float):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="jom-kira-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """Brendan Gregg's collapsed-stack format, one stack per line."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+def deep_sizeof(obj, _seen: set[int] | None = None) -> int:
+    """Approximate retained size of an object graph in bytes."""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+class ProfilingMiddleware:
+    """
+    ASGI Middleware that profiles opted-in requests.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            return await self.app(scope, receive, send)
+
+        if not _profile_lock.acquire(blocking=False):
+            logger.info("⏱️  Profile skipped: another request is being profiled")
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode(errors="ignore")
+        if not _SAFE_REQUEST_ID.match(request_id):
+            request_id = str(uuid4())
+        path = scope.get("path", "")
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [[b"x-profile-id", request_id.encode()]]
+            await send(message)
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(25)
+        snapshot_before = tracemalloc.take_snapshot()
+        sampler = StackSampler(threading.get_ident(), settings.PROFILE_INTERVAL_MS / 1000)
+        sampler.start()
+        start = time.perf_counter()
+
+        logger.info(f"⏱️  Profiling request {request_id} ({path})")
+        try:
+            return await self.app(scope, receive, send_with_profile_id)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            sampler.stop()
+            snapshot_after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+            _profile_lock.release()
+            await asyncio.to_thread(
+                self._write_report, request_id, path, duration_ms, sampler, snapshot_before, snapshot_after
+            )
+
+    def _should_profile(self, scope) -> bool:
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-profile", b"").lower() in (b"1", b"true"):
+            admin_key = headers.get(b"x-admin-key", b"").decode()
+            if is_admin_key(admin_key):
+                return True
+            logger.warning(f"🚨 X-Profile ignored: missing or invalid admin key on {scope.get('path')}")
+            return False
+        return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+    @staticmethod
+    def _write_report(request_id, path, duration_ms, sampler, snapshot_before, snapshot_after):
+        out_dir = Path(settings.PROFILE_DIR) / request_id
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        (out_dir / "cpu.folded").write_text(sampler.folded())
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        stats = snapshot_after.filter_traces(filters).compare_to(snapshot_before.filter_traces(filters), "lineno")
+        (out_dir / "memory.txt").write_text("\n".join(str(stat) for stat in stats[:50]) + "\n")
+
+        summary = {
+            "request_id": request_id,
+            "path": path,
+            "duration_ms": round(duration_ms, 2),
+            "cpu_samples": sum(sampler.samples.values()),
+            "sample_interval_ms": settings.PROFILE_INTERVAL_MS,
+            "memory_growth_bytes": sum(stat.size_diff for stat in stats),
+        }
+        (out_dir / "summary.json").write_text(json.dumps(summary, indent=2))
+
+        logger.info(f"⏱️  Profile written: {out_dir}")
+        logger.info(f"   ├─ Duration: {duration_ms:.1f}ms")
+        logger.info(f"   └─ CPU samples: {summary['cpu_samples']}")
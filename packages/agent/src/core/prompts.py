@@ -1,9 +1,14 @@
+import hashlib
+from functools import lru_cache
 from textwrap import dedent
 from datetime import date
-from pydantic_ai import RunContext
+from typing import TYPE_CHECKING
 from config.settings import settings
 from config.constants import SUPPORTED_BANKS, TRANSACTION_LIMITS
 
+if TYPE_CHECKING:
+    from pydantic_ai import RunContext
+
 def get_system_prompt() -> str:
     """
     Returns the base system prompt for the JomKira banking assistant.
@@ -39,7 +44,7 @@ def get_system_prompt() -> str:
            - If you don't know something, say "I don't have that information".
            - NEVER make up account balances, transaction statuses, or bank policies.
            - NEVER claim a transfer was successful unless the tool execution explicitly confirmed success.
-           - If unsure about a bank name, ask: "Could you confirm the bank name?"
+           - Pass bank and biller names as the user wrote them (e.g. "CIMB", "maybank2u"); the tools resolve common short forms. Only ask "Could you confirm the bank name?" if the tool reports an unsupported bank.
 
         5. TRANSACTION SAFETY:
            - Daily transfer limit: RM {TRANSACTION_LIMITS['daily_max']:,.2f}
@@ -53,11 +58,12 @@ def get_system_prompt() -> str:
 
         1. BANK TRANSFERS:
            - Use 'prepare_transfer' to set up a transfer.
+           - If the user names a saved payee (e.g. "send 50 to mom") and 'prepare_transfer_to_payee' is available, use it instead of asking for bank and account details.
            - After calling 'prepare_transfer', OUTPUT NOTHING further in that turn - the UI will handle the confirmation card.
            - Only speak again after the user interacts with the card buttons.
 
         2. BILL PAYMENTS:
-           - Supported billers: TNB, Syabas, Telekom, Unifi, Astro.
+           - Supported billers: TNB, Syabas, Telekom, Unifi, Astro, Indah Water.
            - Use 'analyze_bill_image' for receipt scanning and detail extraction.
            - If the user uploads an image or mentions a "bill" in the context of an image, call 'analyze_bill_image()' immediately. The system will automatically provide the image to the tool.
            - CRITICAL CHAINING RULE: When 'analyze_bill_image' returns a JSON object with "is_valid_bill": true, you MUST immediately call 'prepare_bill_payment' in the SAME turn using the extracted values:
@@ -74,6 +80,10 @@ def get_system_prompt() -> str:
            - Use 'get_balance' tool.
            - Never reveal the exact balance in logs, but you may tell the user.
 
+        4. PAYMENT STATUS:
+           - A confirmation may return "being processed": tell the user it is processing; do not call the confirm tool again.
+           - When the user asks whether a payment went through and 'get_payment_status' is available, use it.
+
         ═══════════════════════════════════════════════════════════════
         🏦 SUPPORTED BANKS
         ═══════════════════════════════════════════════════════════════
@@ -83,18 +93,65 @@ def get_system_prompt() -> str:
         If a user mentions an unsupported bank, inform them you don't recognize it and suggest choosing from the list above.
     """).strip()
 
-def get_dynamic_context(ctx: RunContext) -> str:
+@lru_cache
+def get_prompt_version() -> str:
+    """
+    Short fingerprint of everything static that shapes a reply: the system
+    prompt and the configured model. Cached replies are keyed by it, so a
+    prompt edit or model switch invalidates them automatically.
+    """
+    fingerprint = f"{settings.LLM_PROVIDER}:{settings.LLM_MODEL}:{get_system_prompt()}"
+    return hashlib.sha256(fingerprint.encode()).hexdigest()[:12]
+
+
+def format_runtime_values(balance: float) -> tuple[str, str]:
+    """The date and balance strings exactly as they appear in the runtime context."""
+    return date.today().strftime('%d %B %Y'), f"{balance:,.2f}"
+
+
+RUNTIME_CONTEXT_HEADER = "📊 RUNTIME CONTEXT"
+
+
+def get_dynamic_context(ctx: "RunContext") -> str:
     """
     Returns dynamic context to be appended to the system prompt.
     """
-    balance = ctx.deps.state.balance
+    today, balance = format_runtime_values(ctx.deps.state.balance)
     has_pending = "Yes - awaiting confirmation" if ctx.deps.state.pending_transfer else "None"
     
     return dedent(f"""
         ═══════════════════════════════════════════════════════════════
-        📊 RUNTIME CONTEXT
+        {RUNTIME_CONTEXT_HEADER}
         ═══════════════════════════════════════════════════════════════
-        Current date: {date.today().strftime('%d %B %Y')}
-        User's current balance: RM {balance:,.2f}
+        Current date: {today}
+        User's current balance: RM {balance}
         Pending transfer: {has_pending}
     """).strip()
+
+
+def _is_runtime_context(part) -> bool:
+    return part.part_kind == "system-prompt" and RUNTIME_CONTEXT_HEADER in part.content
+
+
+def append_runtime_context(ctx: "RunContext", messages: list) -> list:
+    """
+    Message-history transform that keeps volatile context at the END of every request.
+
+    Providers cache prompts by exact prefix. The tool definitions and static
+    instructions come first and never change; placing the date/balance/pending
+    block after the conversation (instead of ahead of it, where a dynamic
+    system prompt would go) keeps that prefix - and the prior history -
+    byte-identical across turns, so it is served from the provider's cache.
+    """
+    from dataclasses import replace
+    from pydantic_ai.messages import ModelRequest, SystemPromptPart
+
+    cleaned = []
+    for message in messages:
+        if isinstance(message, ModelRequest) and any(_is_runtime_context(p) for p in message.parts):
+            message = replace(message, parts=[p for p in message.parts if not _is_runtime_context(p)])
+        cleaned.append(message)
+
+    last = cleaned[-1]
+    cleaned[-1] = replace(last, parts=[*last.parts, SystemPromptPart(content=get_dynamic_context(ctx))])
+    return cleaned
@@ -0,0 +1,144 @@
+"""
+Token-bucket rate limiting shared across workers.
+
+Each key (authenticated user or client IP, plus the session) owns
+one row in a SQLite table: the remaining tokens and when they were last
+refilled. Refill is computed lazily on access, so memory and storage are
+O(1) per key. SQLite in WAL mode with `BEGIN IMMEDIATE` serializes updates
+across uvicorn workers, so N workers still enforce one limit.
+"""
+import asyncio
+import logging
+import re
+import time
+from functools import lru_cache
+
+from config.settings import settings
+from core.sqlite import SQLiteStore
+from utils.security import authenticated_user_id
+
+logger = logging.getLogger("jom_kira.core.rate_limit")
+
+_PERIOD_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Idle buckets are full again and can be dropped; sweep every N consumes
+_PURGE_EVERY = 1000
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request's keys don't have enough tokens left."""
+
+    def __init__(self, keys: list[str], retry_after: float):
+        self.keys = keys
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit exceeded for {', '.join(keys)}")
+
+
+def parse_rate(rate: str) -> tuple[float, float]:
+    """Parse '100/minute' or '100 per minute' into (amount, period_seconds)."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*(?:/|per)\s*(second|minute|hour|day)s?\s*", rate)
+    if not match:
+        raise ValueError(f"Invalid rate limit '{rate}', expected e.g. '100/minute'")
+    return float(match.group(1)), _PERIOD_SECONDS[match.group(2)]
+
+
+class TokenBucketLimiter(SQLiteStore):
+    """SQLite-backed token buckets; capacity tokens, refilled continuously."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str, capacity: float, refill_per_second: float):
+        super().__init__(db_path)
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._calls = 0
+
+    def consume(self, keys: list[str], cost: float) -> float:
+        """
+        Atomically take `cost` tokens from every key's bucket.
+        Returns 0.0 when allowed, otherwise seconds until the request would fit.
+        Nothing is deducted unless all buckets can pay.
+        """
+        cost = min(cost, self.capacity)
+        now = time.time()
+
+        with self.transaction() as conn:
+            levels = {}
+            for key in keys:
+                row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    levels[key] = self.capacity
+                else:
+                    tokens, updated_at = row
+                    levels[key] = min(self.capacity, tokens + (now - updated_at) * self.refill_per_second)
+
+            retry_after = max(
+                ((cost - tokens) / self.refill_per_second for tokens in levels.values() if tokens < cost),
+                default=0.0,
+            )
+            if retry_after == 0.0:
+                levels = {key: tokens - cost for key, tokens in levels.items()}
+
+            conn.executemany(
+                "INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                [(key, tokens, now) for key, tokens in levels.items()],
+            )
+
+        self._calls += 1
+        if self._calls % _PURGE_EVERY == 0:
+            self.purge_idle()
+
+        return retry_after
+
+    def purge_idle(self) -> int:
+        """Delete buckets that have been idle long enough to be full again."""
+        full_after = self.capacity / self.refill_per_second
+        cursor = self._connection().execute(
+            "DELETE FROM buckets WHERE updated_at < ?", (time.time() - full_after,)
+        )
+        return cursor.rowcount
+
+    async def acquire(self, keys: list[str], cost: float):
+        """Consume tokens off the event loop; raises RateLimitExceeded when denied."""
+        retry_after = await asyncio.to_thread(self.consume, keys, cost)
+        if retry_after > 0:
+            raise RateLimitExceeded(keys, retry_after)
+
+
+def rate_limit_keys(headers, client_ip: str | None) -> list[str]:
+    """
+    Identities a request is charged against.
+    Every request is charged to the authenticated user (X-User-Id vouched for
+    by the gateway) or, without one, to the client IP: X-Session-Id is chosen
+    by the client, so a fresh one per request must not buy a fresh bucket.
+    The session bucket is charged on top so one chat can't drain a shared
+    carrier NAT IP for everyone behind it.
+    """
+    if user_id := authenticated_user_id(headers):
+        keys = [f"user:{user_id}"]
+    else:
+        keys = [f"ip:{client_ip or 'unknown'}"]
+    if session_id := headers.get("x-session-id"):
+        keys.append(f"session:{session_id}")
+    return keys
+
+
+def turn_cost(has_image: bool) -> float:
+    """Vision turns cost more than text turns."""
+    return settings.RATE_LIMIT_IMAGE_COST if has_image else settings.RATE_LIMIT_TEXT_COST
+
+
+@lru_cache
+def get_rate_limiter() -> TokenBucketLimiter:
+    """Process-wide limiter built from settings on first use."""
+    amount, period = parse_rate(settings.RATE_LIMIT)
+    logger.info(f"🚦  Rate limiter: {settings.RATE_LIMIT} per user/session")
+    logger.info(f"   └─ Store: {settings.RATE_LIMIT_DB_PATH}")
+    return TokenBucketLimiter(settings.RATE_LIMIT_DB_PATH, capacity=amount, refill_per_second=amount / period)
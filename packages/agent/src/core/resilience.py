@@ -0,0 +1,120 @@
+"""
+Resilience layer for model calls.
+
+ResilientModel wraps a provider model with:
+
+- a per-attempt timeout (LLM_TIMEOUT_S, shortened to the request deadline),
+- jittered exponential retry, only for transient errors (timeouts,
+  connection errors, 408/409/429/5xx),
+- a per-model circuit breaker: after CIRCUIT_FAILURE_THRESHOLD consecutive
+  transient failures calls fail fast (or go to the fallback model) for
+  CIRCUIT_RESET_S, then a single trial call decides whether to close it.
+
+For streamed requests the timeout and retries cover opening the stream
+(up to the first chunk); once tokens flow, the client's read timeout applies.
+"""
+import asyncio
+import logging
+import random
+from contextlib import AsyncExitStack, asynccontextmanager
+
+import httpx
+from openai import APIConnectionError
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.models import Model
+from pydantic_ai.models.wrapper import WrapperModel
+
+from config.settings import settings
+from core.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from core.deadline import DeadlineExceeded, check_deadline, remaining_time
+from core.metrics import metrics
+
+logger = logging.getLogger("jom_kira.core.resilience")
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, ModelHTTPError):
+        return exc.status_code in RETRYABLE_STATUSES
+    return isinstance(exc, (TimeoutError, APIConnectionError, httpx.TransportError))
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(settings.LLM_RETRY_MAX_S, settings.LLM_RETRY_BASE_S * 2 ** attempt))
+
+
+class ResilientModel(WrapperModel):
+    """Wraps a model with timeouts, retries and a circuit breaker; see module docstring."""
+
+    def __init__(self, wrapped: Model, fallback: Model | None = None):
+        super().__init__(wrapped)
+        self.fallback = fallback
+        self.breaker = get_circuit_breaker(wrapped.model_name)
+
+    def _attempt_timeout(self) -> tuple[float, bool]:
+        """Timeout for the next attempt, and whether it is bounded by the request deadline."""
+        check_deadline()
+        remaining = remaining_time()
+        if remaining is not None and remaining < settings.LLM_TIMEOUT_S:
+            return remaining, True
+        return settings.LLM_TIMEOUT_S, False
+
+    async def _call(self, start):
+        """Run start(model) with retries; start opens a request on the given model."""
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            if not self.breaker.allow():
+                if self.fallback is not None:
+                    metrics.increment("llm.fallback", model=self.model_name)
+                    logger.warning(f"🔀 {self.model_name} circuit open, using {self.fallback.model_name}")
+                    return await start(self.fallback)
+                raise CircuitOpenError(self.model_name, self.breaker.retry_after())
+
+            timeout, deadline_bound = self._attempt_timeout()
+            try:
+                async with asyncio.timeout(timeout):
+                    result = await start(self.wrapped)
+            except Exception as e:
+                if isinstance(e, TimeoutError) and deadline_bound:
+                    # The caller ran out of time; says nothing about provider health
+                    self.breaker.record_ignored()
+                    metrics.increment("deadline.exceeded")
+                    raise DeadlineExceeded() from e
+                if not is_retryable(e):
+                    # Our own request was bad (4xx etc.) - not a provider health signal
+                    self.breaker.record_ignored()
+                    raise
+                self.breaker.record_failure()
+                metrics.increment("llm.errors", model=self.model_name, kind=type(e).__name__)
+                if attempt == settings.LLM_MAX_RETRIES:
+                    raise
+
+                delay = backoff_delay(attempt)
+                remaining = remaining_time()
+                if remaining is not None and delay >= remaining:
+                    raise
+                logger.warning(f"🔁 {self.model_name} attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                metrics.increment("llm.retries", model=self.model_name)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (e.g. the losing side of a hedge); release a half-open trial
+                # or allow() would refuse every call from now on
+                self.breaker.record_ignored()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        return await self._call(lambda model: model.request(messages, model_settings, model_request_parameters))
+
+    @asynccontextmanager
+    async def request_stream(self, messages, model_settings, model_request_parameters, run_context=None):
+        async with AsyncExitStack() as stack:
+            yield await self._call(
+                lambda model: stack.enter_async_context(
+                    model.request_stream(messages, model_settings, model_request_parameters, run_context)
+                )
+            )
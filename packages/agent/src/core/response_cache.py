@@ -0,0 +1,85 @@
+"""
+Response cache for state-independent assistant replies.
+
+Out-of-scope and FAQ-style questions get the same answer from the static
+system prompt. Each /api/chat turn only sends the latest message to the
+agent, plus the runtime context (today's date and the user's balance), so
+a reply depends on nothing but the prompt text, that context and the
+prompt/model version - which is exactly the cache key. Keying on the
+context rather than scanning replies for it means a balance the model
+rephrased ("RM1000", "RM 1,000") can never be served to another user.
+
+Replies are only cached when the turn ran no tools, had no image and
+nothing was pending. Entries are evicted LRU and expire after
+RESPONSE_CACHE_TTL_S. Off by default (RESPONSE_CACHE_ENABLED).
+"""
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+
+from config.settings import settings
+from core.metrics import metrics
+from core.prompts import format_runtime_values, get_prompt_version
+from models.banking import BankingState
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_prompt(text: str) -> str:
+    """Case-, width- and whitespace-insensitive form of a user prompt."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+def is_cacheable_turn(state: BankingState, text: str | None, has_image: bool) -> bool:
+    """Only plain-text turns with nothing pending can share answers."""
+    return bool(text) and not has_image and not state.pending_transfer and not state.pending_bill
+
+
+class ResponseCache:
+    """LRU of (runtime context, normalized prompt) -> assistant reply, per worker."""
+
+    def __init__(self, max_entries: int, ttl_s: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    @staticmethod
+    def make_key(text: str, state: BankingState) -> str:
+        today, balance = format_runtime_values(state.balance)
+        return f"{get_prompt_version()}:{today}:{balance}:{normalize_prompt(text)}"
+
+    def get(self, text: str, state: BankingState) -> str | None:
+        key = self.make_key(text, state)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            metrics.increment("response_cache.miss")
+            return None
+        self._entries.move_to_end(key)
+        metrics.increment("response_cache.hit")
+        return entry[1]
+
+    def put(self, text: str, state: BankingState, output: str):
+        key = self.make_key(text, state)
+        self._entries[key] = (time.monotonic() + self.ttl_s, output)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.increment("response_cache.evicted")
+        metrics.set_gauge("response_cache.size", len(self._entries))
+
+    def purge(self) -> int:
+        count = len(self._entries)
+        self._entries.clear()
+        metrics.set_gauge("response_cache.size", 0)
+        return count
+
+
+@lru_cache
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL_S)
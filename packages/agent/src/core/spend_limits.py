@@ -0,0 +1,158 @@
+"""
+Rolling 24h spend limit (TRANSACTION_LIMITS["daily_max"]).
+
+Spend is kept per owner (the authenticated user, or the session before one
+is known; see core.payees.current_owner), so starting a new chat thread
+doesn't start a new day. Each owner's spend lives in time buckets
+(DAILY_LIMIT_BUCKET_S wide) in the ledger database, shared by all workers:
+N workers still enforce one limit, and recording a payment can share the
+transaction that appends its ledger entry or outbox intent.
+
+Recording a payment adds to its bucket; a check sums the owner's buckets
+inside the window, one index range scan of at most a day's worth of
+buckets however many payments were made. Buckets that fell out of the
+window are deleted as new spend is recorded, so idle owners don't
+accumulate rows.
+
+Buckets expire whole, one bucket after the 24h mark, so the window errs
+towards counting a payment slightly longer rather than releasing the limit
+early.
+
+A debit that ended without a definite answer (services/core_banking.py)
+may have moved the money, so it is held in unresolved_debits, keyed by its
+payment_id, and counts against the limit until it resolves or is a day
+old. Only a retry of a debit held there for the same owner and amount
+skips the limit check; the state's debit_unresolved flag comes from the
+client and is never trusted for that.
+"""
+import asyncio
+import logging
+import math
+import sqlite3
+import time
+from functools import lru_cache
+
+from config.constants import RESPONSES, TRANSACTION_LIMITS
+from config.settings import settings
+from core.metrics import metrics
+from core.payees import current_owner
+from core.sqlite import SQLiteStore
+
+logger = logging.getLogger("jom_kira.core.spend_limits")
+
+WINDOW_S = 24 * 3600
+
+
+class SpendTracker(SQLiteStore):
+    """Rolling spend per owner, in fixed time buckets."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS daily_spend (
+            owner TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            PRIMARY KEY (owner, bucket)
+        );
+        CREATE INDEX IF NOT EXISTS idx_daily_spend_bucket ON daily_spend (bucket);
+        CREATE TABLE IF NOT EXISTS unresolved_debits (
+            payment_id TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            amount REAL NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_unresolved_debits_owner ON unresolved_debits (owner, created_at);
+    """
+
+    def __init__(self, db_path: str, daily_max: float, bucket_s: float):
+        super().__init__(db_path)
+        self.daily_max = daily_max
+        self.bucket_s = bucket_s
+        # One extra bucket so a bucket only drops out once all of it is older than the window
+        self.buckets = math.ceil(WINDOW_S / bucket_s) + 1
+
+    def _oldest_bucket(self, now: float) -> int:
+        return int(now // self.bucket_s) - self.buckets + 1
+
+    def add(self, conn: sqlite3.Connection, owner: str, amount: float, at: float | None = None):
+        """
+        Add `amount` (negative to release) to the bucket of time `at`, within
+        the caller's transaction (see core/ledger.py, services/settlement.py).
+        """
+        now = time.time()
+        conn.execute(
+            "INSERT INTO daily_spend (owner, bucket, amount) VALUES (?, ?, ?) "
+            "ON CONFLICT (owner, bucket) DO UPDATE SET amount = amount + excluded.amount",
+            (owner, int((now if at is None else at) // self.bucket_s), amount),
+        )
+        conn.execute("DELETE FROM daily_spend WHERE bucket < ?", (self._oldest_bucket(now),))
+
+    def record(self, owner: str, amount: float, at: float | None = None):
+        with self.transaction() as conn:
+            self.add(conn, owner, amount, at)
+
+    def open_debit(self, payment_id: str, owner: str, amount: float, now: float | None = None) -> bool:
+        """
+        Hold a debit about to be sent as unresolved. False if `payment_id` is
+        already held for another owner or amount.
+        """
+        now = time.time() if now is None else now
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM unresolved_debits WHERE created_at < ?", (now - WINDOW_S,))
+            conn.execute(
+                "INSERT INTO unresolved_debits (payment_id, owner, amount, created_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (payment_id) DO NOTHING",
+                (payment_id, owner, amount, now),
+            )
+            row = conn.execute(
+                "SELECT owner, amount FROM unresolved_debits WHERE payment_id = ?", (payment_id,)
+            ).fetchone()
+        return row == (owner, amount)
+
+    def resolve_debit(self, payment_id: str):
+        """The backend answered definitely; a completed debit is recorded as spend by the caller."""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM unresolved_debits WHERE payment_id = ?", (payment_id,))
+
+    def is_unresolved(self, payment_id: str, owner: str, amount: float) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM unresolved_debits WHERE payment_id = ? AND owner = ? AND amount = ?",
+            (payment_id, owner, amount),
+        ).fetchone()
+        return row is not None
+
+    def spent(self, owner: str, now: float | None = None) -> float:
+        now = time.time() if now is None else now
+        row = self._connection().execute(
+            "SELECT (SELECT SUM(amount) FROM daily_spend WHERE owner = ? AND bucket >= ?), "
+            "(SELECT SUM(amount) FROM unresolved_debits WHERE owner = ? AND created_at >= ?)",
+            (owner, self._oldest_bucket(now), owner, now - WINDOW_S),
+        ).fetchone()
+        # Clamp float drift and releases of buckets that already expired
+        return max(0.0, round((row[0] or 0.0) + (row[1] or 0.0), 2))
+
+    def remaining(self, owner: str | None) -> float:
+        if owner is None:
+            return self.daily_max
+        return max(0.0, self.daily_max - self.spent(owner))
+
+
+@lru_cache
+def get_spend_tracker() -> SpendTracker:
+    return SpendTracker(settings.LEDGER_DB_PATH, TRANSACTION_LIMITS["daily_max"], settings.DAILY_LIMIT_BUCKET_S)
+
+
+async def check_daily_limit(amount: float) -> str | None:
+    """Error message if `amount` would take the current owner over their daily limit."""
+    tracker = get_spend_tracker()
+    owner = current_owner()
+    if owner is None:
+        logger.warning("⚠️  No session for spend tracking, daily limit not applied")
+        return None
+    remaining = await asyncio.to_thread(tracker.remaining, owner)
+    if amount <= remaining:
+        return None
+    metrics.increment("limits.daily_rejected")
+    logger.warning(f"🛡️  [GUARDRAIL] Daily limit reached")
+    logger.warning(f"   ├─ Requested: RM {amount:,.2f}")
+    logger.warning(f"   └─ Remaining today: RM {remaining:,.2f}")
+    return RESPONSES["daily_limit_exceeded"].format(limit=tracker.daily_max, remaining=remaining)
@@ -0,0 +1,48 @@
+"""
+Shared plumbing for the small SQLite stores that every worker shares
+(rate limits, idempotency records, ...).
+
+WAL mode lets readers proceed while one writer commits, `BEGIN IMMEDIATE`
+takes the write lock up front so read-modify-write sequences are atomic
+across processes, and synchronous=NORMAL skips the per-commit fsync.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+
+class SQLiteStore:
+    """Base class: per-thread connections plus schema setup."""
+
+    SCHEMA: str = ""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        if self.SCHEMA:
+            self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections aren't thread-safe."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction holding the database lock from the first statement."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
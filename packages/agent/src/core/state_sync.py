@@ -0,0 +1,73 @@
+"""
+Incremental AG-UI state sync.
+
+Tools used to emit a full STATE_SNAPSHOT after every change, which on a
+long session is mostly an unchanged transaction_history. StateSync
+remembers the state the client holds for the current run and emits an
+RFC 6902 STATE_DELTA with only the changed fields instead.
+
+Every event bumps `BankingState.version`, which the client echoes back in
+the next run's input. A run whose input state has version 0 (a new client,
+or one that never received our events) has no known baseline, so its first
+event is a full snapshot; every later event in the run is a delta.
+"""
+from dataclasses import dataclass, field
+
+from ag_ui.core import BaseEvent, EventType, StateDeltaEvent, StateSnapshotEvent
+from pydantic_ai.ag_ui import StateDeps
+
+from core.metrics import metrics
+from models.banking import BankingState
+from utils.json_patch import make_patch
+
+
+class StateSync:
+    """Tracks the client's copy of BankingState for one run."""
+
+    def __init__(self, state: BankingState):
+        # The client's input state is our baseline once it has been synced before
+        self._client_state = state.model_dump(mode="json") if state.version else None
+
+    def event(self, state: BankingState) -> BaseEvent | None:
+        """Event bringing the client up to date with `state`, or None if it already is."""
+        if self._client_state is None:
+            state.version += 1
+            self._client_state = state.model_dump(mode="json")
+            metrics.increment("state_sync.snapshot")
+            return StateSnapshotEvent(type=EventType.STATE_SNAPSHOT, snapshot=self._client_state)
+
+        current = state.model_dump(mode="json")
+        current["version"] = self._client_state["version"]
+        delta = make_patch(self._client_state, current)
+        if not delta:
+            return None
+
+        state.version += 1
+        current["version"] = state.version
+        delta.append({"op": "replace", "path": "/version", "value": state.version})
+        self._client_state = current
+        metrics.increment("state_sync.delta")
+        return StateDeltaEvent(type=EventType.STATE_DELTA, delta=delta)
+
+
+@dataclass
+class SyncedStateDeps(StateDeps[BankingState]):
+    """
+    StateDeps with a per-run StateSync.
+
+    The AG-UI adapter builds each run's deps with dataclasses.replace(), which
+    re-runs __post_init__, so every run starts from its own input state.
+    """
+
+    sync: StateSync = field(init=False)
+
+    def __post_init__(self):
+        self.sync = StateSync(self.state)
+
+
+def state_event(deps: StateDeps[BankingState]) -> BaseEvent | None:
+    """State event for a tool result; plain StateDeps (e.g. /api/chat) always get a snapshot."""
+    sync = getattr(deps, "sync", None)
+    if sync is None:
+        return StateSnapshotEvent(type=EventType.STATE_SNAPSHOT, snapshot=deps.state)
+    return sync.event(deps.state)
@@ -5,15 +5,22 @@ from guardrails.base import GuardrailContext
 from core.agui_events import AGUISSEBuilder
 from utils.agui import extract_last_user_message, extract_last_user_image
 from core.context import current_image_ctx
+from utils.asgi import buffer_request, replay_receive, body_receive
 
-# Import guardrails to register them
 from guardrails.checks.sanitization import SanitizationGuardrail
 
 logger = logging.getLogger("jom_kira.guardrails.middleware")
 logger.setLevel(logging.INFO) # Ensure we see info logs
 
-# Initialize registry and register guardrails
-GuardrailRegistry.register(SanitizationGuardrail())
+
+def register_default_guardrails():
+    """
+    Register the built-in guardrails. Called once from the app lifespan;
+    safe to call again (e.g. on reload) without duplicating checks.
+    """
+    for guardrail in [SanitizationGuardrail()]:
+        if guardrail.name not in GuardrailRegistry.names():
+            GuardrailRegistry.register(guardrail)
 
 class GuardrailMiddleware:
     """
@@ -99,25 +106,11 @@ class GuardrailMiddleware:
             # Create replay receive for downstream handlers
             # If we modified the body, use the cleaned version
             if modified_body:
-                cleaned_body = json.dumps(modified_body).encode('utf-8')
-                cleaned_messages = [
-                    {
-                        "type": "http.request",
-                        "body": cleaned_body,
-                        "more_body": False,
-                    }
-                ]
-                async def replay_receive():
-                    if cleaned_messages:
-                        return cleaned_messages.pop(0)
-                    return await receive()
+                downstream_receive = body_receive(json.dumps(modified_body).encode('utf-8'), receive)
             else:
-                async def replay_receive():
-                    if messages:
-                        return messages.pop(0)
-                    return await receive()
+                downstream_receive = replay_receive(messages, receive)
             
-            return await self.app(scope, replay_receive, send)
+            return await self.app(scope, downstream_receive, send)
         finally:
             # Clean up context var
             if token:
@@ -144,23 +137,7 @@ class GuardrailMiddleware:
     
     async def _buffer_request(self, receive) -> tuple[bytes, list]:
         """Buffer the entire request body for inspection."""
-        body = b""
-        messages = []
-        more_body = True
-        
-        try:
-            while more_body:
-                message = await receive()
-                messages.append(message)
-                if message["type"] == "http.request":
-                    body += message.get("body", b"")
-                    more_body = message.get("more_body", False)
-                elif message["type"] == "http.disconnect":
-                    more_body = False
-        except Exception as e:
-            logger.debug(f"Error buffering request body: {e}")
-            
-        return body, messages
+        return await buffer_request(receive)
     
     def _run_guardrails(self, body_json: dict | None) -> str | None:
         """
@@ -16,6 +16,11 @@ class GuardrailRegistry:
         cls._guardrails.sort(key=lambda g: g.priority)
         logger.debug(f"Registered guardrail: {guardrail.name} (priority: {guardrail.priority})")
     
+    @classmethod
+    def names(cls) -> list[str]:
+        """Names of registered guardrails, in run order."""
+        return [guardrail.name for guardrail in cls._guardrails]
+
     @classmethod
     def run_all(cls, context: GuardrailContext) -> GuardrailResult:
         """Run all registered guardrails in order."""
@@ -1,28 +1,44 @@
+import asyncio
 import logging
 import json
+import time
+from contextlib import asynccontextmanager
 from uuid import uuid4
 import base64
-from fastapi import FastAPI, Request, Header
+from fastapi import FastAPI, Request, Header, Depends, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Optional, List, Union
-from pydantic_ai import BinaryContent
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from pydantic_ai.ag_ui import StateDeps
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Optional
+from starlette.datastructures import Headers
 
 # Local Imports
-from agent import create_agent
-from models.banking import BankingState
+from agent import create_agent, configure_observability
+from models.banking import BankingState, PaymentIntent, PayeeSuggestion, TransactionPage
 from models.chat import ChatRequest, ChatResponse, ChatMessage, ToolCallResult
 from config.settings import settings
 from config.logging import setup_logging
-from guardrails.middleware import GuardrailMiddleware
-from core.context import current_image_ctx, ImageData
+from guardrails.middleware import GuardrailMiddleware, register_default_guardrails
+from core.context import current_image_ctx, session_id_ctx, user_id_ctx, ImageData
+from core.profiling import ProfilingMiddleware, deep_sizeof
+from core.rate_limit import RateLimitExceeded, get_rate_limiter, rate_limit_keys, turn_cost
+from core.admission import AdmissionRejected, classify_priority, get_admission_controller
+from core.metrics import metrics, record_llm_usage
+from core.idempotency import IdempotencyMiddleware
+from core.audit import get_audit_log, read_audit
+from core.ledger import get_ledger
+from core.spend_limits import get_spend_tracker
+from core.payees import get_payee_directory
+from services.core_banking import get_core_banking
+from services.settlement import apply_settlements, get_outbox, get_settlement_workers
+from services.name_resolver import get_bank_resolver, get_biller_resolver
+from core.deadline import DeadlineExceeded, DeadlineMiddleware
+from core.circuit_breaker import CircuitOpenError
+from core.model_factory import classify_turn, get_model
+from core.response_cache import get_response_cache, is_cacheable_turn
+from utils.security import authenticated_user_id, is_admin_key, mask_account_number
+from utils.agui import extract_last_user_message
+from utils.asgi import ClientDisconnected, buffer_request, cancel_on_disconnect, replay_receive, track_cancellation
 
-# 1. Setup Logging
-setup_logging()
 logger = logging.getLogger("jom_kira.main")
 
 # In-memory session store for POC
@@ -32,24 +48,117 @@ session_store: dict[str, BankingState] = {}
 
 # Custom Rate Limit Handler
 async def custom_rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
-    client_ip = get_remote_address(request)
-    logger.warning(f"🚨 RATE LIMIT: IP {client_ip} hit limit '{exc.detail}' on {request.url.path}")
-    return _rate_limit_exceeded_handler(request, exc)
+    logger.warning(f"🚨 RATE LIMIT: {', '.join(exc.keys)} hit limit '{settings.RATE_LIMIT}' on {request.url.path}")
+    retry_after = max(1, round(exc.retry_after))
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests. Please try again shortly."},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Per-worker startup. Everything expensive (logging, logfire, model client,
+    agent, AG-UI app, guardrail registration) happens here instead of at import
+    time, so importing this module stays cheap.
+    """
+    from pydantic_ai.ag_ui import handle_ag_ui_request
+    from core.state_sync import SyncedStateDeps
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+
+    start_time = time.perf_counter()
+    setup_logging()
+    configure_observability()
+    register_default_guardrails()
+
+    get_rate_limiter()
+    get_ledger()
+    get_spend_tracker()
+    get_payee_directory()
+    get_bank_resolver()
+    get_biller_resolver()
+    audit_log = get_audit_log()
+    if audit_log is not None:
+        audit_log.start()
+    gateway = get_core_banking()
+    settlement_workers = get_settlement_workers()
+    if settlement_workers is not None:
+        settlement_workers.start()
+    app.state.agent = create_agent()
+
+    # Equivalent of agent.to_ag_ui(), plus model routing and an on_complete hook for token accounting
+    async def run_agui(request: Request):
+        body = await request.json()  # cached by Starlette for handle_ag_ui_request
+        state = body.get("state") or {}
+        user_text = " ".join(extract_last_user_message(body))
+        task = classify_turn(bool(state.get("pending_transfer") or state.get("pending_bill")), user_text)
+        session_id_ctx.set(request.headers.get("x-session-id") or body.get("threadId"))
+        user_id_ctx.set(authenticated_user_id(request.headers))
+        response = await handle_ag_ui_request(
+            app.state.agent,
+            request,
+            model=get_model(task),
+            deps=SyncedStateDeps(BankingState()),
+            on_complete=lambda result: record_llm_usage(result.usage(), task="agui"),
+        )
+        # Starlette cancels the stream (and with it the run) when the client disconnects
+        if isinstance(response, StreamingResponse):
+            response.body_iterator = track_cancellation(
+                response.body_iterator,
+                lambda: metrics.increment("runs.cancelled", path="/agui"),
+            )
+        return response
+
+    app.state.agui_app = Starlette(routes=[Route("/", run_agui, methods=["POST"])])
 
-# 2. Initialize Rate Limiter
-limiter = Limiter(key_func=get_remote_address, default_limits=[settings.RATE_LIMIT])
+    startup_ms = (time.perf_counter() - start_time) * 1000
+    logger.info(f"✨ {settings.APP_NAME} ready")
+    logger.info(f"   └─ Startup: {startup_ms:.0f}ms")
+    yield
 
-# 3. Initialize Agent
-agent = create_agent()
+    if settlement_workers is not None:
+        await settlement_workers.stop()
+        get_settlement_workers.cache_clear()
+    if gateway is not None:
+        await gateway.close()
+        get_core_banking.cache_clear()
+    if audit_log is not None:
+        await audit_log.stop()
+        get_audit_log.cache_clear()
 
-# 4. Create the base FastAPI app
-app = FastAPI(title=settings.APP_NAME)
 
-# 5. Create AgUI app for CopilotKit compatibility and mount it
-agui_app = agent.to_ag_ui(deps=StateDeps(BankingState()))
-app.mount("/agui", agui_app)
+# 1. Create the base FastAPI app
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 
-# 5. Add CORS Middleware for React Native
+
+# 2. Mount AgUI app for CopilotKit compatibility (built during lifespan)
+async def agui_proxy(scope, receive, send):
+    """Forward /agui traffic to the AG-UI app created at startup."""
+    if scope["type"] == "http" and scope["method"] == "POST":
+        # GuardrailMiddleware has already extracted any image into the context
+        has_image = current_image_ctx.get() is not None
+        client = scope.get("client")
+        await get_rate_limiter().acquire(
+            rate_limit_keys(Headers(scope=scope), client[0] if client else None),
+            turn_cost(has_image),
+        )
+        # Approve/decline turns carry the pending payment in the AG-UI state
+        body, messages = await buffer_request(receive)
+        try:
+            state = json.loads(body).get("state") or {}
+        except (ValueError, AttributeError):
+            state = {}
+        has_pending = isinstance(state, dict) and bool(state.get("pending_transfer") or state.get("pending_bill"))
+        async with get_admission_controller().slot(classify_priority(has_pending, has_image)):
+            return await app.state.agui_app(scope, replay_receive(messages, receive), send)
+    await app.state.agui_app(scope, receive, send)
+
+app.mount("/agui", agui_proxy)
+
+# 3. Add CORS Middleware for React Native
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ALLOW_ORIGINS,
@@ -58,10 +167,43 @@ app.add_middleware(
     allow_headers=settings.CORS_ALLOW_HEADERS,
 )
 
-# 6. Add Rate Limiting & Exception Handlers
-app.state.limiter = limiter
+# 4. Add Exception Handlers
 app.add_exception_handler(RateLimitExceeded, custom_rate_limit_exceeded_handler)
 
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    logger.warning(f"🚦 LOAD SHED: {exc.priority.name} run rejected ({exc.reason}) on {request.url.path}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The assistant is busy right now. Please try again shortly."},
+        headers={"Retry-After": str(int(exc.retry_after))},
+    )
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    logger.warning(f"⏰ Deadline exceeded on {request.url.path}")
+    return JSONResponse(
+        status_code=504,
+        content={"detail": "Request deadline exceeded."},
+    )
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    logger.info(f"🔌 Client disconnected, run cancelled on {request.url.path}")
+    metrics.increment("runs.cancelled", path=request.url.path)
+    # Nobody is listening; 499 (client closed request) keeps it out of the idempotency cache
+    return Response(status_code=499)
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    logger.warning(f"🔌 Failing fast: {exc} on {request.url.path}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The assistant is temporarily unavailable. Please try again shortly."},
+        headers={"Retry-After": str(max(1, int(exc.retry_after)))},
+    )
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.error(f"💥 Unhandled exception: {str(exc)}", exc_info=True)
@@ -70,9 +212,24 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": "An internal server error occurred."}
     )
 
-# 7. Add Guardrail Middleware
+# 5. Add Guardrail Middleware
 app.add_middleware(GuardrailMiddleware)
 
+# 6. Add Idempotency Middleware (replays skip guardrails, rate limits and the agent)
+app.add_middleware(IdempotencyMiddleware)
+
+# 7. Add Deadline Middleware (X-Request-Deadline budget for everything below)
+app.add_middleware(DeadlineMiddleware)
+
+# 8. Add Profiling Middleware (outermost, so guardrails are included in profiles)
+app.add_middleware(ProfilingMiddleware)
+
+
+async def require_admin(x_admin_key: Optional[str] = Header(default=None)):
+    """Dependency guarding admin-only endpoints."""
+    if not is_admin_key(x_admin_key):
+        raise HTTPException(status_code=403, detail="Admin access required.")
+
 
 # ============================================================
 # NEW: Vercel AI SDK Compatible Endpoint for React Native
@@ -81,6 +238,7 @@ app.add_middleware(GuardrailMiddleware)
 @app.post("/api/chat")
 async def vercel_ai_chat(
     request: ChatRequest,
+    http_request: Request,
     x_platform: Optional[str] = Header(default="web"),
     x_session_id: Optional[str] = Header(default=None)
 ):
@@ -93,6 +251,11 @@ async def vercel_ai_chat(
     """
     logger.info(f"📱 /api/chat request from platform: {x_platform}, session: {x_session_id}")
 
+    # Charge the caller's user/session buckets; vision turns cost more
+    has_image = bool(request.messages and request.messages[-1].image)
+    client_ip = http_request.client.host if http_request.client else None
+    await get_rate_limiter().acquire(rate_limit_keys(http_request.headers, client_ip), turn_cost(has_image))
+
     # Get or create session
     session_id = x_session_id or str(uuid4())
     
@@ -106,6 +269,12 @@ async def vercel_ai_chat(
         session_store[session_id] = state
         logger.info(f"🆕 Created new session: {session_id[:8]}... with balance RM {initial_balance}")
 
+    session_id_ctx.set(session_id)
+    user_id_ctx.set(authenticated_user_id(http_request.headers))
+
+    # Payments settled in the background since the last turn
+    await apply_settlements(state)
+
     # Handle silent initialization
     if request.is_init:
         logger.info(f"🤫 Silent initialization for session: {session_id[:8]}...")
@@ -119,8 +288,23 @@ async def vercel_ai_chat(
             session_id=session_id
         )
 
+    # Serve repeated state-independent questions without an LLM call
+    user_text = request.messages[-1].content if request.messages else None
+    cacheable = settings.RESPONSE_CACHE_ENABLED and is_cacheable_turn(state, user_text, has_image)
+    if cacheable and (cached_output := get_response_cache().get(user_text, state)) is not None:
+        logger.info(f"   └─ Response cache hit")
+        return ChatResponse(
+            message=ChatMessage(role="assistant", content=cached_output),
+            tool_calls=[],
+            state=state.model_dump(),
+            session_id=session_id
+        )
+
+    from pydantic_ai import BinaryContent
+    from pydantic_ai.ag_ui import StateDeps
+
     # Extract user message and image
-    user_input: List[Union[str, BinaryContent]] = []
+    user_input: list = []
     
     # Process history for PydanticAI (simplification: only use last message for multimodal if image present)
     # Most agents expect the current user message to contain the image
@@ -159,17 +343,37 @@ async def vercel_ai_chat(
     # Note: PydanticAI supports multimodal inputs in agent.run()
     # Fallback to empty string if no input
     prompt = user_input if user_input else ""
-    result = await agent.run(prompt, deps=StateDeps(state))
+
+    # Turns resolving a pending transfer/bill are admitted ahead of new chats and vision uploads
+    priority = classify_priority(
+        has_pending_payment=bool(state.pending_transfer or state.pending_bill),
+        has_image=has_image,
+    )
+    # Short approve/decline replies to a pending payment can use a cheaper tier
+    task = classify_turn(bool(state.pending_transfer or state.pending_bill), user_text)
+    async def run_turn():
+        async with get_admission_controller().slot(priority):
+            return await app.state.agent.run(prompt, deps=StateDeps(state), model=get_model(task))
+
+    # Stop spending LLM capacity on clients that went away. Tools run sequentially and
+    # apply their state changes without awaiting, so a cancelled run leaves the session
+    # exactly as of its last completed tool call.
+    result = await cancel_on_disconnect(http_request.receive, run_turn())
+    record_llm_usage(result.usage(), task="chat")
 
     # Extract tool calls for Generative UI
     tool_calls = extract_tool_calls(result)
 
     logger.info(f"   └─ Tool calls: {len(tool_calls)}, Status: {state.status}")
 
+    output = str(result.output)
+    if cacheable and not tool_calls:
+        get_response_cache().put(user_text, state, output)
+
     return ChatResponse(
         message=ChatMessage(
             role="assistant",
-            content=str(result.output)
+            content=output
         ),
         tool_calls=tool_calls,
         state=state.model_dump(),
@@ -230,6 +434,147 @@ def extract_tool_calls(result) -> list[ToolCallResult]:
     return tool_calls
 
 
+async def require_session_owner(session_id: str, request: Request):
+    """
+    A session owned by an authenticated user is only readable by that user
+    (see utils.security.authenticated_user_id); 404 rather than 403 so
+    session ids can't be probed.
+    """
+    owner = await asyncio.to_thread(get_ledger().owner_of, session_id)
+    if owner is not None and owner != session_id and owner != authenticated_user_id(request.headers):
+        raise HTTPException(status_code=404, detail="Session not found.")
+
+
+@app.get(
+    "/api/sessions/{session_id}/transactions",
+    response_model=TransactionPage,
+    dependencies=[Depends(require_session_owner)],
+)
+async def session_transactions(
+    session_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=settings.TRANSACTIONS_PAGE_SIZE, ge=1, le=settings.TRANSACTIONS_PAGE_MAX),
+):
+    """
+    Page through a session's transaction ledger, newest first.
+    Pass the returned `next_cursor` back as `cursor` for the next page.
+    """
+    try:
+        before = int(cursor) if cursor is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    # Fetch one extra row to know whether another page exists
+    entries = await asyncio.to_thread(get_ledger().page, session_id, limit + 1, before)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    return TransactionPage(
+        transactions=entries,
+        next_cursor=str(entries[-1].id) if has_more else None,
+    )
+
+
+@app.get(
+    "/api/sessions/{session_id}/settlements/{settlement_id}",
+    response_model=PaymentIntent,
+    dependencies=[Depends(require_session_owner)],
+)
+async def settlement_status(session_id: str, settlement_id: str):
+    """
+    Status of a confirmed payment (BankingState.settlement_ids) that is
+    being settled in the background; poll until it is no longer "processing".
+    """
+    intent = await asyncio.to_thread(get_outbox().get, session_id, settlement_id)
+    if intent is None:
+        raise HTTPException(status_code=404, detail="Settlement not found.")
+    return intent
+
+
+@app.get("/api/payees", response_model=list[PayeeSuggestion])
+async def payee_autocomplete(
+    request: Request,
+    prefix: str = "",
+    limit: int = Query(default=8, ge=1, le=settings.PAYEE_SUGGESTIONS_MAX),
+    x_session_id: Optional[str] = Header(default=None),
+):
+    """
+    Saved payees whose name or nickname has a word starting with `prefix`,
+    most used first. Payees belong to the authenticated user (X-User-Id,
+    trusted only from the gateway), or to X-Session-Id without one.
+    """
+    owner = authenticated_user_id(request.headers) or x_session_id
+    if not owner:
+        raise HTTPException(status_code=400, detail="Authenticated user or X-Session-Id header required.")
+
+    payees = await get_payee_directory().suggest(owner, prefix, limit)
+    return [
+        PayeeSuggestion(
+            id=p.id,
+            name=p.name,
+            nickname=p.nickname,
+            bank_name=p.bank_name,
+            account=mask_account_number(p.account_number),
+        )
+        for p in payees
+    ]
+
+
+@app.get("/api/admin/sessions/memory", dependencies=[Depends(require_admin)])
+async def session_memory():
+    """
+    Report approximate per-session memory use of the in-memory session store.
+    """
+    sessions = [
+        {
+            "session": f"{session_id[:8]}...",
+            "bytes": deep_sizeof(state),
+            "transaction_history": len(state.transaction_history),
+        }
+        for session_id, state in session_store.items()
+    ]
+    sessions.sort(key=lambda s: s["bytes"], reverse=True)
+    return {
+        "session_count": len(sessions),
+        "total_bytes": sum(s["bytes"] for s in sessions),
+        "sessions": sessions,
+    }
+
+
+@app.get("/api/admin/metrics", dependencies=[Depends(require_admin)])
+async def admin_metrics():
+    """Per-worker operational counters and gauges."""
+    return metrics.snapshot()
+
+
+@app.get("/api/admin/audit", dependencies=[Depends(require_admin)])
+async def audit_records(
+    session_id: Optional[str] = None,
+    tool: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """
+    Most recent committed audit records (all workers), newest first.
+    Scans the segment files; meant for investigations, not hot paths.
+    """
+    def scan() -> list[dict]:
+        matches = [
+            r for r in read_audit(settings.AUDIT_DIR)
+            if (session_id is None or r["session_id"] == session_id) and (tool is None or r["tool"] == tool)
+        ]
+        matches.sort(key=lambda r: r["ts"], reverse=True)
+        return matches[:limit]
+
+    return {"records": await asyncio.to_thread(scan)}
+
+
+@app.delete("/api/admin/response-cache", dependencies=[Depends(require_admin)])
+async def purge_response_cache():
+    """Drop all cached assistant replies in this worker."""
+    purged = get_response_cache().purge()
+    logger.info(f"🧹 Response cache purged: {purged} entries")
+    return {"purged": purged}
+
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
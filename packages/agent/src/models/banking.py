@@ -1,6 +1,12 @@
+import uuid
+from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import Literal
 
+
+def new_payment_id() -> str:
+    return uuid.uuid4().hex
+
 class BillDetails(BaseModel):
     """Details extracted from a bill/receipt."""
     biller_name: str = Field(description="Name of the biller (e.g. TNB, Syabas)")
@@ -8,6 +14,8 @@ class BillDetails(BaseModel):
     amount: float = Field(description="Amount to be paid")
     due_date: str | None = Field(default=None, description="Due date if available")
     reference_number: str | None = Field(default=None, description="Reference number on the bill")
+    payment_id: str = Field(default_factory=new_payment_id, description="Idempotency key of the debit, fixed when the payment is prepared")
+    debit_unresolved: bool = Field(default=False, description="A debit ended without a definite answer; confirming again retries it with the same payment_id (mirrors the server's record)")
 
 class TransferDetails(BaseModel):
     """Details for a bank transfer."""
@@ -16,11 +24,66 @@ class TransferDetails(BaseModel):
     account_number: str = Field(description="Recipient's account number")
     amount: float = Field(description="Amount to transfer")
     reference: str | None = Field(default=None, description="Payment reference")
+    nickname: str | None = Field(default=None, description="Name the user calls the recipient (e.g. 'mom'), saved with the payee")
+    payment_id: str = Field(default_factory=new_payment_id, description="Idempotency key of the debit, fixed when the payment is prepared")
+    debit_unresolved: bool = Field(default=False, description="A debit ended without a definite answer; confirming again retries it with the same payment_id (mirrors the server's record)")
+
+class LedgerEntry(BaseModel):
+    """A completed transaction as recorded in the ledger."""
+    id: int | None = Field(default=None, description="Ledger sequence number, assigned when stored")
+    type: Literal["transfer", "bill_payment"]
+    amount: float
+    counterparty: str = Field(description="Recipient or biller name")
+    account: str = Field(description="Masked recipient/biller account number")
+    reference: str | None = None
+    description: str = Field(description="Human-readable summary shown in the chat")
+    created_at: datetime
+
+class TransactionPage(BaseModel):
+    """One page of a session's ledger, newest first."""
+    transactions: list[LedgerEntry]
+    next_cursor: str | None = Field(default=None, description="Pass as `cursor` to fetch older entries")
+
+class Payee(BaseModel):
+    """A saved transfer recipient."""
+    id: int
+    name: str
+    nickname: str | None = None
+    bank_name: str
+    account_number: str
+    use_count: int = 0
+    last_used: datetime
+
+class PayeeSuggestion(BaseModel):
+    """Autocomplete entry; the account number is masked."""
+    id: int
+    name: str
+    nickname: str | None = None
+    bank_name: str
+    account: str
+
+class PaymentIntent(BaseModel):
+    """A confirmed payment queued for background settlement."""
+    id: str = Field(description="Settlement id; also the idempotency key sent to core banking")
+    type: Literal["transfer", "bill_payment"]
+    amount: float
+    counterparty: str = Field(description="Recipient or biller name")
+    account: str = Field(description="Masked recipient/biller account number")
+    reference: str | None = None
+    description: str
+    status: Literal["processing", "completed", "failed"]
+    attempts: int = 0
+    balance: float | None = Field(default=None, description="Account balance after the debit, once completed")
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
 
 class BankingState(BaseModel):
     """Current state of the banking assistant."""
     balance: float = Field(default=1000.0, description="User's current mock balance")
     pending_transfer: TransferDetails | None = Field(default=None, description="Transfer currently awaiting confirmation")
     pending_bill: BillDetails | None = Field(default=None, description="Bill payment currently awaiting confirmation")
-    transaction_history: list[str] = Field(default_factory=list, description="Recent transaction messages")
-    status: Literal["idle", "confirming_transfer", "confirming_bill", "completed", "error"] = Field(default="idle")
+    transaction_history: list[str] = Field(default_factory=list, description="Most recent transaction messages; the full history is in the ledger")
+    settlement_ids: list[str] = Field(default_factory=list, description="Confirmed payments still being settled; poll /api/sessions/{id}/settlements/{settlement_id}")
+    status: Literal["idle", "confirming_transfer", "confirming_bill", "processing", "completed", "error"] = Field(default="idle")
+    version: int = Field(default=0, description="Bumped on every state event sent to the client; 0 means never synced")
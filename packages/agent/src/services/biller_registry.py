@@ -0,0 +1,120 @@
+"""
+Biller registry: per-biller validation of bill details.
+
+Bill details come from the vision model (or the user) and used to go
+straight into a confirmation card. A misread account number was only
+discovered after a confirm/decline round trip, or not at all. Each
+supported biller now has compiled validators built once from
+BILLER_FORMATS (config/constants.py). check_bill() normalizes each field
+(separators stripped, references upper-cased, amounts rounded to sen) and
+reports which fields are wrong, so the vision tool can re-read just those
+fields and prepare_bill_payment can reject bad details before a card is
+shown.
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from config.constants import BILLER_FORMATS, SUPPORTED_BILLERS, TRANSACTION_LIMITS
+from services.name_resolver import get_biller_resolver
+
+_SEPARATORS = re.compile(r"[\s\-./]+")
+
+
+@dataclass(frozen=True)
+class BillerSpec:
+    name: str
+    account: re.Pattern
+    account_hint: str
+    reference: re.Pattern
+    max_amount: float
+
+    def check_account(self, value: str | None) -> tuple[str | None, str | None]:
+        """(normalized value, error)"""
+        normalized = _SEPARATORS.sub("", value or "")
+        if not self.account.fullmatch(normalized):
+            return None, f"account_number should be {self.account_hint} for {self.name}"
+        return normalized, None
+
+    def check_reference(self, value: str | None) -> tuple[str | None, str | None]:
+        if not value:
+            return None, None
+        normalized = _SEPARATORS.sub("", value).upper()
+        if not self.reference.fullmatch(normalized):
+            return None, f"reference_number '{value}' is not a valid {self.name} reference"
+        return normalized, None
+
+    def check_amount(self, value: float | None) -> tuple[float | None, str | None]:
+        if value is None or value < TRANSACTION_LIMITS["min_amount"]:
+            return None, f"amount must be at least RM {TRANSACTION_LIMITS['min_amount']:.2f}"
+        if value > self.max_amount:
+            return None, f"amount RM {value:,.2f} is above the RM {self.max_amount:,.2f} limit for {self.name}"
+        return round(value, 2), None
+
+
+@dataclass
+class BillCheck:
+    """Normalized bill fields plus per-field errors (empty when the bill is valid)."""
+    biller_name: str | None = None
+    account_number: str | None = None
+    amount: float | None = None
+    reference_number: str | None = None
+    errors: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def describe_errors(self) -> str:
+        return "; ".join(self.errors.values())
+
+
+class BillerRegistry:
+    def __init__(self, formats: dict[str, dict]):
+        self._specs = {
+            name: BillerSpec(
+                name=name,
+                account=re.compile(fmt["account"]),
+                account_hint=fmt["account_hint"],
+                reference=re.compile(fmt["reference"]),
+                max_amount=fmt["max_amount"],
+            )
+            for name, fmt in formats.items()
+            if name in SUPPORTED_BILLERS
+        }
+
+    def get(self, biller_name: str | None) -> BillerSpec | None:
+        resolved = get_biller_resolver().resolve(biller_name)
+        return self._specs.get(resolved.name) if resolved else None
+
+    def suggest(self, biller_name: str | None) -> str | None:
+        """Supported biller that `biller_name` most likely misspells, for the user to confirm."""
+        suggestion = get_biller_resolver().suggest(biller_name)
+        return suggestion.name if suggestion and suggestion.name in self._specs else None
+
+    def check_bill(
+        self,
+        biller_name: str | None,
+        account_number: str | None,
+        amount: float | None,
+        reference_number: str | None = None,
+    ) -> BillCheck:
+        spec = self.get(biller_name)
+        if spec is None:
+            return BillCheck(errors={"biller_name": f"'{biller_name}' is not a supported biller"})
+
+        check = BillCheck(biller_name=spec.name)
+        for name, (value, error) in (
+            ("account_number", spec.check_account(account_number)),
+            ("amount", spec.check_amount(amount)),
+            ("reference_number", spec.check_reference(reference_number)),
+        ):
+            setattr(check, name, value)
+            if error:
+                check.errors[name] = error
+        return check
+
+
+@lru_cache
+def get_biller_registry() -> BillerRegistry:
+    return BillerRegistry(BILLER_FORMATS)
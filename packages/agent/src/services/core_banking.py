@@ -0,0 +1,262 @@
+"""
+Core-banking gateway.
+
+Balances and debits go through a CoreBankingGateway. With
+CORE_BANKING_BACKEND="mock" (the POC default) there is no gateway and the
+balance lives in BankingState as before; with "http" the backend at
+CORE_BANKING_URL is the source of truth and BankingState.balance only
+mirrors it for the UI and the runtime context.
+
+HttpCoreBankingGateway keeps one pooled httpx.AsyncClient per worker, so
+tool calls reuse warm keep-alive connections instead of paying a TCP/TLS
+handshake each. Balance reads go through BalanceCache:
+
+- reads within CORE_BANKING_BALANCE_TTL_S of the last fetch are served
+  from memory;
+- concurrent misses for the same account share one upstream request;
+- a debit invalidates the account and primes it with the balance the
+  backend returned, and a read that was in flight during the debit is
+  not cached.
+
+Debits carry an Idempotency-Key and are never retried here; reads are
+retried once on transport errors and 5xx. The key of a chat-confirmed
+debit is the pending payment's payment_id, fixed when it was prepared: a
+debit that times out, fails in transport or with a 5xx, or is cancelled
+with its run may still have gone through, so the payment stays pending
+with debit_unresolved set, and confirming it again repeats the same key
+instead of paying twice. The server's own record of the unresolved debit
+(core/spend_limits.py) decides whether a confirmation is such a retry;
+the flag and payment_id arrive with the client's state and only mirror
+it. services/core_banking_simulator.py
+implements the same API locally, with configurable latency and error rates.
+"""
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from functools import lru_cache
+
+import httpx
+
+from config.settings import settings
+from core.metrics import metrics
+from core.payees import current_owner
+from core.spend_limits import get_spend_tracker
+from models.banking import BankingState, BillDetails, TransferDetails
+
+logger = logging.getLogger("jom_kira.services.core_banking")
+
+READ_RETRIES = 1
+
+
+class CoreBankingError(Exception):
+    """The backend could not be reached or rejected the request."""
+
+
+class InsufficientFundsError(CoreBankingError):
+    def __init__(self, balance: float):
+        self.balance = balance
+        super().__init__(f"Insufficient funds (balance RM {balance:,.2f})")
+
+
+class DebitRejectedError(CoreBankingError):
+    """The backend refused the debit (4xx): nothing was debited."""
+
+
+class CoreBankingGateway(ABC):
+    @abstractmethod
+    async def get_balance(self, account_id: str) -> float:
+        ...
+
+    @abstractmethod
+    async def debit(self, account_id: str, amount: float, idempotency_key: str, description: str = "") -> float:
+        """Debit `amount` and return the new balance."""
+
+    async def close(self):
+        pass
+
+
+class BalanceCache:
+    """Short-TTL balance cache with single-flight reads per account."""
+
+    def __init__(self, ttl_s: float):
+        self.ttl_s = ttl_s
+        self._entries: dict[str, tuple[float, float]] = {}  # account -> (balance, fetched_at)
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._generations: dict[str, int] = {}
+
+    async def get(self, account_id: str, fetch: Callable[[], Awaitable[float]]) -> float:
+        entry = self._entries.get(account_id)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl_s:
+            metrics.increment("core_banking.balance_cache", result="hit")
+            return entry[0]
+
+        task = self._inflight.get(account_id)
+        if task is None:
+            metrics.increment("core_banking.balance_cache", result="miss")
+            task = asyncio.ensure_future(fetch())
+            self._inflight[account_id] = task
+            generation = self._generations.get(account_id, 0)
+            task.add_done_callback(lambda t: self._settle(account_id, t, generation))
+        else:
+            metrics.increment("core_banking.balance_cache", result="coalesced")
+        # Shielded: one caller giving up (e.g. a disconnected client) must not fail the others
+        return await asyncio.shield(task)
+
+    def _settle(self, account_id: str, task: asyncio.Task, generation: int):
+        if self._inflight.get(account_id) is task:
+            del self._inflight[account_id]
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self._generations.get(account_id, 0) == generation:
+            self._entries[account_id] = (task.result(), time.monotonic())
+
+    def invalidate(self, account_id: str, balance: float | None = None):
+        """Drop the cached balance (and any read racing with the write); optionally prime it."""
+        self._generations[account_id] = self._generations.get(account_id, 0) + 1
+        self._inflight.pop(account_id, None)
+        self._entries.pop(account_id, None)
+        if balance is not None:
+            self._entries[account_id] = (balance, time.monotonic())
+
+
+class HttpCoreBankingGateway(CoreBankingGateway):
+    """Core-banking REST API over a pooled async HTTP client."""
+
+    def __init__(self, base_url: str, timeout_s: float, max_connections: int, max_keepalive: int, balance_ttl_s: float):
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout_s,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+        )
+        self.balances = BalanceCache(balance_ttl_s)
+
+    async def _request(self, op: str, method: str, url: str, retries: int = 0, **kwargs) -> httpx.Response:
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                response = await self._client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                metrics.increment("core_banking.requests", op=op, status="transport_error")
+                if attempt < retries:
+                    continue
+                raise CoreBankingError(f"{op} failed: {e!r}") from e
+            metrics.increment("core_banking.requests", op=op, status=str(response.status_code))
+            metrics.set_gauge("core_banking.last_latency_ms", (time.perf_counter() - start) * 1000, op=op)
+            if response.status_code >= 500 and attempt < retries:
+                continue
+            return response
+
+    async def _fetch_balance(self, account_id: str) -> float:
+        response = await self._request("balance", "GET", f"/accounts/{account_id}/balance", retries=READ_RETRIES)
+        if response.status_code != 200:
+            raise CoreBankingError(f"balance failed: HTTP {response.status_code}")
+        return float(response.json()["balance"])
+
+    async def get_balance(self, account_id: str) -> float:
+        return await self.balances.get(account_id, lambda: self._fetch_balance(account_id))
+
+    async def debit(self, account_id: str, amount: float, idempotency_key: str, description: str = "") -> float:
+        self.balances.invalidate(account_id)
+        response = await self._request(
+            "debit", "POST", f"/accounts/{account_id}/debits",
+            json={"amount": amount, "description": description},
+            headers={"Idempotency-Key": idempotency_key},
+        )
+        if response.status_code == 409:
+            balance = float(response.json()["balance"])
+            self.balances.invalidate(account_id, balance)
+            raise InsufficientFundsError(balance)
+        if 400 <= response.status_code < 500:
+            raise DebitRejectedError(f"debit rejected: HTTP {response.status_code}")
+        if response.status_code != 200:
+            raise CoreBankingError(f"debit failed: HTTP {response.status_code}")
+        balance = float(response.json()["balance"])
+        self.balances.invalidate(account_id, balance)
+        return balance
+
+    async def close(self):
+        await self._client.aclose()
+
+
+@lru_cache
+def get_core_banking() -> CoreBankingGateway | None:
+    """The configured gateway, or None when balances are mocked in BankingState."""
+    if settings.CORE_BANKING_BACKEND == "mock":
+        return None
+    return HttpCoreBankingGateway(
+        settings.CORE_BANKING_URL,
+        settings.CORE_BANKING_TIMEOUT_S,
+        settings.CORE_BANKING_MAX_CONNECTIONS,
+        settings.CORE_BANKING_MAX_KEEPALIVE,
+        settings.CORE_BANKING_BALANCE_TTL_S,
+    )
+
+
+def has_unresolved_debit(state: BankingState) -> bool:
+    """A pending payment may already have been debited; it can only be confirmed again."""
+    return any(p is not None and p.debit_unresolved for p in (state.pending_transfer, state.pending_bill))
+
+
+def _account_id() -> str:
+    owner = current_owner()
+    if owner is None:
+        raise CoreBankingError("No user or session to identify the account")
+    return owner
+
+
+async def refresh_balance(state: BankingState) -> float:
+    """The account balance, mirrored into `state`."""
+    if (gateway := get_core_banking()) is not None:
+        state.balance = await gateway.get_balance(_account_id())
+    return state.balance
+
+
+async def resumes_unresolved_debit(payment: TransferDetails | BillDetails) -> bool:
+    """
+    Whether confirming `payment` retries a debit the server holds as
+    unresolved for this owner and amount (its limit was checked on the
+    first attempt and is still reserved).
+    """
+    owner = current_owner()
+    if get_core_banking() is None or owner is None:
+        return False
+    return await asyncio.to_thread(get_spend_tracker().is_unresolved, payment.payment_id, owner, payment.amount)
+
+
+async def _resolve(payment: TransferDetails | BillDetails):
+    await asyncio.to_thread(get_spend_tracker().resolve_debit, payment.payment_id)
+    payment.debit_unresolved = False
+
+
+async def debit(state: BankingState, payment: TransferDetails | BillDetails, description: str) -> float:
+    """
+    Debit the account for a pending payment and mirror the new balance into
+    `state`. The debit is held as unresolved (and counts against the daily
+    limit) unless the backend answered definitely (debited, insufficient
+    funds or rejected).
+    """
+    gateway = get_core_banking()
+    if gateway is None:
+        if state.balance < payment.amount:
+            raise InsufficientFundsError(state.balance)
+        state.balance -= payment.amount
+        return state.balance
+    account_id = _account_id()
+    # Held before the request: a cancelled run must leave it held too
+    if not await asyncio.to_thread(get_spend_tracker().open_debit, payment.payment_id, account_id, payment.amount):
+        raise DebitRejectedError("payment_id is already used by another payment")
+    payment.debit_unresolved = True
+    try:
+        balance = await gateway.debit(account_id, payment.amount, payment.payment_id, description)
+    except InsufficientFundsError as e:
+        state.balance = e.balance
+        await _resolve(payment)
+        raise
+    except DebitRejectedError:
+        await _resolve(payment)
+        raise
+    state.balance = balance
+    await _resolve(payment)
+    return state.balance
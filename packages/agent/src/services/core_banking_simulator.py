@@ -0,0 +1,98 @@
+"""
+Local core-banking simulator.
+
+Implements the API HttpCoreBankingGateway talks to, in memory, with
+injected latency and failures so the gateway (pooling, balance cache,
+request coalescing) can be load-tested offline:
+
+    cd packages/agent/src
+    uvicorn services.core_banking_simulator:app --port 8100
+
+and run the agent with CORE_BANKING_BACKEND=http. Accounts are created on
+first use with CORE_BANKING_SIM_INITIAL_BALANCE. Each request sleeps
+CORE_BANKING_SIM_LATENCY_MS +/- CORE_BANKING_SIM_JITTER_MS and fails with
+a 503 at CORE_BANKING_SIM_ERROR_RATE. Debits are idempotent per
+Idempotency-Key, like a real ledger.
+
+API:
+    GET  /accounts/{id}/balance  -> {"account_id", "balance"}
+    POST /accounts/{id}/debits   {"amount", "description"} + Idempotency-Key
+                                 -> {"transaction_id", "balance"}; 409 on insufficient funds
+    GET  /stats                  -> request counters
+"""
+import asyncio
+import random
+from collections import Counter
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+from config.settings import settings
+
+
+class DebitRequest(BaseModel):
+    amount: float = Field(gt=0)
+    description: str = ""
+
+
+class Simulator:
+    def __init__(self, initial_balance: float, latency_ms: float, jitter_ms: float, error_rate: float):
+        self.initial_balance = initial_balance
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.balances: dict[str, float] = {}
+        self.debits: dict[tuple[str, str], dict] = {}  # (account, idempotency key) -> response
+        self.stats: Counter[str] = Counter()
+
+    async def delay(self, op: str):
+        self.stats[op] += 1
+        await asyncio.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+        if random.random() < self.error_rate:
+            self.stats[f"{op}.injected_error"] += 1
+            raise HTTPException(status_code=503, detail="Simulated core-banking failure")
+
+    def balance(self, account_id: str) -> float:
+        return self.balances.setdefault(account_id, self.initial_balance)
+
+
+simulator = Simulator(
+    settings.CORE_BANKING_SIM_INITIAL_BALANCE,
+    settings.CORE_BANKING_SIM_LATENCY_MS,
+    settings.CORE_BANKING_SIM_JITTER_MS,
+    settings.CORE_BANKING_SIM_ERROR_RATE,
+)
+
+app = FastAPI(title="Core banking simulator")
+
+
+@app.get("/accounts/{account_id}/balance")
+async def get_balance(account_id: str):
+    await simulator.delay("balance")
+    return {"account_id": account_id, "balance": simulator.balance(account_id)}
+
+
+@app.post("/accounts/{account_id}/debits")
+async def debit(account_id: str, request: DebitRequest, idempotency_key: str = Header()):
+    await simulator.delay("debit")
+    if (previous := simulator.debits.get((account_id, idempotency_key))) is not None:
+        simulator.stats["debit.replayed"] += 1
+        return previous
+
+    balance = simulator.balance(account_id)
+    if balance < request.amount:
+        return JSONResponse(status_code=409, content={"detail": "Insufficient funds", "balance": balance})
+
+    simulator.balances[account_id] = round(balance - request.amount, 2)
+    result = {
+        "transaction_id": f"SIM{len(simulator.debits) + 1:08d}",
+        "balance": simulator.balances[account_id],
+    }
+    simulator.debits[(account_id, idempotency_key)] = result
+    return result
+
+
+@app.get("/stats")
+async def stats():
+    return dict(simulator.stats)
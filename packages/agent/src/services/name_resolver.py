@@ -0,0 +1,140 @@
+"""
+Fuzzy resolution of bank and biller names.
+
+Users (and the model) write "CIMB", "maybank2u" or "Public" where the
+validators expect "CIMB Bank", "Maybank" or "Public Bank". Rejecting those
+costs a whole extra LLM turn to ask which bank was meant, so names are
+canonicalized locally instead.
+
+Each resolver is built once from the canonical names plus their aliases
+(config/constants.py):
+
+- every name is normalized (NFKC, casefold, punctuation dropped, spaces
+  removed) into a key, once as written and once without filler words like
+  "bank"/"berhad" ("May bank" and "Public" both hit);
+- resolve() only accepts such an exact key hit. A near miss may well be a
+  different bank ("Maybank Islamic", "Affin Hwang"), and a payment must
+  never be silently routed to it;
+- suggest() looks the query's trigrams up in an inverted index and scores
+  candidates by Dice similarity. A clear winner (MIN_SCORE, and MIN_MARGIN
+  ahead of the next canonical name) whose alias accounts for every word of
+  the query is returned for the user to confirm; a query with a word the
+  alias lacks ("islamic", "hwang") gets no suggestion.
+
+Both steps only touch the few index postings the query shares, so a
+lookup stays well under a millisecond.
+"""
+import logging
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import NamedTuple
+
+from config.constants import BANK_ALIASES, BILLER_ALIASES, SUPPORTED_BANKS, SUPPORTED_BILLERS
+
+logger = logging.getLogger("jom_kira.services.name_resolver")
+
+# Words that don't tell names apart ("Bank Islam" vs "Islam", "HSBC Bank Berhad" vs "HSBC")
+FILLER_WORDS = {"bank", "berhad", "bhd", "sdn", "the"}
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+MIN_SCORE = 0.55
+MIN_MARGIN = 0.15
+# How close each word of a query must be to a word of the suggested alias
+MIN_WORD_SCORE = 0.3
+
+
+class Resolution(NamedTuple):
+    name: str     # canonical name
+    score: float  # 1.0 for an exact (normalized) match
+
+
+def name_tokens(text: str) -> list[str]:
+    return [t for t in _NON_ALNUM.split(unicodedata.normalize("NFKC", text).casefold()) if t]
+
+
+def normalize_name(text: str) -> str:
+    return "".join(t for t in name_tokens(text) if t not in FILLER_WORDS)
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def dice(a: set[str], b: set[str]) -> float:
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class NameResolver:
+    """Exact-key map plus trigram index over one set of canonical names."""
+
+    def __init__(self, canonical: list[str], aliases: dict[str, list[str]]):
+        self._exact: dict[str, str] = {}
+        # (canonical name, trigram count, trigrams of the alias' words and key) per indexed key
+        self._keys: list[tuple[str, int, list[set[str]]]] = []
+        self._postings: dict[str, list[int]] = {}
+
+        indexed: set[str] = set()
+
+        for name in canonical:
+            for variant in [name, *aliases.get(name, [])]:
+                tokens = name_tokens(variant)
+                words = [t for t in tokens if t not in FILLER_WORDS]
+                key = "".join(words)
+                for exact in ("".join(tokens), key):
+                    if exact:
+                        self._exact.setdefault(exact, name)
+                if not key or key in indexed:
+                    continue
+                indexed.add(key)
+                grams = trigrams(key)
+                for gram in grams:
+                    self._postings.setdefault(gram, []).append(len(self._keys))
+                self._keys.append((name, len(grams), [*(trigrams(w) for w in words), grams]))
+
+    def resolve(self, text: str | None) -> Resolution | None:
+        """Canonical name for `text` if it is one of the names or aliases, else None."""
+        tokens = name_tokens(text or "")
+        for key in ("".join(tokens), "".join(t for t in tokens if t not in FILLER_WORDS)):
+            if key and (name := self._exact.get(key)) is not None:
+                return Resolution(name, 1.0)
+        return None
+
+    def suggest(self, text: str | None) -> Resolution | None:
+        """The name `text` most likely misspells, for the user to confirm, or None."""
+        words = [t for t in name_tokens(text or "") if t not in FILLER_WORDS]
+        if not words:
+            return None
+        grams = trigrams("".join(words))
+        shared = Counter(i for gram in grams for i in self._postings.get(gram, ()))
+        best: dict[str, tuple[float, int]] = {}
+        for i, common in shared.items():
+            name, size, _ = self._keys[i]
+            score = 2 * common / (len(grams) + size)
+            if score > best.get(name, (0.0, -1))[0]:
+                best[name] = (score, i)
+        if not best:
+            return None
+
+        ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)
+        name, (score, i) = ranked[0]
+        runner_up = ranked[1][1][0] if len(ranked) > 1 else 0.0
+        if score < MIN_SCORE or score - runner_up < MIN_MARGIN:
+            return None
+        # Extra words ("Maybank Islamic", "Affin Hwang") name another bank, not a typo
+        alias_words = self._keys[i][2]
+        if any(max(dice(trigrams(w), a) for a in alias_words) < MIN_WORD_SCORE for w in words):
+            return None
+        return Resolution(name, round(score, 2))
+
+
+@lru_cache
+def get_bank_resolver() -> NameResolver:
+    return NameResolver(SUPPORTED_BANKS, BANK_ALIASES)
+
+
+@lru_cache
+def get_biller_resolver() -> NameResolver:
+    return NameResolver(SUPPORTED_BILLERS, BILLER_ALIASES)
@@ -0,0 +1,355 @@
+"""
+Background settlement of confirmed payments (transactional outbox).
+
+With a core-banking backend, settling inside confirm_transfer /
+confirm_bill_payment would hold the user's chat turn for the backend's
+latency and retries. Instead, confirmation inserts a PaymentIntent row
+and returns "processing" straight away; a pool of SETTLEMENT_WORKERS
+asyncio tasks per worker process settles the intents:
+
+- The outbox table lives in the ledger database, so marking an intent
+  completed and appending its ledger entry is one SQLite transaction.
+- Workers claim due intents with a lease (SETTLEMENT_LEASE_S). An intent
+  whose worker died is claimed again once the lease expires.
+- The intent id is the payment_id fixed when the payment was prepared and
+  the debit's idempotency key, so neither a retry after an ambiguous
+  failure (e.g. a timeout) nor a repeated confirmation can debit twice.
+- Only a definite answer fails an intent: insufficient funds or a
+  rejected debit (4xx). Any other error may have left the money moved,
+  so the intent is retried with the same key, with exponential backoff
+  capped at SETTLEMENT_RETRY_MAX_S, until the backend answers; after
+  SETTLEMENT_MAX_ATTEMPTS it is reported (settlement.unresolved) for
+  reconciliation but still never failed, and its limit stays reserved.
+- The daily limit is reserved in the transaction that enqueues an intent
+  and released in the one that fails it, in the shared spend table
+  (core/spend_limits.py), so any worker can release it.
+
+Clients learn the outcome from GET /api/sessions/{id}/settlements/{sid}
+or from the next turn, which applies finished intents to BankingState
+(history, balance, status) and so reaches AG-UI clients as a state delta.
+
+Without a backend (CORE_BANKING_BACKEND=mock) the balance lives in
+BankingState, and payments still settle inside the turn.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import NamedTuple
+
+from config.settings import settings
+from core.context import session_id_ctx
+from core.ledger import TransactionLedger, remember_transaction
+from core.metrics import metrics
+from core.payees import current_owner, get_payee_directory
+from core.spend_limits import get_spend_tracker
+from core.sqlite import SQLiteStore
+from models.banking import BankingState, LedgerEntry, PaymentIntent, TransferDetails
+from services.core_banking import CoreBankingGateway, DebitRejectedError, InsufficientFundsError, get_core_banking
+
+logger = logging.getLogger("jom_kira.services.settlement")
+
+_COLUMNS = (
+    "id, type, amount, counterparty, account, reference, description, status, "
+    "attempts, balance, error, created_at, updated_at"
+)
+
+
+def _row_to_intent(row) -> PaymentIntent:
+    return PaymentIntent(
+        id=row[0], type=row[1], amount=row[2], counterparty=row[3], account=row[4],
+        reference=row[5], description=row[6], status=row[7], attempts=row[8],
+        balance=row[9], error=row[10],
+        created_at=datetime.fromtimestamp(row[11], tz=timezone.utc),
+        updated_at=datetime.fromtimestamp(row[12], tz=timezone.utc),
+    )
+
+
+class ClaimedIntent(NamedTuple):
+    intent: PaymentIntent
+    session_id: str
+    owner: str
+    details: dict  # TransferDetails / BillDetails as confirmed
+
+
+class SettlementOutbox(SQLiteStore):
+    """Payment intents, stored next to the ledger they settle into."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS settlements (
+            id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            type TEXT NOT NULL,
+            amount REAL NOT NULL,
+            counterparty TEXT NOT NULL,
+            account TEXT NOT NULL,
+            reference TEXT,
+            description TEXT NOT NULL,
+            details TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            lease_until REAL NOT NULL DEFAULT 0,
+            balance REAL,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_settlements_due ON settlements (status, next_attempt_at);
+    """
+
+    def enqueue(self, intent: PaymentIntent, session_id: str, owner: str, details: dict):
+        """Insert the intent and reserve its daily limit; a repeated confirmation is a no-op."""
+        with self.transaction() as conn:
+            inserted = conn.execute(
+                "INSERT INTO settlements (id, session_id, owner, type, amount, counterparty, account, "
+                "reference, description, details, status, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'processing', ?, ?, ?) ON CONFLICT (id) DO NOTHING",
+                (
+                    intent.id, session_id, owner, intent.type, intent.amount, intent.counterparty,
+                    intent.account, intent.reference, intent.description, json.dumps(details),
+                    intent.created_at.timestamp(), intent.created_at.timestamp(), intent.created_at.timestamp(),
+                ),
+            ).rowcount
+            if not inserted:
+                return
+            TransactionLedger.claim_session(conn, session_id, owner)
+            get_spend_tracker().add(conn, owner, intent.amount, intent.created_at.timestamp())
+
+    def claim(self, now: float, lease_s: float) -> ClaimedIntent | None:
+        """Lease the oldest due intent, counting the attempt."""
+        with self.transaction() as conn:
+            row = conn.execute(
+                "UPDATE settlements SET lease_until = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = (SELECT id FROM settlements WHERE status = 'processing' "
+                "AND next_attempt_at <= ? AND lease_until <= ? ORDER BY next_attempt_at LIMIT 1) "
+                f"RETURNING {_COLUMNS}, session_id, owner, details",
+                (now + lease_s, now, now, now),
+            ).fetchone()
+        if row is None:
+            return None
+        return ClaimedIntent(_row_to_intent(row), row[13], row[14], json.loads(row[15]))
+
+    def complete(self, claimed: ClaimedIntent, balance: float, now: float) -> PaymentIntent:
+        """Mark the intent settled and append its ledger entry, atomically."""
+        intent = claimed.intent
+        with self.transaction() as conn:
+            TransactionLedger.insert(conn, claimed.session_id, LedgerEntry(
+                type=intent.type,
+                amount=intent.amount,
+                counterparty=intent.counterparty,
+                account=intent.account,
+                reference=intent.reference,
+                description=intent.description,
+                created_at=datetime.fromtimestamp(now, tz=timezone.utc),
+            ))
+            row = conn.execute(
+                "UPDATE settlements SET status = 'completed', balance = ?, error = NULL, updated_at = ? "
+                f"WHERE id = ? RETURNING {_COLUMNS}",
+                (balance, now, intent.id),
+            ).fetchone()
+        return _row_to_intent(row)
+
+    def retry(self, intent_id: str, error: str, next_attempt_at: float, now: float):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE settlements SET lease_until = 0, next_attempt_at = ?, error = ?, updated_at = ? WHERE id = ?",
+                (next_attempt_at, error, now, intent_id),
+            )
+
+    def fail(self, claimed: ClaimedIntent, error: str, now: float) -> PaymentIntent:
+        """Mark the intent failed and release its daily limit reservation, atomically."""
+        intent = claimed.intent
+        with self.transaction() as conn:
+            row = conn.execute(
+                "UPDATE settlements SET status = 'failed', error = ?, updated_at = ? "
+                f"WHERE id = ? RETURNING {_COLUMNS}",
+                (error, now, intent.id),
+            ).fetchone()
+            get_spend_tracker().add(conn, claimed.owner, -intent.amount, intent.created_at.timestamp())
+        return _row_to_intent(row)
+
+    def get(self, session_id: str, intent_id: str) -> PaymentIntent | None:
+        row = self._connection().execute(
+            f"SELECT {_COLUMNS} FROM settlements WHERE session_id = ? AND id = ?",
+            (session_id, intent_id),
+        ).fetchone()
+        return _row_to_intent(row) if row else None
+
+
+@lru_cache
+def get_outbox() -> SettlementOutbox:
+    return SettlementOutbox(settings.LEDGER_DB_PATH)
+
+
+class SettlementWorkers:
+    """Pool of asyncio tasks draining the outbox."""
+
+    def __init__(self, outbox: SettlementOutbox, gateway: CoreBankingGateway, workers: int):
+        self.outbox = outbox
+        self.gateway = gateway
+        self.workers = workers
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(f"🏦  Settlement workers started ({self.workers})")
+
+    async def stop(self):
+        # Intents in flight are claimed again once their lease expires
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """A new intent is due; wake idle workers instead of waiting for the next poll."""
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await asyncio.to_thread(self.outbox.claim, time.time(), settings.SETTLEMENT_LEASE_S)
+            except Exception as e:
+                logger.error(f"❌  Settlement claim failed: {e}")
+                claimed = None
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.SETTLEMENT_POLL_S)
+                except TimeoutError:
+                    pass
+                # Cleared after waking; the claim that follows sees anything enqueued before the notify
+                self._wake.clear()
+                continue
+            await self.settle(claimed)
+
+    async def settle(self, claimed: ClaimedIntent):
+        intent = claimed.intent
+        try:
+            balance = await self.gateway.debit(claimed.owner, intent.amount, intent.id, intent.description)
+        except (InsufficientFundsError, DebitRejectedError) as e:
+            # Definite answers: nothing was debited
+            await self._fail(claimed, str(e))
+            return
+        except Exception as e:
+            # The debit may have gone through, so the intent is never failed here
+            delay = min(
+                settings.SETTLEMENT_RETRY_MAX_S,
+                settings.SETTLEMENT_RETRY_BASE_S * 2 ** min(intent.attempts - 1, 32),
+            )
+            delay *= random.uniform(0.5, 1.0)
+            metrics.increment("settlement.retried")
+            if intent.attempts >= settings.SETTLEMENT_MAX_ATTEMPTS:
+                metrics.increment("settlement.unresolved")
+                logger.error(f"🚨  Settlement {intent.id[:8]} unresolved after {intent.attempts} attempts, needs reconciliation")
+                logger.error(f"   └─ Retrying in {delay:.1f}s: {e}")
+            else:
+                logger.warning(f"🔁  Settlement retry {intent.id[:8]} in {delay:.1f}s (attempt {intent.attempts}): {e}")
+            now = time.time()
+            await asyncio.to_thread(self.outbox.retry, intent.id, str(e), now + delay, now)
+            return
+
+        now = time.time()
+        await asyncio.to_thread(self.outbox.complete, claimed, balance, now)
+        metrics.increment("settlement.completed", type=intent.type)
+        metrics.set_gauge("settlement.last_lag_s", now - intent.created_at.timestamp())
+        logger.info(f"✅  Settled {intent.type} {intent.id[:8]}")
+        logger.info(f"   ├─ Amount: RM {intent.amount:,.2f}")
+        logger.info(f"   └─ Attempts: {intent.attempts}")
+
+        if intent.type == "transfer":
+            # Same best-effort payee save as a synchronous transfer
+            try:
+                await get_payee_directory().record(claimed.owner, TransferDetails(**claimed.details))
+            except Exception as e:
+                logger.error(f"❌  Failed to save payee: {e}")
+
+    async def _fail(self, claimed: ClaimedIntent, error: str):
+        intent = claimed.intent
+        await asyncio.to_thread(self.outbox.fail, claimed, error, time.time())
+        metrics.increment("settlement.failed", type=intent.type)
+        logger.error(f"❌  Settlement failed {intent.id[:8]}: {error}")
+
+
+@lru_cache
+def get_settlement_workers() -> SettlementWorkers | None:
+    """The worker pool, or None when payments settle inside the turn."""
+    gateway = get_core_banking()
+    if gateway is None or settings.SETTLEMENT_WORKERS <= 0:
+        return None
+    return SettlementWorkers(get_outbox(), gateway, settings.SETTLEMENT_WORKERS)
+
+
+async def submit_payment(
+    state: BankingState,
+    entry: LedgerEntry,
+    details: dict,
+) -> PaymentIntent:
+    """Record a confirmed payment for background settlement and mark it processing in `state`."""
+    session_id, owner = session_id_ctx.get(), current_owner()
+    if session_id is None or owner is None:
+        raise ValueError("Background settlement needs a session")
+
+    intent = PaymentIntent(
+        id=details["payment_id"],
+        type=entry.type,
+        amount=entry.amount,
+        counterparty=entry.counterparty,
+        account=entry.account,
+        reference=entry.reference,
+        description=entry.description,
+        status="processing",
+        created_at=entry.created_at,
+        updated_at=entry.created_at,
+    )
+    # The daily limit is reserved by the enqueue transaction. The state only changes once
+    # the intent is stored; a run cancelled before that confirms again with the same id.
+    await asyncio.to_thread(get_outbox().enqueue, intent, session_id, owner, details)
+    if intent.id not in state.settlement_ids:
+        state.settlement_ids.append(intent.id)
+    state.status = "processing"
+    metrics.increment("settlement.enqueued", type=entry.type)
+    get_settlement_workers().notify()
+    return intent
+
+
+async def apply_settlements(state: BankingState) -> list[PaymentIntent]:
+    """
+    Fold finished settlements into `state` (history, balance, status).
+
+    Returns every intent still tracked by the state, finished or not.
+    """
+    session_id = session_id_ctx.get()
+    if not state.settlement_ids or session_id is None:
+        return []
+
+    intents = []
+    finished = []
+    for intent_id in list(state.settlement_ids):
+        intent = await asyncio.to_thread(get_outbox().get, session_id, intent_id)
+        if intent is None:
+            state.settlement_ids.remove(intent_id)
+            continue
+        intents.append(intent)
+        if intent.status != "processing":
+            state.settlement_ids.remove(intent_id)
+            finished.append(intent)
+
+    # In settlement order, so history and balance follow the backend rather than settlement_ids
+    finished.sort(key=lambda i: i.updated_at)
+    for intent in finished:
+        if intent.status == "completed":
+            remember_transaction(state, intent.description)
+            state.balance = intent.balance
+    if state.status == "processing":
+        # A failure shows straight away and isn't overwritten by payments that settle after it
+        if any(i.status == "failed" for i in finished):
+            state.status = "error"
+        elif finished and not state.settlement_ids:
+            state.status = "completed"
+    return intents
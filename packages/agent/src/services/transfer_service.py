@@ -1,21 +1,33 @@
 import logging
 import re
 import time
+from datetime import datetime, timezone
 from typing import Tuple
-from models.banking import BankingState, TransferDetails
+from core.ledger import record_transaction
+from core.payees import current_owner, get_payee_directory
+from core.spend_limits import check_daily_limit
+from models.banking import BankingState, LedgerEntry, TransferDetails
 from utils.security import mask_account_number
 from utils.sanitizers import sanitize_pii
-from config.constants import SUPPORTED_BANKS, RESPONSES, ACCOUNT_NUMBER_PATTERN, TRANSACTION_LIMITS
+from config.constants import RESPONSES, ACCOUNT_NUMBER_PATTERN, TRANSACTION_LIMITS
+from services.core_banking import CoreBankingError, InsufficientFundsError, debit, has_unresolved_debit, refresh_balance, resumes_unresolved_debit
+from services.name_resolver import get_bank_resolver
+from services.settlement import get_settlement_workers, submit_payment
 
 logger = logging.getLogger("jom_kira.services.transfer")
 
 class TransferService:
     @staticmethod
-    def prepare_transfer(state: BankingState, details: TransferDetails) -> Tuple[bool, str]:
+    async def prepare_transfer(state: BankingState, details: TransferDetails) -> Tuple[bool, str]:
         """
         Validates and prepares a transfer.
         """
         start_time = time.time()
+
+        # Replacing it would give the same payment a new idempotency key
+        if has_unresolved_debit(state):
+            logger.warning(f"🛡️  [GUARDRAIL] Pending payment has an unresolved debit")
+            return False, RESPONSES["payment_awaiting_resolution"]
         
         # Amount Validation
         if details.amount <= 0 or details.amount < TRANSACTION_LIMITS["min_amount"]:
@@ -35,18 +47,34 @@ class TransferService:
                 max_val=TRANSACTION_LIMITS["single_max"]
             )
 
+        if limit_error := await check_daily_limit(details.amount):
+            return False, limit_error
+
         # Account Number Validation
         if not re.match(ACCOUNT_NUMBER_PATTERN, details.account_number):
             logger.warning(f"⚠️  [VALIDATION_FAILURE] Invalid account number format")
             logger.warning(f"   └─ Account: {details.account_number} (expected 10-16 digits)")
             return False, RESPONSES["invalid_account_number"]
 
-        # Bank Validation
-        if details.bank_name not in SUPPORTED_BANKS:
+        # Bank Validation ("CIMB", "maybank2u" etc. resolve to the canonical name;
+        # a misspelling is only suggested, never silently routed to another bank)
+        bank = get_bank_resolver().resolve(details.bank_name)
+        if bank is None:
+            if (suggestion := get_bank_resolver().suggest(details.bank_name)) is not None:
+                logger.warning(f"🛡️  [GUARDRAIL] Unknown bank: '{details.bank_name}' (suggesting {suggestion.name})")
+                return False, RESPONSES["bank_suggestion"].format(bank=details.bank_name, suggestion=suggestion.name)
             logger.warning(f"🛡️  [GUARDRAIL] Unsupported bank: '{details.bank_name}'")
             return False, RESPONSES["unsupported_bank"].format(bank=details.bank_name)
+        if bank.name != details.bank_name:
+            logger.info(f"🏦  Bank resolved: '{details.bank_name}' → {bank.name}")
+            details.bank_name = bank.name
 
         # Balance Validation
+        try:
+            await refresh_balance(state)
+        except CoreBankingError as e:
+            logger.error(f"❌  Balance lookup failed: {e}")
+            return False, RESPONSES["core_banking_unavailable"]
         if state.balance < details.amount:
             logger.warning(f"🛡️  [GUARDRAIL] Insufficient funds detected")
             logger.warning(f"   ├─ Available: RM {state.balance:,.2f}")
@@ -65,11 +93,11 @@ class TransferService:
         logger.info(f"   └─ Duration: {duration_ms:.1f}ms")
 
         state.pending_transfer = details
-        state.status = "confirming_payment"
+        state.status = "confirming_transfer"
         return True, RESPONSES["transfer_prepared"]
 
     @staticmethod
-    def execute_transfer(state: BankingState) -> Tuple[bool, str]:
+    async def execute_transfer(state: BankingState) -> Tuple[bool, str]:
         """
         Executes the pending transfer.
         """
@@ -80,26 +108,64 @@ class TransferService:
             return False, "No pending transfer found."
 
         transfer = state.pending_transfer
-        
-        if state.balance < transfer.amount:
-            logger.error(f"❌  [EXECUTION_FAILED] Insufficient balance")
-            logger.error(f"   ├─ Current: RM {state.balance:,.2f}")
-            logger.error(f"   └─ Required: RM {transfer.amount:,.2f}")
+
+        # Re-checked here: other payments may have completed since this one was prepared
+        # (a retry of an unresolved debit was already checked on its first attempt)
+        if not await resumes_unresolved_debit(transfer) and (limit_error := await check_daily_limit(transfer.amount)):
             state.status = "error"
-            return False, RESPONSES["insufficient_balance"].format(balance=state.balance)
+            return False, limit_error
 
-        prev_balance = state.balance
-        state.balance -= transfer.amount
-        
         masked_account = mask_account_number(transfer.account_number)
         history_entry = (
             f"Transferred RM {transfer.amount:,.2f} to {transfer.recipient_name} "
             f"({transfer.bank_name} - {masked_account})"
         )
-        state.transaction_history.append(history_entry)
-        
+        entry = LedgerEntry(
+            type="transfer",
+            amount=transfer.amount,
+            counterparty=transfer.recipient_name,
+            account=masked_account,
+            reference=transfer.reference,
+            description=history_entry,
+            created_at=datetime.now(timezone.utc),
+        )
+
+        # With a core-banking backend, settle in the background instead of inside the turn
+        if get_settlement_workers() is not None:
+            # Cleared once the intent is stored: a failed enqueue leaves it to confirm again
+            intent = await submit_payment(state, entry, transfer.model_dump())
+            state.pending_transfer = None
+            logger.info(f"⏳  Transfer queued for settlement")
+            logger.info(f"   ├─ Settlement: {intent.id[:8]}")
+            logger.info(f"   └─ Amount: RM {transfer.amount:,.2f}")
+            return True, RESPONSES["transfer_processing"]
+
+        try:
+            await debit(state, transfer, history_entry)
+        except InsufficientFundsError:
+            logger.error(f"❌  [EXECUTION_FAILED] Insufficient balance")
+            logger.error(f"   ├─ Current: RM {state.balance:,.2f}")
+            logger.error(f"   └─ Required: RM {transfer.amount:,.2f}")
+            state.status = "error"
+            return False, RESPONSES["insufficient_balance"].format(balance=state.balance)
+        except CoreBankingError as e:
+            # The transfer stays pending so the user can confirm again (with the same key)
+            logger.error(f"❌  [EXECUTION_FAILED] Core banking error: {e}")
+            if transfer.debit_unresolved:
+                return False, RESPONSES["payment_unresolved"]
+            return False, RESPONSES["core_banking_unavailable"]
+
         state.pending_transfer = None
         state.status = "completed"
+        await record_transaction(state, entry)
+
+        # Save the counterparty for autocomplete and "send to <nickname>"; the
+        # transfer has happened either way
+        if owner := current_owner():
+            try:
+                await get_payee_directory().record(owner, transfer)
+            except Exception as e:
+                logger.error(f"❌  Failed to save payee: {e}")
         
         duration_ms = (time.time() - start_time) * 1000
         logger.info(f"✅  Transfer Completed Successfully")
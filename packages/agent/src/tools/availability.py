@@ -0,0 +1,63 @@
+"""
+Per-run tool availability.
+
+Every tool definition (name, docstring, JSON schema) is sent to the model on
+each request. These `prepare` hooks drop the tools that cannot do anything
+useful in the current state, so most turns carry a smaller prompt and the
+model can't burn a round trip calling e.g. confirm_transfer with nothing
+pending. They are re-evaluated before every model request, so a tool
+becomes available within the same run once its precondition is met.
+"""
+from pydantic_ai import RunContext
+from pydantic_ai.ag_ui import StateDeps
+from pydantic_ai.tools import ToolDefinition
+
+from core.context import current_image_ctx
+from core.payees import current_owner, get_payee_directory
+from models.banking import BankingState
+
+
+async def when_transfer_pending(
+    ctx: RunContext[StateDeps[BankingState]], tool_def: ToolDefinition
+) -> ToolDefinition | None:
+    """Offer confirm/cancel transfer only while a transfer awaits confirmation."""
+    return tool_def if ctx.deps.state.pending_transfer else None
+
+
+async def when_bill_pending(
+    ctx: RunContext[StateDeps[BankingState]], tool_def: ToolDefinition
+) -> ToolDefinition | None:
+    """Offer confirm bill payment only while a bill awaits confirmation."""
+    return tool_def if ctx.deps.state.pending_bill else None
+
+
+async def when_payment_pending(
+    ctx: RunContext[StateDeps[BankingState]], tool_def: ToolDefinition
+) -> ToolDefinition | None:
+    """Offer the generic cancel while either a transfer or a bill is pending."""
+    state = ctx.deps.state
+    return tool_def if state.pending_transfer or state.pending_bill else None
+
+
+async def when_image_attached(
+    ctx: RunContext[StateDeps[BankingState]], tool_def: ToolDefinition
+) -> ToolDefinition | None:
+    """Offer bill image analysis only when the request carried an image."""
+    return tool_def if current_image_ctx.get() is not None else None
+
+
+async def when_payees_saved(
+    ctx: RunContext[StateDeps[BankingState]], tool_def: ToolDefinition
+) -> ToolDefinition | None:
+    """Offer transfers by payee name only once the user has saved payees."""
+    owner = current_owner()
+    if owner is None:
+        return None
+    return tool_def if (await get_payee_directory().index(owner)).payees else None
+
+
+async def when_payments_processing(
+    ctx: RunContext[StateDeps[BankingState]], tool_def: ToolDefinition
+) -> ToolDefinition | None:
+    """Offer the payment status check only while confirmed payments are being settled."""
+    return tool_def if ctx.deps.state.settlement_ids else None
@@ -1,25 +1,61 @@
 from pydantic_ai import RunContext
+from pydantic_ai.messages import ToolReturn
 from pydantic_ai.ag_ui import StateDeps
-from ag_ui.core import EventType, StateSnapshotEvent
 import logging
+from datetime import datetime, timezone
 
-from models.banking import BankingState, TransferDetails, BillDetails
+from config.constants import RESPONSES
+from core.ledger import record_transaction
+from core.payees import current_owner, get_payee_directory
+from core.spend_limits import check_daily_limit
+from core.state_sync import state_event
+from models.banking import BankingState, TransferDetails, BillDetails, LedgerEntry
+from services.biller_registry import get_biller_registry
+from services.core_banking import CoreBankingError, InsufficientFundsError, debit, has_unresolved_debit, refresh_balance, resumes_unresolved_debit
+from services.settlement import apply_settlements, get_settlement_workers, submit_payment
 from services.transfer_service import TransferService
+from utils.security import mask_account_number
 
 logger = logging.getLogger("jom_kira.tools.banking")
 
+
+def tool_result(ctx: RunContext[StateDeps[BankingState]], success: bool, message: str) -> ToolReturn:
+    """
+    Compact result for the model, state event for the UI.
+
+    Only `return_value` is serialized into the model's context, so each tool
+    step costs the same few tokens however long the transaction history is.
+    The state event rides in `metadata`, which AG-UI emits to the client
+    (STATE_DELTA, or STATE_SNAPSHOT when the client has no baseline) and
+    never sends to the LLM.
+    """
+    state = ctx.deps.state
+    return ToolReturn(
+        return_value={
+            "success": success,
+            "message": message,
+            "status": state.status,
+            "balance": state.balance,
+        },
+        metadata=state_event(ctx.deps),
+    )
+
+
 async def prepare_transfer(
     ctx: RunContext[StateDeps[BankingState]],
     recipient_name: str,
     bank_name: str,
     account_number: str,
     amount: float,
-    reference: str | None = None
-) -> StateSnapshotEvent:
+    reference: str | None = None,
+    nickname: str | None = None
+) -> ToolReturn:
     """
     Prepare a bank transfer to a person.
     This sets the pending transaction in the state for user confirmation.
     Use this for person-to-person fund transfers.
+    Pass `nickname` when the user refers to the recipient by one (e.g. "mom"),
+    so later transfers can use prepare_transfer_to_payee.
     """
     logger.info(f"💸  Executing Tool: prepare_transfer")
     logger.info(f"   ├─ Recipient: {recipient_name}")
@@ -30,19 +66,57 @@ async def prepare_transfer(
         bank_name=bank_name,
         account_number=account_number,
         amount=amount,
-        reference=reference
+        reference=reference,
+        nickname=nickname
     )
     
-    success, message = TransferService.prepare_transfer(ctx.deps.state, details)
+    success, message = await TransferService.prepare_transfer(ctx.deps.state, details)
     
     if not success:
         logger.error(f"❌  Transfer Preparation Failed")
         logger.error(f"   └─ Reason: {message}")
     
-    return StateSnapshotEvent(
-        type=EventType.STATE_SNAPSHOT,
-        snapshot=ctx.deps.state,
+    return tool_result(ctx, success, message)
+
+
+async def prepare_transfer_to_payee(
+    ctx: RunContext[StateDeps[BankingState]],
+    payee: str,
+    amount: float,
+    reference: str | None = None
+) -> ToolReturn:
+    """
+    Prepare a transfer to a saved payee, by nickname or name (e.g. "mom", "Ali").
+    Bank and account number are filled in from the payee directory.
+    If several payees match, ask the user which one and call again with the full name.
+    """
+    logger.info(f"📇  Executing Tool: prepare_transfer_to_payee")
+    logger.info(f"   └─ Amount: RM {amount:,.2f}")
+
+    owner = current_owner()
+    matches = await get_payee_directory().resolve(owner, payee) if owner else []
+    if not matches:
+        return tool_result(ctx, False, RESPONSES["payee_not_found"].format(payee=payee))
+    if len(matches) > 1:
+        options = "; ".join(
+            f"{p.name} ({p.bank_name} - {mask_account_number(p.account_number)})" for p in matches[:5]
+        )
+        return tool_result(ctx, False, RESPONSES["payee_ambiguous"].format(payee=payee, options=options))
+
+    match = matches[0]
+    details = TransferDetails(
+        recipient_name=match.name,
+        bank_name=match.bank_name,
+        account_number=match.account_number,
+        amount=amount,
+        reference=reference,
+        nickname=match.nickname,
     )
+    success, message = await TransferService.prepare_transfer(ctx.deps.state, details)
+    if not success:
+        logger.error(f"❌  Transfer Preparation Failed")
+        logger.error(f"   └─ Reason: {message}")
+    return tool_result(ctx, success, message)
 
 
 async def prepare_bill_payment(
@@ -52,7 +126,7 @@ async def prepare_bill_payment(
     amount: float,
     due_date: str | None = None,
     reference_number: str | None = None
-) -> StateSnapshotEvent:
+) -> ToolReturn:
     """
     Prepare a bill payment to a biller (e.g., TNB, Syabas, TM, Astro).
     This sets the pending bill in the state for user confirmation.
@@ -64,12 +138,29 @@ async def prepare_bill_payment(
     logger.info(f"   ├─ Amount: RM {amount:,.2f}")
     logger.info(f"   └─ Due Date: {due_date or 'Not specified'}")
 
+    if has_unresolved_debit(ctx.deps.state):
+        return tool_result(ctx, False, RESPONSES["payment_awaiting_resolution"])
+
+    # Resolve "Tenaga Nasional", "air selangor" etc. and check the biller's formats
+    # locally, so bad details fail here instead of after a confirmation card
+    check = get_biller_registry().check_bill(biller_name, account_number, amount, reference_number)
+    if "biller_name" in check.errors:
+        if (suggestion := get_biller_registry().suggest(biller_name)) is not None:
+            logger.warning(f"🛡️  [GUARDRAIL] Unknown biller: '{biller_name}' (suggesting {suggestion})")
+            return tool_result(ctx, False, RESPONSES["biller_suggestion"].format(biller=biller_name, suggestion=suggestion))
+        logger.warning(f"🛡️  [GUARDRAIL] Unsupported biller: '{biller_name}'")
+        return tool_result(ctx, False, RESPONSES["unsupported_biller"].format(biller=biller_name))
+    if not check.ok:
+        logger.warning(f"⚠️  [VALIDATION_FAILURE] Invalid bill details")
+        logger.warning(f"   └─ Fields: {', '.join(check.errors)}")
+        return tool_result(ctx, False, RESPONSES["invalid_bill_details"].format(errors=check.describe_errors()))
+
     bill_details = BillDetails(
-        biller_name=biller_name,
-        account_number=account_number,
-        amount=amount,
+        biller_name=check.biller_name,
+        account_number=check.account_number,
+        amount=check.amount,
         due_date=due_date,
-        reference_number=reference_number
+        reference_number=check.reference_number
     )
     
     # Set pending bill in state
@@ -78,13 +169,10 @@ async def prepare_bill_payment(
     
     logger.info(f"✅  Bill payment prepared for confirmation")
     
-    return StateSnapshotEvent(
-        type=EventType.STATE_SNAPSHOT,
-        snapshot=ctx.deps.state,
-    )
+    return tool_result(ctx, True, RESPONSES["bill_prepared"])
 
 
-async def confirm_bill_payment(ctx: RunContext[StateDeps[BankingState]]) -> StateSnapshotEvent:
+async def confirm_bill_payment(ctx: RunContext[StateDeps[BankingState]]) -> ToolReturn:
     """
     Execute the pending bill payment after user confirmation.
     """
@@ -92,89 +180,135 @@ async def confirm_bill_payment(ctx: RunContext[StateDeps[BankingState]]) -> Stat
     
     if not ctx.deps.state.pending_bill:
         logger.error(f"❌  No pending bill to confirm")
-        return StateSnapshotEvent(
-            type=EventType.STATE_SNAPSHOT,
-            snapshot=ctx.deps.state,
-        )
+        return tool_result(ctx, False, RESPONSES["no_pending_bill"])
     
     bill = ctx.deps.state.pending_bill
-    
-    # Check balance
-    if ctx.deps.state.balance < bill.amount:
-        logger.error(f"❌  Insufficient balance")
+
+    # A retry of an unresolved debit was already checked on its first attempt
+    if not await resumes_unresolved_debit(bill) and (limit_error := await check_daily_limit(bill.amount)):
+        logger.error(f"❌  Daily limit exceeded")
         ctx.deps.state.status = "error"
-        return StateSnapshotEvent(
-            type=EventType.STATE_SNAPSHOT,
-            snapshot=ctx.deps.state,
-        )
+        return tool_result(ctx, False, limit_error)
     
-    # Execute payment (mock)
-    ctx.deps.state.balance -= bill.amount
-    ctx.deps.state.transaction_history.append(
-        f"Bill Payment: RM {bill.amount:.2f} to {bill.biller_name} (Account: {bill.account_number})"
+    # Execute payment
+    masked_account = mask_account_number(bill.account_number)
+    entry = LedgerEntry(
+        type="bill_payment",
+        amount=bill.amount,
+        counterparty=bill.biller_name,
+        account=masked_account,
+        reference=bill.reference_number,
+        description=f"Bill Payment: RM {bill.amount:.2f} to {bill.biller_name} (Account: {masked_account})",
+        created_at=datetime.now(timezone.utc),
     )
+
+    # With a core-banking backend, settle in the background instead of inside the turn
+    if get_settlement_workers() is not None:
+        # Cleared once the intent is stored: a failed enqueue leaves it to confirm again
+        intent = await submit_payment(ctx.deps.state, entry, bill.model_dump())
+        ctx.deps.state.pending_bill = None
+        logger.info(f"⏳  Bill payment queued for settlement ({intent.id[:8]})")
+        return tool_result(ctx, True, RESPONSES["bill_processing"])
+
+    try:
+        await debit(ctx.deps.state, bill, entry.description)
+    except InsufficientFundsError:
+        logger.error(f"❌  Insufficient balance")
+        ctx.deps.state.status = "error"
+        return tool_result(ctx, False, RESPONSES["insufficient_balance"].format(balance=ctx.deps.state.balance))
+    except CoreBankingError as e:
+        # The bill stays pending so the user can confirm again (with the same key)
+        logger.error(f"❌  Core banking error: {e}")
+        if bill.debit_unresolved:
+            return tool_result(ctx, False, RESPONSES["payment_unresolved"])
+        return tool_result(ctx, False, RESPONSES["core_banking_unavailable"])
+
     ctx.deps.state.pending_bill = None
     ctx.deps.state.status = "completed"
+    await record_transaction(ctx.deps.state, entry)
     
     logger.info(f"✅  Bill payment completed successfully")
     logger.info(f"   └─ New Balance: RM {ctx.deps.state.balance:,.2f}")
     
-    return StateSnapshotEvent(
-        type=EventType.STATE_SNAPSHOT,
-        snapshot=ctx.deps.state,
-    )
+    return tool_result(ctx, True, RESPONSES["bill_completed"])
 
 
-async def cancel_payment(ctx: RunContext[StateDeps[BankingState]]) -> StateSnapshotEvent:
+async def cancel_payment(ctx: RunContext[StateDeps[BankingState]]) -> ToolReturn:
     """
     Cancel the pending transfer or bill payment.
     """
     logger.info(f"🛑  Executing Tool: cancel_payment")
+    if has_unresolved_debit(ctx.deps.state):
+        return tool_result(ctx, False, RESPONSES["payment_awaiting_resolution"])
+    cancelled = []
     
     if ctx.deps.state.pending_transfer:
         TransferService.cancel_transfer(ctx.deps.state)
         logger.info(f"   └─ Transfer cancelled")
+        cancelled.append(RESPONSES["transfer_cancelled"])
     
     if ctx.deps.state.pending_bill:
         ctx.deps.state.pending_bill = None
         ctx.deps.state.status = "idle"
         logger.info(f"   └─ Bill payment cancelled")
+        cancelled.append(RESPONSES["bill_cancelled"])
     
-    return StateSnapshotEvent(
-        type=EventType.STATE_SNAPSHOT,
-        snapshot=ctx.deps.state,
-    )
+    if not cancelled:
+        return tool_result(ctx, False, RESPONSES["nothing_pending"])
+    return tool_result(ctx, True, " ".join(cancelled))
 
 
-async def cancel_transfer(ctx: RunContext[StateDeps[BankingState]]) -> StateSnapshotEvent:
+async def cancel_transfer(ctx: RunContext[StateDeps[BankingState]]) -> ToolReturn:
     """
     Cancel the pending transfer.
     """
     logger.info(f"🛑  Executing Tool: cancel_transfer")
+    if has_unresolved_debit(ctx.deps.state):
+        return tool_result(ctx, False, RESPONSES["payment_awaiting_resolution"])
     TransferService.cancel_transfer(ctx.deps.state)
-    return StateSnapshotEvent(
-        type=EventType.STATE_SNAPSHOT,
-        snapshot=ctx.deps.state,
-    )
+    return tool_result(ctx, True, RESPONSES["transfer_cancelled"])
 
 
-async def confirm_transfer(ctx: RunContext[StateDeps[BankingState]]) -> StateSnapshotEvent:
+async def confirm_transfer(ctx: RunContext[StateDeps[BankingState]]) -> ToolReturn:
     """
     Execute the pending transfer after user confirmation.
     """
     logger.info(f"✅  Executing Tool: confirm_transfer")
-    success, message = TransferService.execute_transfer(ctx.deps.state)
+    success, message = await TransferService.execute_transfer(ctx.deps.state)
     
     if not success:
         logger.error(f"❌  Transfer Confirmation Failed")
         logger.error(f"   └─ Reason: {message}")
 
-    return StateSnapshotEvent(
-        type=EventType.STATE_SNAPSHOT,
-        snapshot=ctx.deps.state,
-    )
+    return tool_result(ctx, success, message)
+
+
+async def get_payment_status(ctx: RunContext[StateDeps[BankingState]]) -> ToolReturn:
+    """
+    Check on confirmed payments that are still being processed.
+    """
+    logger.info(f"⏳  Executing Tool: get_payment_status")
+    intents = await apply_settlements(ctx.deps.state)
+    if not intents:
+        return tool_result(ctx, False, RESPONSES["no_payments_processing"])
+
+    templates = {
+        "processing": RESPONSES["payment_still_processing"],
+        "completed": RESPONSES["payment_settled"],
+        "failed": RESPONSES["payment_failed"],
+    }
+    messages = [templates[i.status].format(description=i.description, error=i.error) for i in intents]
+    logger.info(f"   └─ Statuses: {', '.join(i.status for i in intents)}")
+    return tool_result(ctx, all(i.status != "failed" for i in intents), " ".join(messages))
 
 
-def get_balance(ctx: RunContext[StateDeps[BankingState]]) -> float:
+async def get_balance(ctx: RunContext[StateDeps[BankingState]]) -> ToolReturn:
     """Get the current account balance."""
-    return ctx.deps.state.balance
+    try:
+        # Payments settled since the last turn change the balance (and history, status)
+        await apply_settlements(ctx.deps.state)
+        balance = await refresh_balance(ctx.deps.state)
+    except CoreBankingError as e:
+        logger.error(f"❌  Balance lookup failed: {e}")
+        return tool_result(ctx, False, RESPONSES["core_banking_unavailable"])
+    return tool_result(ctx, True, RESPONSES["balance"].format(balance=balance))
@@ -4,9 +4,14 @@ import json
 from pydantic_ai import Agent, RunContext, BinaryContent
 from pydantic_ai.ag_ui import StateDeps
 from pydantic import BaseModel
+from config.constants import RESPONSES
 from models.banking import BankingState
+from core.circuit_breaker import CircuitOpenError
 from core.context import current_image_ctx
-from core.model_factory import get_model
+from core.deadline import DeadlineExceeded
+from core.model_factory import VISION, VISION_ESCALATION, get_model, vision_cascade
+from core.metrics import metrics, record_llm_usage
+from services.biller_registry import get_biller_registry
 
 logger = logging.getLogger("jom_kira.tools.vision")
 
@@ -49,6 +54,87 @@ IMPORTANT: Respond ONLY with a valid JSON object, no other text.
 """
 
 
+# Follow-up prompt when specific fields fail the biller registry's checks
+FIELD_RECHECK_PROMPT = """You are re-reading specific fields of a Malaysian bill image.
+A previous reading of these fields failed validation.
+Respond ONLY with a JSON object containing exactly these keys: {fields}.
+Use null for any value you cannot read clearly.
+"""
+
+
+REQUIRED_BILL_FIELDS = ("biller_name", "account_number", "amount")
+
+
+def parse_bill_response(response_text: str) -> BillDetails | None:
+    """Parse the vision model's JSON reply; None if it isn't valid JSON for BillDetails."""
+    try:
+        # Clean up response (remove markdown code blocks if present)
+        clean_response = response_text.strip()
+        if clean_response.startswith("```"):
+            clean_response = clean_response.split("```")[1]
+            if clean_response.startswith("json"):
+                clean_response = clean_response[4:]
+            clean_response = clean_response.strip()
+        
+        return BillDetails(**json.loads(clean_response))
+    except (json.JSONDecodeError, Exception) as parse_error:
+        logger.warning(f"   └─ Failed to parse JSON response: {parse_error}")
+        return None
+
+
+def is_complete_bill(bill: BillDetails | None) -> bool:
+    """Confident extraction: a valid bill with every field prepare_bill_payment needs."""
+    return bill is not None and bill.is_valid_bill and all(getattr(bill, f) for f in REQUIRED_BILL_FIELDS)
+
+
+async def run_vision(tier: str, instructions: str, prompt: str, image: BinaryContent) -> str:
+    """One vision call on the model routed for `tier`."""
+    # Create a simple vision agent for this request
+    vision_agent = Agent(model=get_model(tier), instructions=instructions)
+    result = await vision_agent.run([prompt, image])
+    record_llm_usage(result.usage(), task=tier)
+    return result.output
+
+
+async def validate_extraction(bill: BillDetails, image: BinaryContent, tier: str) -> tuple[BillDetails, str | None]:
+    """
+    Check an extraction against the biller registry. Fields that fail are
+    re-read once (and only those fields); returns the normalized bill and a
+    description of what is still wrong, if anything.
+    """
+    registry = get_biller_registry()
+    check = registry.check_bill(bill.biller_name, bill.account_number, bill.amount, bill.reference_number)
+
+    if check.errors and "biller_name" not in check.errors:
+        fields = list(check.errors)
+        logger.info(f"   └─ Re-reading fields: {', '.join(fields)}")
+        metrics.increment("vision.field_rechecks")
+        reread = parse_bill_response(await run_vision(
+            tier,
+            FIELD_RECHECK_PROMPT.format(fields=", ".join(fields)),
+            "Re-read these fields from the bill:\n" + "\n".join(f"- {e}" for e in check.errors.values()),
+            image,
+        ))
+        if reread is not None:
+            bill = bill.model_copy(update={
+                name: getattr(reread, name) for name in fields if getattr(reread, name) is not None
+            })
+            check = registry.check_bill(bill.biller_name, bill.account_number, bill.amount, bill.reference_number)
+
+    # The reference is optional; drop one that still doesn't validate rather than fail the bill
+    check.errors.pop("reference_number", None)
+    if not check.ok:
+        metrics.increment("vision.invalid_bills")
+        return bill, check.describe_errors()
+
+    return bill.model_copy(update={
+        "biller_name": check.biller_name,
+        "account_number": check.account_number,
+        "amount": check.amount,
+        "reference_number": check.reference_number,
+    }), None
+
+
 async def analyze_bill_image(
     ctx: RunContext[StateDeps[BankingState]],
     image_base64: str | None = None,
@@ -92,45 +178,45 @@ async def analyze_bill_image(
                 "gif": "image/gif",
             }
             media_type = mime_type_map.get(image_format or "jpeg", "image/jpeg")
+            image = BinaryContent(data=image_bytes, media_type=media_type)
             
-            # Create a simple vision agent for this request
-            # Using Agent.run() with multimodal content (text + BinaryContent)
-            vision_agent = Agent(
-                model=get_model(),
-                instructions=BILL_ANALYSIS_PROMPT,
-            )
-            
-            # Run the agent with multimodal input
-            result = await vision_agent.run([
-                "Please analyze this bill image and extract the payment details.",
-                BinaryContent(data=image_bytes, media_type=media_type),
-            ])
-            
-            # Get the response text
-            response_text = result.output
-            
-            logger.info(f"   └─ Vision response: {response_text[:200]}...")
-            
-            # Try to parse JSON response
-            try:
-                # Clean up response (remove markdown code blocks if present)
-                clean_response = response_text.strip()
-                if clean_response.startswith("```"):
-                    clean_response = clean_response.split("```")[1]
-                    if clean_response.startswith("json"):
-                        clean_response = clean_response[4:]
-                    clean_response = clean_response.strip()
+            # Confidence cascade: the fast vision tier first, escalating only
+            # when the extraction is invalid or missing required fields
+            cascade = vision_cascade()
+            for tier in cascade:
+                # Using Agent.run() with multimodal content (text + BinaryContent)
+                response_text = await run_vision(
+                    tier,
+                    BILL_ANALYSIS_PROMPT,
+                    "Please analyze this bill image and extract the payment details.",
+                    image,
+                )
                 
-                bill_data = json.loads(clean_response)
-                bill = BillDetails(**bill_data)
-            except (json.JSONDecodeError, Exception) as parse_error:
-                logger.warning(f"   └─ Failed to parse JSON response: {parse_error}")
+                logger.info(f"   └─ Vision response ({tier}): {response_text[:200]}...")
+                
+                bill = parse_bill_response(response_text)
+                if is_complete_bill(bill) or tier == cascade[-1]:
+                    break
+                logger.info(f"   └─ Incomplete extraction, escalating to {VISION_ESCALATION}")
+                metrics.increment("routing.escalated", task=VISION)
+            
+            if bill is None:
                 # Return raw response if JSON parsing fails
                 return f"I analyzed the image. Here's what I found:\n\n{response_text}"
             
             logger.info(f"   └─ Vision analysis complete: is_valid_bill={bill.is_valid_bill}")
             
             if bill.is_valid_bill:
+                # Validate against the biller's formats; bad fields are re-read once
+                bill, problems = await validate_extraction(bill, image, cascade[-1])
+                if problems:
+                    logger.warning(f"   └─ Bill failed validation: {problems}")
+                    if bill.biller_name and get_biller_registry().get(bill.biller_name) is None:
+                        if (suggestion := get_biller_registry().suggest(bill.biller_name)) is not None:
+                            return RESPONSES["biller_suggestion"].format(biller=bill.biller_name, suggestion=suggestion)
+                        return RESPONSES["unsupported_biller"].format(biller=bill.biller_name)
+                    return RESPONSES["invalid_bill_details"].format(errors=problems)
+
                 # Log the extracted details
                 logger.info(f"   └─ Extracted bill details:")
                 logger.info(f"      ├─ Biller: {bill.biller_name}")
@@ -146,6 +232,9 @@ async def analyze_bill_image(
             else:
                 return f"I couldn't extract bill details from this image. {bill.error_message or 'Please upload a clearer image of your bill.'}"
                 
+        except (DeadlineExceeded, CircuitOpenError):
+            # Run-level failures: the handlers answer 504/503 instead of the model
+            raise
         except Exception as e:
             logger.error(f"   └─ Vision analysis failed: {e}", exc_info=True)
             return f"I encountered an error while analyzing the image: {str(e)}. Please try uploading a different image."
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from contextlib import suppress
+
+logger = logging.getLogger("jom_kira.utils.asgi")
+
+
+async def buffer_request(receive) -> tuple[bytes, list]:
+    """
+    Buffer the entire request body for inspection.
+    Returns the joined body and the raw ASGI messages so they can be replayed.
+    """
+    chunks = []
+    messages = []
+    more_body = True
+
+    try:
+        while more_body:
+            message = await receive()
+            messages.append(message)
+            if message["type"] == "http.request":
+                chunks.append(message.get("body", b""))
+                more_body = message.get("more_body", False)
+            elif message["type"] == "http.disconnect":
+                more_body = False
+    except Exception as e:
+        logger.debug(f"Error buffering request body: {e}")
+
+    return b"".join(chunks), messages
+
+
+def replay_receive(messages: list, receive):
+    """Build a receive callable that yields buffered messages before falling through."""
+    pending = list(messages)
+
+    async def _receive():
+        if pending:
+            return pending.pop(0)
+        return await receive()
+
+    return _receive
+
+
+def body_receive(body: bytes, receive):
+    """Build a receive callable that yields a (possibly rewritten) body in one message."""
+    return replay_receive([{"type": "http.request", "body": body, "more_body": False}], receive)
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the response was ready."""
+
+
+async def cancel_on_disconnect(receive, awaitable):
+    """
+    Await `awaitable`, cancelling it if the client disconnects first.
+    Only valid once the request body has been read, so the next message
+    `receive` yields is the disconnect.
+    """
+    task = asyncio.ensure_future(awaitable)
+
+    async def wait_for_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        watcher.cancel()
+        raise
+    watcher.cancel()
+    if task.done():
+        return task.result()
+
+    task.cancel()
+    # Let the run unwind (release its admission slot, close model streams)
+    with suppress(asyncio.CancelledError):
+        await task
+    raise ClientDisconnected()
+
+
+async def track_cancellation(iterator, on_cancel):
+    """Pass a streaming body through, calling on_cancel() if it is cancelled mid-stream."""
+    try:
+        async for chunk in iterator:
+            yield chunk
+    except asyncio.CancelledError:
+        on_cancel()
+        raise
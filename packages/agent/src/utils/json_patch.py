@@ -0,0 +1,48 @@
+from typing import Any
+
+
+def escape_pointer(token: str) -> str:
+    """Escape a key for use as a JSON Pointer token (RFC 6901)."""
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> list[dict]:
+    """
+    Build an RFC 6902 JSON Patch turning `old` into `new`.
+
+    Objects are diffed key by key; a list that only grew at the end becomes
+    `add` ops on `/-`, one that dropped items from the front and appended
+    becomes `remove` ops on `/0` plus adds; any other list change replaces the
+    whole list.
+    Both documents are expected to be plain JSON values (model_dump(mode="json")).
+    """
+    if old == new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key, value in old.items():
+            child = f"{path}/{escape_pointer(str(key))}"
+            if key not in new:
+                ops.append({"op": "remove", "path": child})
+            else:
+                ops.extend(make_patch(value, new[key], child))
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": f"{path}/{escape_pointer(str(key))}", "value": value})
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        if len(new) > len(old) and new[:len(old)] == old:
+            return [{"op": "add", "path": f"{path}/-", "value": value} for value in new[len(old):]]
+        # A bounded window that dropped its oldest items and appended new ones
+        # (only worth it while the removes are fewer than the items a replace would send)
+        for dropped in range(1, min(len(old), len(new))):
+            kept = len(old) - dropped
+            if kept <= len(new) and new[:kept] == old[dropped:]:
+                return (
+                    [{"op": "remove", "path": f"{path}/0"}] * dropped
+                    + [{"op": "add", "path": f"{path}/-", "value": value} for value in new[kept:]]
+                )
+
+    return [{"op": "replace", "path": path, "value": new}]
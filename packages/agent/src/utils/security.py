@@ -1,6 +1,8 @@
 import re
+import hmac
 import logging
 from config.constants import MASK_VISIBLE_DIGITS, MASKING_CHAR
+from config.settings import settings
 
 logger = logging.getLogger("jom_kira.utils.security")
 
@@ -19,3 +21,29 @@ def mask_account_number(account_number: str) -> str:
         return clean_number
         
     return MASKING_CHAR * (len(clean_number) - MASK_VISIBLE_DIGITS) + clean_number[-MASK_VISIBLE_DIGITS:]
+
+
+def is_admin_key(key: str | None) -> bool:
+    """
+    Checks a caller-supplied key against ADMIN_API_KEY in constant time.
+    Admin features are disabled entirely while ADMIN_API_KEY is unset.
+    """
+    if not settings.ADMIN_API_KEY or not key:
+        return False
+    return hmac.compare_digest(key.encode(), settings.ADMIN_API_KEY.encode())
+
+
+def authenticated_user_id(headers) -> str | None:
+    """
+    X-User-Id, but only when the request came through the authenticating
+    gateway (X-Gateway-Auth matches GATEWAY_AUTH_SECRET). The gateway must
+    strip any client-supplied X-User-Id; without the secret the header is
+    ignored, since anyone can send it.
+    """
+    user_id = headers.get("x-user-id")
+    proof = headers.get("x-gateway-auth")
+    if not settings.GATEWAY_AUTH_SECRET or not user_id or not proof:
+        return None
+    if not hmac.compare_digest(proof.encode(), settings.GATEWAY_AUTH_SECRET.encode()):
+        return None
+    return user_id